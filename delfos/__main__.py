@@ -0,0 +1,430 @@
+"""
+Linha de comando do package: python -m delfos <comando> [opções]
+
+Comandos:
+    - warm: baixa os históricos e os dados fundamentalistas das ações e grava o cache de dados de mercado (histories.dhs, fundamentals.json e tickers.json)
+    - build: cria o pregão (do cache ou baixando os dados) e grava o seu snapshot (ver 'Session.save')
+    - allocate: roda o modelo de alocação do pregão (com as views do oracle, se --oracle) e grava os pesos de compra e os retornos esperados em json
+    - report: cria o portfolio de cada conta no pregão e grava o relatório (valor, custo, retorno, dividendos e posições) em json
+    - precompute: pré-calcula os artefatos do próximo pregão depois do fechamento (ver 'delfos.market.precompute')
+    - serve: roda o daemon do advisor, que mantém o pregão e os portfolios das contas quentes e responde consultas por HTTP local (ver 'delfos.server')
+
+Todos os comandos aceitam o universo de tickers (--tickers), a data (--date), o período de análise (--period) e o número de threads do pregão (--threads).
+
+Modo batch: build, allocate e report aceitam várias datas (--date 2021-06-30 2021-12-30) e report aceita várias contas (--accounts pasta_b3 movimentacoes.json).
+As tarefas rodam em --workers processos. Cada processo abre o cache de mercado uma única vez: o HistoryStore é mapeado em memória, então as páginas dos históricos
+são compartilhadas por todos os processos pelo cache de páginas do sistema. As tarefas são agrupadas por data, então cada processo cria o pregão de uma data uma única vez
+para todas as contas dessa data.
+
+Ex:
+    python -m delfos warm --cache cache/ --date 2021-12-30 --period 6
+    python -m delfos report --cache cache/ --date 2021-06-30 2021-12-30 --accounts conta1/ conta2/ --workers 4 --output report.json
+
+Pré-cálculo noturno (cron, depois do fechamento, em dias de semana) e pregão da manhã montado dos artefatos, sem downloads e sem recalcular a covariância:
+    30 19 * * 1-5  python -m delfos precompute --precomputed-output precomputed/
+    python -m delfos allocate --precomputed precomputed/
+
+OBS: Os prints dos pregões (ex: performance do modelo de alocação) vão para o stderr; o stdout só recebe o json dos resultados (se --output não for passado).
+"""
+from delfos.market.session import Session
+from delfos.market.precompute import load_market_data, write_market_cache, precompute_next_session, load_precomputed_session, get_next_session_date
+from delfos.broker.portfolio import Portfolio, get_movements_list_from_b3_exports
+from delfos.common.configs import Configs
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
+from datetime import datetime
+from pathlib import Path
+import argparse
+import math
+import json
+import sys
+
+
+CONFIGS = Configs()
+
+SNAPSHOT_FILE = "session-{:%Y-%m-%d}.dss" #nome dos snapshots gravados em uma pasta (modo batch)
+
+OPTIONS = None #opções do processo (setadas por 'init_worker')
+MARKET_DATA = None #cache de mercado aberto no processo (aberto só no primeiro uso)
+SESSION = (None, None) #último pregão criado no processo, no formato (data, Session)
+
+
+
+def parse_date(value):
+    """
+    Converte uma data no formato AAAA-MM-DD para datetime (tipo dos argumentos de data do argparse).
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError("Dates must have the YYYY-MM-DD format.")
+
+
+
+def parse_tickers(values):
+    """
+    Resolve o argumento --tickers: uma lista de tickers ou o caminho de um arquivo json (lista de tickers ou dicionário no formato do tickers.json).
+
+    Returns
+    -------
+    list, dict ou None
+        Os tickers. (None se o argumento não foi passado)
+    """
+    if values is None:
+        return None
+    if len(values) == 1 and values[0].lower().endswith(".json"):
+        with open(values[0], "r", encoding="utf8") as tickers_file:
+            return json.load(tickers_file)
+    return [ticker.upper() for ticker in values]
+
+
+
+def init_worker(options):
+    """
+    Inicializa as opções do processo (o próprio processo, sem workers, ou cada processo do pool do modo batch).
+    """
+    global OPTIONS, MARKET_DATA, SESSION
+    OPTIONS = options
+    MARKET_DATA = None
+    SESSION = (None, None)
+
+
+
+def get_snapshot_path(path, date):
+    """
+    Retorna o snapshot do pregão da data: o próprio arquivo ou, se o caminho for uma pasta, o arquivo da data dentro dela.
+    """
+    path = Path(path)
+    return path / SNAPSHOT_FILE.format(date) if path.is_dir() else path
+
+
+
+def get_session(date):
+    """
+    Retorna o pregão da data, de acordo com as opções do processo: carregado do snapshot, criado do cache de mercado ou criado baixando os dados.
+    O último pregão criado é reaproveitado enquanto as tarefas forem da mesma data.
+
+    Parameters
+    ----------
+    date : datetime
+        A data do pregão.
+
+    Returns
+    -------
+    Session
+        O pregão.
+    """
+    global SESSION
+    if SESSION[0] == date:
+        return SESSION[1]
+    SESSION = (None, None) #libera o pregão anterior antes de criar o próximo
+    session = create_session(OPTIONS, date)
+    SESSION = (date, session)
+    return session
+
+
+
+def create_session(options, date):
+    """
+    Cria o pregão da data: carregado do snapshot, montado dos artefatos pré-calculados, criado do cache de mercado (aberto uma única vez por processo) ou criado baixando os dados.
+
+    Parameters
+    ----------
+    options : dict
+        As opções da linha de comando. (ver 'main')
+    date : datetime
+        A data do pregão.
+
+    Returns
+    -------
+    Session
+        O pregão.
+    """
+    global MARKET_DATA
+    if options["snapshot"] is not None:
+        session = Session.load(get_snapshot_path(options["snapshot"], date))
+    elif options["precomputed"] is not None:
+        session = load_precomputed_session(options["precomputed"], date, options["tickers"], threads=options["threads"])
+    elif options["cache"] is not None:
+        if MARKET_DATA is None:
+            MARKET_DATA = load_market_data(options["cache"])
+        tickers = options["tickers"] if options["tickers"] is not None else MARKET_DATA["tickers"]
+        if tickers is None:
+            tickers = [ticker for ticker in MARKET_DATA["histories"].tickers if ticker != options["index_ticker"]]
+        risk_free_rate = options["risk_free_rate"]
+        if risk_free_rate is None:
+            risk_free_rate = MARKET_DATA["histories"].metadata.get("risk_free_rate", "selic") #taxa gravada pelo 'warm'
+        session = Session(date, options["period"], tickers, options["index_ticker"], risk_free_rate, histories=MARKET_DATA["histories"], fundamentals=MARKET_DATA["fundamentals"], threads=options["threads"])
+    else:
+        risk_free_rate = options["risk_free_rate"] if options["risk_free_rate"] is not None else "selic"
+        session = Session(date, options["period"], options["tickers"], options["index_ticker"], risk_free_rate, threads=options["threads"])
+    return session
+
+
+
+def load_movements(account):
+    """
+    Lê as movimentações de uma conta: uma pasta com os arquivos de movimentação da B3 ou um arquivo json com a lista de movimentações.
+    """
+    account = Path(account)
+    if account.is_dir():
+        return get_movements_list_from_b3_exports(account)
+    with open(account, "r", encoding="utf8") as movements_file:
+        return json.load(movements_file)
+
+
+
+def build_task(task):
+    """
+    Tarefa do comando 'build': cria o pregão da data e grava o seu snapshot.
+    """
+    date, path = task
+    with redirect_stdout(sys.stderr):
+        session = get_session(date)
+        session.save(path)
+    return {"date": date.strftime("%Y-%m-%d"), "snapshot": str(path), "tickers": session.stocks_num, "active_tickers": len(session.active_tickers)}
+
+
+
+def allocate_task(task):
+    """
+    Tarefa do comando 'allocate': roda o modelo de alocação do pregão da data.
+    """
+    date, tickers, views = task
+    with redirect_stdout(sys.stderr):
+        session = get_session(date)
+        session.update_allocation_model(tickers, views)
+    return {
+        "date": date.strftime("%Y-%m-%d"),
+        "buy_weights": {ticker: float(weight) for ticker, weight in session.buy_weights.items()},
+        "market_implied_rets": {ticker: float(ret) for ticker, ret in session.market_implied_rets.items()}
+    }
+
+
+
+def report_task(task):
+    """
+    Tarefa do comando 'report': cria o portfolio da conta no pregão da data e monta o seu relatório.
+    """
+    date, account, cash = task
+    with redirect_stdout(sys.stderr):
+        session = get_session(date)
+        portfolio = Portfolio(session, cash, load_movements(account) if account is not None else [])
+        positions = {
+            ticker: {
+                "quantity": float(position.quantity),
+                "price_per_share": float(position.price_per_share),
+                "held_shares_value": float(position.held_shares_value),
+                "total_return": float(position.total_return)
+            }
+            for ticker, position in portfolio.positions.items()
+        }
+        return {
+            "date": date.strftime("%Y-%m-%d"),
+            "account": str(account) if account is not None else None,
+            "cash": float(portfolio.cash),
+            "total_value": float(portfolio.total_value),
+            "total_cost": float(portfolio.total_cost),
+            "total_dividends": float(portfolio.total_dividends),
+            "total_return": float(portfolio.total_return),
+            "held_shares_value": float(portfolio.held_shares_value),
+            "held_shares_return": float(portfolio.held_shares_return),
+            "positions": positions,
+            "failed_positions": list(portfolio.failed_positions)
+        }
+
+
+
+def run_tasks(function, tasks, options, workers=1):
+    """
+    Roda as tarefas no próprio processo (1 worker) ou em um pool de processos, mantendo a ordem dos resultados.
+    As tarefas são divididas em blocos contíguos por processo, então tarefas da mesma data caem no mesmo processo e reaproveitam o pregão.
+
+    Parameters
+    ----------
+    function : function
+        A função da tarefa (deve ser uma função do módulo, para ser enviada aos processos).
+    tasks : list
+        As tarefas.
+    options : dict
+        As opções dos processos. (ver 'init_worker')
+    workers : int
+        O número de processos. (default é 1, sem pool)
+
+    Returns
+    -------
+    list
+        Os resultados das tarefas.
+    """
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        init_worker(options)
+        return [function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(options,)) as executor:
+        return list(executor.map(function, tasks, chunksize=math.ceil(len(tasks) / workers)))
+
+
+
+def warm(args, options):
+    """
+    Comando 'warm': baixa os dados de mercado e grava o cache. Com várias datas, o período do cache cobre o período de análise da data mais antiga.
+    """
+    date = max(args.date)
+    period = args.period + math.ceil((date - min(args.date)).days / 365)
+    with redirect_stdout(sys.stderr):
+        session = Session(date, period, options["tickers"], options["index_ticker"], options["risk_free_rate"] if options["risk_free_rate"] is not None else "selic", threads=options["threads"])
+
+    cache = write_market_cache(session, args.cache, options["tickers"] if isinstance(options["tickers"], dict) else None)
+    return [{"cache": str(cache), "date": date.strftime("%Y-%m-%d"), "period": period, "tickers": session.stocks_num}]
+
+
+
+def build(args, options):
+    """
+    Comando 'build': grava o snapshot do pregão de cada data. Com várias datas, o --output é uma pasta com um snapshot por data.
+    """
+    output = Path(args.snapshot_output)
+    if len(args.date) > 1:
+        output.mkdir(parents=True, exist_ok=True)
+        tasks = [(date, output / SNAPSHOT_FILE.format(date)) for date in args.date]
+    else:
+        tasks = [(args.date[0], output)]
+    return run_tasks(build_task, tasks, options, args.workers)
+
+
+
+def allocate(args, options):
+    """
+    Comando 'allocate': roda o modelo de alocação do pregão de cada data.
+    """
+    tickers = args.allocation_tickers if len(args.allocation_tickers) > 1 or args.allocation_tickers[0] not in ("all", "active") else args.allocation_tickers[0]
+    views = "oracle" if args.oracle else None
+    return run_tasks(allocate_task, [(date, tickers, views) for date in args.date], options, args.workers)
+
+
+
+def report(args, options):
+    """
+    Comando 'report': monta o relatório de cada conta no pregão de cada data (tarefas agrupadas por data).
+    """
+    accounts = args.accounts if args.accounts is not None else [None]
+    return run_tasks(report_task, [(date, account, args.cash) for date in args.date for account in accounts], options, args.workers)
+
+
+
+def precompute(args, options):
+    """
+    Comando 'precompute': cria o pregão fechado da data (do cache ou baixando os dados) e grava os artefatos do próximo pregão.
+    """
+    date = max(args.date)
+    with redirect_stdout(sys.stderr):
+        init_worker(options)
+        session = create_session(options, date)
+        path = precompute_next_session(session, args.precomputed_output, tickers_dict=options["tickers"] if isinstance(options["tickers"], dict) else None)
+    return [{"artifacts": str(path), "date": date.strftime("%Y-%m-%d"), "tickers": session.stocks_num, "next_date": get_next_session_date(date).isoformat()}]
+
+
+
+def serve(args, options):
+    """
+    Comando 'serve': roda o daemon do advisor (ver 'delfos.server'), que mantém o pregão e os portfolios das contas quentes e responde consultas por HTTP local.
+    """
+    from delfos.server import AdvisorServer
+
+    if options["snapshot"] is not None:
+        options = {**options, "snapshot": None} #o daemon vira o pregão a cada abertura e fechamento: os pregões são criados do cache ou baixados
+    accounts = args.accounts if args.accounts is not None else []
+    portfolios = {Path(account).stem: {"movements": partial(load_movements, account), "cash": args.cash} for account in accounts}
+    address = args.socket if args.socket is not None else (args.host, args.port)
+    views = "oracle" if args.oracle else None
+    server = AdvisorServer(partial(create_session, options), portfolios, address, views=views, live=args.live, precompute_path=args.precompute)
+    with redirect_stdout(sys.stderr):
+        server.start()
+    print("advisor serving on {}".format(server.address), file=sys.stderr)
+    server.serve_forever()
+    return []
+
+
+
+COMMANDS = {"warm": warm, "build": build, "allocate": allocate, "report": report, "precompute": precompute, "serve": serve}
+
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--date", type=parse_date, nargs="+", default=[datetime.now()], help="datas dos pregões, no formato AAAA-MM-DD (várias datas rodam em batch)")
+    common.add_argument("--period", type=int, default=6, help="período de análise em anos")
+    common.add_argument("--tickers", nargs="+", default=None, help="universo de tickers ou um arquivo json (default é o universo da B3 ou o do cache)")
+    common.add_argument("--index-ticker", default="^BVSP", help="ticker do índice de mercado")
+    common.add_argument("--risk-free-rate", type=float, default=None, help="taxa livre de risco (default é a selic ou a gravada no cache)")
+    common.add_argument("--threads", type=int, default=None, help="threads de cada pregão (default é o das configurações)")
+    common.add_argument("--workers", type=int, default=1, help="processos do modo batch")
+    common.add_argument("--output", default=None, help="arquivo json dos resultados (default é o stdout)")
+
+    source = argparse.ArgumentParser(add_help=False)
+    source_group = source.add_mutually_exclusive_group()
+    source_group.add_argument("--cache", default=None, help="pasta do cache de mercado gravado pelo 'warm' (nenhum download é feito)")
+    source_group.add_argument("--snapshot", default=None, help="snapshot do pregão (ou pasta com um snapshot por data) gravado pelo 'build'")
+    source_group.add_argument("--precomputed", default=None, help="pasta dos artefatos do pregão gravados pelo 'precompute' (nenhum download é feito)")
+
+    parser = argparse.ArgumentParser(prog="python -m delfos", description="Linha de comando do delfos.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    warm_parser = commands.add_parser("warm", parents=[common], help="grava o cache de dados de mercado")
+    warm_parser.add_argument("--cache", required=True, help="pasta do cache")
+
+    build_parser = commands.add_parser("build", parents=[common], help="cria o pregão e grava o snapshot")
+    build_parser.add_argument("--cache", default=None, help="pasta do cache de mercado gravado pelo 'warm' (nenhum download é feito)")
+    build_parser.add_argument("--snapshot-output", required=True, help="arquivo do snapshot (ou pasta, com várias datas)")
+
+    allocate_parser = commands.add_parser("allocate", parents=[common, source], help="roda o modelo de alocação")
+    allocate_parser.add_argument("--allocation-tickers", nargs="+", default=["all"], help="'all', 'active' ou os tickers do modelo de alocação")
+    allocate_parser.add_argument("--oracle", action="store_true", help="usa as views e confianças dos sinais do oracle no modelo de alocação")
+
+    report_parser = commands.add_parser("report", parents=[common, source], help="monta o relatório dos portfolios")
+    report_parser.add_argument("--accounts", nargs="+", default=None, help="contas: pastas com os arquivos de movimentação da B3 ou arquivos json de movimentações (default é a pasta das configurações)")
+    report_parser.add_argument("--cash", type=float, default=None, help="dinheiro disponível de cada conta (default é o último registro do cash.json)")
+
+    precompute_parser = commands.add_parser("precompute", parents=[common], help="pré-calcula os artefatos do próximo pregão")
+    precompute_parser.add_argument("--cache", default=None, help="pasta do cache de mercado gravado pelo 'warm' (nenhum download é feito)")
+    precompute_parser.add_argument("--precomputed-output", required=True, help="pasta dos artefatos")
+
+    serve_parser = commands.add_parser("serve", parents=[common], help="roda o daemon do advisor (HTTP local)")
+    serve_parser.add_argument("--cache", default=None, help="pasta do cache de mercado gravado pelo 'warm' (nenhum download é feito)")
+    serve_parser.add_argument("--accounts", nargs="+", default=None, help="contas servidas: pastas com os arquivos de movimentação da B3 ou arquivos json de movimentações")
+    serve_parser.add_argument("--cash", type=float, default=None, help="dinheiro disponível de cada conta (default é o último registro do cash.json)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="host do servidor HTTP")
+    serve_parser.add_argument("--port", type=int, default=8765, help="porta do servidor HTTP")
+    serve_parser.add_argument("--socket", default=None, help="caminho de um Unix socket (substitui host e porta)")
+    serve_parser.add_argument("--oracle", action="store_true", help="usa as views e confianças dos sinais do oracle no modelo de alocação")
+    serve_parser.add_argument("--live", action="store_true", help="atualiza o prior do modelo de alocação durante o pregão")
+    serve_parser.add_argument("--precompute", default=None, help="pasta dos artefatos: o daemon pré-calcula o próximo pregão no fechamento e abre o pregão seguinte dos artefatos")
+
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be greater than 0.")
+
+    options = {
+        "cache": args.cache if args.command != "warm" else None,
+        "snapshot": getattr(args, "snapshot", None),
+        "precomputed": getattr(args, "precomputed", None),
+        "period": args.period,
+        "tickers": parse_tickers(args.tickers),
+        "index_ticker": args.index_ticker,
+        "risk_free_rate": args.risk_free_rate,
+        "threads": args.threads
+    }
+    results = COMMANDS[args.command](args, options)
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf8") as results_file:
+            json.dump(results, results_file, indent=4)
+    else:
+        json.dump(results, sys.stdout, indent=4)
+        print()
+
+
+
+if __name__ == "__main__":
+    main()
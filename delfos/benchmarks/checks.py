@@ -0,0 +1,164 @@
+"""
+Checagens de consistência dos resultados do portfolio sobre dados sintéticos (ver 'delfos.benchmarks.fixtures'), para rodar junto com a suíte de benchmarks.
+
+Cada checagem monta um cenário pequeno e offline e devolve a lista de falhas (vazia, se passar):
+    - missing_days: ações do portfolio sem pregão em dias diferentes; o histórico do portfolio (custo, valor e 'Daily Ret') e os retornos das métricas de risco
+      têm que bater com as posições alinhadas
+    - batch_matches_serial: as métricas das contas avaliadas em lote, em processos (ver 'delfos.broker.batch'), têm que bater com as de cada Portfolio avulso
+
+Imprime o resultado de cada checagem e sai com código 1 se alguma falhar (0, caso contrário).
+
+Uso: python -m delfos.benchmarks.checks [--checks missing_days batch_matches_serial] [--seed 0]
+"""
+from delfos.benchmarks.fixtures import make_tickers, make_histories, make_fundamentals, make_movements
+from delfos.market.session import Session
+from delfos.broker.portfolio import Portfolio
+from delfos.broker.risk import get_risk_series
+from delfos.broker.batch import evaluate_portfolios, get_portfolio_metrics
+from datetime import datetime
+import numpy as np
+import argparse
+import sys
+
+
+TOLERANCE = 1e-9 #diferença relativa máxima entre dois caminhos do mesmo resultado
+
+
+
+def make_gapped_session(n_tickers=10, years=2, seed=0, gap_ratio=0.1, index_ticker="^BVSP"):
+    """
+    Cria uma sessão offline em que cada ação não tem pregão em uma fração aleatória dos dias, diferente em cada ação (linhas removidas do histórico).
+    O índice de mercado fica completo.
+
+    Parameters
+    ----------
+    n_tickers : int
+        O número de ações da sessão. (default é 10)
+    years : int
+        O número de anos dos históricos. (default é 2 anos)
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+    gap_ratio : float
+        A fração dos dias sem pregão de cada ação. (default é 0.1)
+    index_ticker : str
+        O ticker do índice de mercado sintético. (default é o ibovespa)
+
+    Returns
+    -------
+    Session
+        A sessão.
+    """
+    date = datetime.now()
+    tickers = make_tickers(n_tickers)
+    histories = make_histories(list(tickers) + [index_ticker], date, years, seed)
+    random = np.random.default_rng(seed)
+    for ticker in tickers:
+        keep = random.random(len(histories[ticker])) >= gap_ratio
+        keep[[0, -1]] = True #a primeira e a última data ficam, então só há buracos no meio do histórico
+        histories[ticker] = histories[ticker][keep]
+    return Session(date=date, period=years, tickers=tickers, index_ticker=index_ticker, risk_free_rate=0.1, histories=histories, fundamentals=make_fundamentals(tickers, seed))
+
+
+
+def is_close(a, b):
+    """
+    Checa se dois números são iguais, a menos da tolerância relativa.
+    """
+    return abs(a - b) <= TOLERANCE * max(1.0, abs(a), abs(b))
+
+
+
+def check_missing_days(seed=0):
+    """
+    Checa o histórico e os retornos de um portfolio com ações sem pregão em dias diferentes: numa data sem linha de uma ação, a posição tem que valer o último valor, e não zero.
+
+    Returns
+    -------
+    list
+        As falhas encontradas (mensagens).
+    """
+    session = make_gapped_session(seed=seed)
+    portfolio = Portfolio(session, cash=0.0, movements=make_movements(session, 300, n_tickers=5, seed=seed))
+    history = portfolio.portfolio_history
+    failures = []
+
+    if len(portfolio.positions) < 2:
+        failures.append("the account must hold at least two stocks with missing days")
+    if (history["Cost"].diff().dropna() < 0).any():
+        failures.append("portfolio cost decreases (positions without a row count as zero)")
+
+    last_close = sum(position.history["Close"].ffill().iloc[-1] for position in portfolio.positions.values())
+    if not is_close(float(history["Close"].iloc[-1]), float(last_close)):
+        failures.append("last portfolio close {} differs from the sum of the positions {}".format(history["Close"].iloc[-1], last_close))
+
+    twr = float(portfolio.get_time_weighted_returns()["Portfolio"].iloc[-1])
+    history_twr = float(np.prod(1 + history["Daily Ret"].replace([np.inf, -np.inf], np.nan).dropna()) - 1)
+    if not is_close(twr, history_twr):
+        failures.append("time weighted return {} differs from the history 'Daily Ret' {}".format(twr, history_twr))
+    if not twr > -1:
+        failures.append("time weighted return is {}".format(twr))
+
+    risk_twr = float(np.prod(1 + get_risk_series(portfolio)["Return"]) - 1)
+    if not is_close(twr, risk_twr):
+        failures.append("time weighted return {} differs from the risk metrics returns {}".format(twr, risk_twr))
+    return failures
+
+
+
+def check_batch_matches_serial(seed=0, n_accounts=3, workers=2):
+    """
+    Checa se as métricas das contas avaliadas em lote (em processos, com os preços compartilhados) são as mesmas de cada conta avaliada em um Portfolio avulso.
+
+    Returns
+    -------
+    list
+        As falhas encontradas (mensagens).
+    """
+    session = make_gapped_session(seed=seed)
+    accounts = {"account{}".format(i): make_movements(session, 200, n_tickers=5, seed=seed + i) for i in range(n_accounts)}
+    metrics, _ = evaluate_portfolios(session, accounts, cash=0.0, workers=workers, histories=False)
+    failures = []
+
+    for name, movements in accounts.items():
+        if metrics.loc[name, "error"] is not None:
+            failures.append("{}: the batch failed ({})".format(name, metrics.loc[name, "error"]))
+            continue
+        serial = get_portfolio_metrics(Portfolio(session, cash=0.0, movements=movements))
+        for metric, value in serial.items():
+            batch_value = metrics.loc[name, metric]
+            if isinstance(value, str):
+                same = value == batch_value
+            else:
+                same = (np.isnan(value) and np.isnan(batch_value)) or is_close(float(value), float(batch_value))
+            if not same:
+                failures.append("{}: batch {} = {} differs from the serial portfolio {}".format(name, metric, batch_value, value))
+    return failures
+
+
+
+CHECKS = {"missing_days": check_missing_days, "batch_matches_serial": check_batch_matches_serial} #checagens disponíveis
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checagens de consistência dos resultados do portfolio sobre dados sintéticos.")
+    parser.add_argument("--checks", nargs="+", default=list(CHECKS), choices=list(CHECKS), help="checagens executadas")
+    parser.add_argument("--seed", type=int, default=0, help="semente das fixtures")
+    args = parser.parse_args()
+
+    failed = 0
+    for name in args.checks:
+        failures = CHECKS[name](args.seed)
+        print("{:<24} {}".format(name, "FAILED" if len(failures) > 0 else "ok"))
+        for failure in failures:
+            print("    " + failure)
+        failed += len(failures) > 0
+
+    if failed > 0:
+        print("{} check(s) failed.".format(failed), file=sys.stderr)
+        sys.exit(1)
+
+
+
+if __name__ == "__main__":
+    main()
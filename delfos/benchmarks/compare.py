@@ -0,0 +1,297 @@
+"""
+Comparação de dois resultados da suíte de benchmarks (ver 'delfos.benchmarks.suite') e gate de regressão.
+
+Para cada etapa e escala presentes nos dois arquivos, compara os tempos das repetições com o teste de postos de Mann-Whitney (bilateral)
+e mede o efeito pela razão de Hodges-Lehmann (mediana das razões entre todos os pares de tempos, candidato / base).
+Uma etapa regride quando o teste rejeita a igualdade das distribuições E o efeito passa do limite (que nunca é menor que o efeito mínimo),
+então o ruído de poucas repetições não falha o gate. Etapas com menos repetições que o mínimo, de qualquer um dos lados, não são julgadas ('insufficient').
+Na etapa ao vivo ('live_quotes'), os tempos comparados são as latências de cada quote (a duração da etapa é fixa). O pico de memória também pode ter um limite.
+
+Imprime uma tabela com o efeito, o p-valor, a vazão (tickers/s, movements/s ou quotes/s) e o pico de memória de cada etapa,
+e sai com código 1 se alguma etapa regredir, faltar no candidato ('missing') ou não tiver repetições suficientes (0, caso contrário).
+
+Uso: python -m delfos.benchmarks.compare base.json candidato.json [--threshold 0.1] [--stage-threshold portfolio_parse=0.2] [--memory-threshold 0.2] [--alpha 0.05] [--min-samples 5] [--output comparacao.json]
+"""
+from scipy.stats import mannwhitneyu
+import numpy as np
+import argparse
+import json
+import sys
+
+
+MOVEMENTS_STAGES = ("b3_exports", "portfolio_parse", "portfolio_history") #etapas cuja escala é o número de movimentações
+MIN_SAMPLES = 5 #número mínimo de repetições de cada lado para julgar uma etapa (com menos, nenhum p-valor do teste de postos fica abaixo de 5%)
+MIN_EFFECT = 0.05 #efeito relativo mínimo para uma etapa regredir ou melhorar, qualquer que seja o limite pedido
+FAILED_STATUSES = ("regression", "missing", "insufficient") #status que falham o gate
+
+
+
+def load_results(path):
+    """
+    Lê um arquivo de resultados da suíte de benchmarks.
+
+    Parameters
+    ----------
+    path : str ou Path
+        O caminho do arquivo json.
+
+    Raises
+    ------
+    ValueError
+        Se o arquivo não tiver o formato dos resultados da suíte.
+
+    Returns
+    -------
+    dict
+        Os resultados ('environment' e 'results').
+    """
+    with open(path, "r", encoding="utf8") as results_file:
+        results = json.load(results_file)
+    if not isinstance(results, dict) or "results" not in results:
+        raise ValueError("File '{}' is not a benchmark results file.".format(path))
+    return results
+
+
+
+def get_unit(result):
+    """
+    Retorna a unidade da vazão de um resultado: 'quotes/s' na etapa ao vivo, 'movements/s' nas etapas de movimentações e 'tickers/s' nas demais.
+    """
+    if result["stage"] == "live_quotes":
+        return "quotes/s"
+    if result["stage"] in MOVEMENTS_STAGES:
+        return "movements/s"
+    return "tickers/s"
+
+
+
+def get_rank_test(base_times, candidate_times):
+    """
+    Compara os tempos do candidato e da base com o teste de postos de Mann-Whitney (bilateral) e estima o efeito pela razão de Hodges-Lehmann.
+
+    Parameters
+    ----------
+    base_times : list
+        Os tempos da base.
+    candidate_times : list
+        Os tempos do candidato.
+
+    Returns
+    -------
+    tuple
+        A razão de Hodges-Lehmann (mediana das razões candidato / base entre todos os pares de tempos) e o p-valor do teste.
+    """
+    base_times = np.asarray(base_times, dtype=float)
+    candidate_times = np.asarray(candidate_times, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = float(np.median(np.divide.outer(candidate_times, base_times)))
+    if np.all(base_times == base_times[0]) and np.all(candidate_times == base_times[0]):
+        return ratio, 1.0 #amostras idênticas e constantes (o teste não é definido)
+    return ratio, float(mannwhitneyu(candidate_times, base_times, alternative="two-sided").pvalue)
+
+
+
+def compare_results(base, candidate, threshold=0.1, stage_thresholds=None, memory_threshold=None, alpha=0.05, min_samples=MIN_SAMPLES, min_effect=MIN_EFFECT):
+    """
+    Compara dois resultados da suíte de benchmarks, etapa a etapa (mesma etapa e escala).
+
+    Parameters
+    ----------
+    base : dict
+        Os resultados de referência. (ver 'load_results')
+    candidate : dict
+        Os resultados comparados.
+    threshold : float
+        A piora relativa máxima dos tempos, medida pela razão de Hodges-Lehmann (0.1 = 10% mais lento). (default é 0.1)
+    stage_thresholds : dict
+        Limites por etapa, no formato {etapa: limite}, que substituem o 'threshold'. (default é None)
+    memory_threshold : float
+        A piora relativa máxima do pico de memória. (default é None, a memória não é checada)
+    alpha : float
+        O nível de significância do teste de Mann-Whitney. (default é 0.05)
+    min_samples : int
+        O número mínimo de repetições de cada lado para julgar uma etapa. (default é 'MIN_SAMPLES')
+    min_effect : float
+        O efeito relativo mínimo para uma etapa regredir ou melhorar; limites menores são elevados a ele. (default é 'MIN_EFFECT')
+
+    Returns
+    -------
+    list
+        Uma comparação (dict) por etapa e escala, com: stage, tickers, movements, status ('ok', 'regression', 'improvement', 'insufficient', 'new' ou 'missing'),
+        base_median_s, candidate_median_s, base_samples, candidate_samples, delta (efeito relativo), p_value, throughput, unit, base_peak_memory_bytes, candidate_peak_memory_bytes e memory_delta.
+    """
+    stage_thresholds = stage_thresholds if stage_thresholds is not None else {}
+
+    def key(result):
+        return (result["stage"], result.get("tickers"), result.get("movements"))
+
+    base_results = {key(result): result for result in base["results"]}
+    candidate_results = {key(result): result for result in candidate["results"]}
+
+    comparisons = []
+    for result_key in list(base_results) + [result_key for result_key in candidate_results if result_key not in base_results]:
+        stage, tickers, movements = result_key
+        base_result = base_results.get(result_key)
+        candidate_result = candidate_results.get(result_key)
+        reference = candidate_result if candidate_result is not None else base_result
+        comparison = {
+            "stage": stage, "tickers": tickers, "movements": movements, "status": None,
+            "base_median_s": None, "candidate_median_s": None, "base_samples": None, "candidate_samples": None, "delta": None, "p_value": None,
+            "throughput": reference.get("throughput_per_s"), "unit": get_unit(reference),
+            "base_peak_memory_bytes": None, "candidate_peak_memory_bytes": None, "memory_delta": None
+        }
+        comparisons.append(comparison)
+
+        if base_result is None or candidate_result is None:
+            comparison["status"] = "new" if base_result is None else "missing"
+            continue
+
+        comparison["base_median_s"] = base_result["median_s"]
+        comparison["candidate_median_s"] = candidate_result["median_s"]
+        comparison["base_samples"] = len(base_result["times_s"])
+        comparison["candidate_samples"] = len(candidate_result["times_s"])
+        if min(comparison["base_samples"], comparison["candidate_samples"]) < min_samples:
+            comparison["status"] = "insufficient" #poucas repetições: o teste não tem poder para separar o ruído de uma variação real
+        elif base_result["median_s"] > 0:
+            ratio, comparison["p_value"] = get_rank_test(base_result["times_s"], candidate_result["times_s"])
+            comparison["delta"] = ratio - 1
+            limit = max(stage_thresholds.get(stage, threshold), min_effect)
+            if comparison["p_value"] < alpha and comparison["delta"] > limit:
+                comparison["status"] = "regression"
+            elif comparison["p_value"] < alpha and comparison["delta"] < -limit:
+                comparison["status"] = "improvement"
+            else:
+                comparison["status"] = "ok"
+        else:
+            comparison["delta"] = 0.0
+            comparison["status"] = "ok"
+
+        base_memory = base_result.get("peak_memory_bytes")
+        candidate_memory = candidate_result.get("peak_memory_bytes")
+        comparison["base_peak_memory_bytes"] = base_memory
+        comparison["candidate_peak_memory_bytes"] = candidate_memory
+        if base_memory and candidate_memory is not None:
+            comparison["memory_delta"] = candidate_memory / base_memory - 1
+            if memory_threshold is not None and comparison["memory_delta"] > memory_threshold:
+                comparison["status"] = "regression"
+    return comparisons
+
+
+
+def get_environment_differences(base, candidate):
+    """
+    Lista as diferenças de ambiente (versões, plataforma e processador) entre dois resultados, que podem explicar variações de tempo.
+    """
+    base_environment = base.get("environment", {})
+    candidate_environment = candidate.get("environment", {})
+    differences = []
+    for field in ("python", "platform", "processor", "numpy", "pandas"):
+        if base_environment.get(field) != candidate_environment.get(field):
+            differences.append("{}: {} -> {}".format(field, base_environment.get(field), candidate_environment.get(field)))
+    return differences
+
+
+
+def format_table(comparisons):
+    """
+    Formata as comparações em uma tabela compacta de texto.
+
+    Parameters
+    ----------
+    comparisons : list
+        As comparações. (ver 'compare_results')
+
+    Returns
+    -------
+    str
+        A tabela.
+    """
+    def format_number(value, pattern):
+        return pattern.format(value) if value is not None else "-"
+
+    def format_memory(value):
+        return "{:.1f}MB".format(value / 1e6) if value is not None else "-"
+
+    lines = ["{:<24} {:>7} {:>9} {:>10} {:>10} {:>7} {:>8} {:>8} {:>22} {:>10} {:>8}  {}".format("stage", "tickers", "movements", "base", "candidate", "samples", "delta", "p-value", "throughput", "memory", "mem", "status")]
+    for comparison in comparisons:
+        samples = "{}/{}".format(comparison["base_samples"], comparison["candidate_samples"]) if comparison["base_samples"] is not None else "-"
+        throughput = "{} {}".format(format_number(comparison["throughput"], "{:,.0f}"), comparison["unit"])
+        lines.append("{:<24} {:>7} {:>9} {:>10} {:>10} {:>7} {:>8} {:>8} {:>22} {:>10} {:>8}  {}".format(
+            comparison["stage"],
+            comparison["tickers"] if comparison["tickers"] is not None else "-",
+            comparison["movements"] if comparison["movements"] is not None else "-",
+            format_number(comparison["base_median_s"], "{:.4f}s"),
+            format_number(comparison["candidate_median_s"], "{:.4f}s"),
+            samples,
+            format_number(comparison["delta"], "{:+.1%}"),
+            format_number(comparison["p_value"], "{:.3f}"),
+            throughput,
+            format_memory(comparison["candidate_peak_memory_bytes"]),
+            format_number(comparison["memory_delta"], "{:+.1%}"),
+            comparison["status"].upper() if comparison["status"] in FAILED_STATUSES else comparison["status"]
+        ))
+    return "\n".join(lines)
+
+
+
+def parse_stage_thresholds(values):
+    """
+    Converte a lista de argumentos 'etapa=limite' em um dicionário {etapa: limite}.
+
+    Raises
+    ------
+    ValueError
+        Se algum argumento não estiver no formato 'etapa=limite'.
+    """
+    stage_thresholds = {}
+    for value in values:
+        stage, separator, limit = value.partition("=")
+        if separator == "" or stage == "":
+            raise ValueError("Stage thresholds must have the 'stage=threshold' format.")
+        stage_thresholds[stage] = float(limit)
+    return stage_thresholds
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dois resultados da suíte de benchmarks e falha se alguma etapa regredir, faltar ou não tiver repetições suficientes.")
+    parser.add_argument("base", help="arquivo json dos resultados de referência")
+    parser.add_argument("candidate", help="arquivo json dos resultados comparados")
+    parser.add_argument("--threshold", type=float, default=0.1, help="piora relativa máxima dos tempos (0.1 = 10%%)")
+    parser.add_argument("--stage-threshold", nargs="*", default=[], help="limites por etapa, no formato etapa=limite")
+    parser.add_argument("--memory-threshold", type=float, default=None, help="piora relativa máxima do pico de memória (default é não checar)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="nível de significância do teste de Mann-Whitney")
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES, help="repetições mínimas de cada lado para julgar uma etapa")
+    parser.add_argument("--min-effect", type=float, default=MIN_EFFECT, help="efeito relativo mínimo para uma etapa regredir (limites menores são elevados a ele)")
+    parser.add_argument("--output", default=None, help="arquivo json para as comparações")
+    args = parser.parse_args()
+
+    try:
+        stage_thresholds = parse_stage_thresholds(args.stage_threshold)
+    except ValueError as e:
+        parser.error(str(e))
+
+    base = load_results(args.base)
+    candidate = load_results(args.candidate)
+    comparisons = compare_results(base, candidate, args.threshold, stage_thresholds, args.memory_threshold, args.alpha, args.min_samples, args.min_effect)
+
+    for difference in get_environment_differences(base, candidate):
+        print("warning: environment differs ({})".format(difference), file=sys.stderr)
+    print(format_table(comparisons))
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf8") as output_file:
+            json.dump(comparisons, output_file, indent=4)
+
+    failures = [comparison for comparison in comparisons if comparison["status"] in FAILED_STATUSES]
+    if len(failures) > 0:
+        for status, message in (("regression", "regressed"), ("missing", "missing from the candidate"), ("insufficient", "with fewer than {} samples (raise --repeats)".format(args.min_samples))):
+            count = sum(comparison["status"] == status for comparison in failures)
+            if count > 0:
+                print("{} stage(s) {}.".format(count, message), file=sys.stderr)
+        sys.exit(1)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+from delfos.market.session import Session
+from delfos.common.configs import Configs
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+
+CONFIGS = Configs()
+
+SESSION_FREQ_PER_YEAR = CONFIGS.DEFAULTS["SESSION_FREQ_PER_YEAR"] #número de dias no ano em que o mercado funciona
+
+
+
+def make_tickers(n_tickers):
+    """
+    Escolhe 'n_tickers' tickers para fixtures, começando pelos tickers da B3 e completando com tickers sintéticos (ex: SYN0001 3).
+
+    Parameters
+    ----------
+    n_tickers : int
+        O número de tickers.
+
+    Returns
+    -------
+    dict
+        Dicionário com as infos dos tickers, no mesmo formato do arquivo tickers.json.
+    """
+    tickers_dict = CONFIGS.TICKERS_DICT
+    tickers = {}
+    for ticker in list(tickers_dict.keys())[:n_tickers]:
+        tickers[ticker] = tickers_dict[ticker]
+    for i in range(n_tickers - len(tickers)):
+        tickers["SY{:04d}3".format(i)] = {"Nome de pregão": "SINTETICA", "CNPJ": "undefined", "Nome": "SINTETICA", "Setor": "undefined", "Sub Setor": "undefined", "Segmento": "undefined"}
+    return tickers
+
+
+
+def make_histories(tickers, date, years=6, seed=0):
+    """
+    Gera históricos sintéticos (passeio aleatório geométrico) para os tickers passados, em dias úteis até a data passada.
+
+    Parameters
+    ----------
+    tickers : list
+        Os tickers dos históricos.
+    date : datetime
+        A última data dos históricos.
+    years : int
+        O número de anos dos históricos. (default é 6 anos)
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+
+    Returns
+    -------
+    dict
+        Dicionário no formato {ticker: DataFrame}, com as colunas Open, High, Low, Close, Volume, Dividends e Stock Splits.
+    """
+    random = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp(date.date()), periods=years * SESSION_FREQ_PER_YEAR)
+    rets = random.normal(0.0003, 0.02, (len(index), len(tickers)))
+    closes = (random.uniform(5, 100, len(tickers)) * np.exp(np.cumsum(rets, axis=0))).round(2)
+    volumes = random.integers(1000, 5000000, (len(index), len(tickers)))
+
+    histories = {}
+    for i, ticker in enumerate(tickers):
+        close = closes[:, i]
+        histories[ticker] = pd.DataFrame({
+            "Open": close,
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": volumes[:, i],
+            "Dividends": 0.0,
+            "Stock Splits": 0.0
+        }, index=index)
+    return histories
+
+
+
+def make_fundamentals(tickers, seed=0):
+    """
+    Gera dados fundamentalistas sintéticos para os tickers passados.
+
+    Returns
+    -------
+    dict
+        Dicionário no formato {ticker: {'shares_outstanding': int, 'equity': float, 'earnings': float}}.
+    """
+    random = np.random.default_rng(seed)
+    fundamentals = {}
+    for ticker in tickers:
+        shares = int(random.integers(10000000, 5000000000))
+        fundamentals[ticker] = {"shares_outstanding": shares, "equity": float(shares * random.uniform(1, 30)), "earnings": float(shares * random.uniform(-1, 4))}
+    return fundamentals
+
+
+
+def make_session(n_tickers, date=None, years=6, seed=0, index_ticker="^BVSP", compact_histories=False):
+    """
+    Cria uma sessão offline com históricos e dados fundamentalistas sintéticos (nenhum download é feito).
+
+    Parameters
+    ----------
+    n_tickers : int
+        O número de ações da sessão.
+    date : datetime
+        A data da sessão. (default é None, a data atual)
+    years : int
+        O número de anos dos históricos. (default é 6 anos)
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+    index_ticker : str
+        O ticker do índice de mercado sintético. (default é o ibovespa)
+    compact_histories : bool
+        Se verdadeiro, guarda os históricos de forma enxuta. (default é False)
+
+    Returns
+    -------
+    Session
+        A sessão criada.
+    """
+    if date is None:
+        date = datetime.now()
+    tickers = make_tickers(n_tickers)
+    histories = make_histories(list(tickers) + [index_ticker], date, years, seed)
+    fundamentals = make_fundamentals(tickers, seed)
+    return Session(date=date, period=years, tickers=tickers, index_ticker=index_ticker, risk_free_rate=0.1, histories=histories, fundamentals=fundamentals, compact_histories=compact_histories)
+
+
+
+def make_movements(session, n_movements, n_tickers=30, seed=0):
+    """
+    Gera movimentações sintéticas (compras, vendas e dividendos) sobre as ações de uma sessão, nos preços de fechamento dos históricos.
+    As vendas nunca passam da quantidade em carteira.
+
+    Parameters
+    ----------
+    session : Session
+        A sessão com as ações e os históricos.
+    n_movements : int
+        O número de movimentações.
+    n_tickers : int
+        O número de ações diferentes na carteira. (default é 30)
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+
+    Returns
+    -------
+    list
+        Lista de dicionários no mesmo formato da função 'get_movements_list_from_b3_exports', ordenada por data.
+    """
+    random = np.random.default_rng(seed)
+    stocks = session.select_stocks("all")[:n_tickers]
+    dates = session.closing_prices_table.index
+    chosen_dates = np.sort(random.choice(len(dates), n_movements))
+    chosen_stocks = random.integers(0, len(stocks), n_movements)
+    kinds = random.random(n_movements)
+    quantities = random.integers(1, 500, n_movements)
+
+    holdings = {}
+    movements = []
+    for date_i, stock_i, kind, quantity in zip(chosen_dates, chosen_stocks, kinds, quantities):
+        stock = stocks[stock_i]
+        date = dates[date_i]
+        price = stock.history["Close"].asof(date)
+        if pd.isna(price):
+            continue
+        held = holdings.get(stock.ticker, 0)
+        if kind < 0.2 and held > 0:
+            typ = "sell"
+            quantity = min(int(quantity), held)
+        elif kind < 0.3 and held > 0:
+            typ = "dividends"
+            quantity = held
+        else:
+            typ = "buy"
+        quantity = int(quantity)
+        holdings[stock.ticker] = held + quantity if typ == "buy" else held - quantity if typ == "sell" else held
+
+        price = 0.0 if typ == "dividends" else round(float(price), 2)
+        amount = round(quantity * 0.01 * float(random.uniform(1, 50)), 2) if typ == "dividends" else round(price * quantity, 2)
+        movements.append({"ticker": stock.ticker, "type": typ, "price_per_share": price, "quantity": quantity, "amount": amount, "date": date.strftime("%d-%m-%Y")})
+    return movements
+
+
+
+def write_b3_exports(movements, folder, file_format="xlsx"):
+    """
+    Grava movimentações no formato dos arquivos de movimentação exportados pela B3 (1 arquivo por ano), lidos pela função 'get_movements_list_from_b3_exports'.
+
+    Parameters
+    ----------
+    movements : list
+        Lista de dicionários com as movimentações. (ver 'make_movements')
+    folder : str ou Path
+        A pasta dos arquivos.
+    file_format : str
+        O formato dos arquivos: 'xlsx' (como o da B3), 'csv' ou 'parquet' (depende do pyarrow). (default é 'xlsx')
+
+    Raises
+    ------
+    ValueError
+        Se o formato não for válido.
+
+    Returns
+    -------
+    list
+        Os caminhos dos arquivos gravados.
+    """
+    if file_format not in ("xlsx", "csv", "parquet"):
+        raise ValueError("Argument 'file_format' must be 'xlsx', 'csv' or 'parquet'.")
+
+    kinds = {"buy": ("Credito", "Transferência - Liquidação"), "sell": ("Débito", "Transferência - Liquidação"), "dividends": ("Credito", "Dividendo")}
+    rows = []
+    for movement in movements:
+        direction, kind = kinds[movement["type"]]
+        rows.append({
+            "Entrada/Saída": direction,
+            "Data": datetime.strptime(movement["date"], "%d-%m-%Y").strftime("%d/%m/%Y"),
+            "Movimentação": kind,
+            "Produto": "{} - SINTETICA".format(movement["ticker"]),
+            "Instituição": "CORRETORA SINTETICA",
+            "Quantidade": movement["quantity"],
+            "Preço unitário": movement["price_per_share"] if movement["type"] != "dividends" else "-",
+            "Valor da Operação": movement["amount"]
+        })
+
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    exports = pd.DataFrame(rows, columns=["Entrada/Saída", "Data", "Movimentação", "Produto", "Instituição", "Quantidade", "Preço unitário", "Valor da Operação"])
+    years = pd.to_datetime(exports["Data"], format="%d/%m/%Y").dt.year
+
+    paths = []
+    for year, year_exports in exports.groupby(years):
+        path = folder / "movimentacao-{}.{}".format(year, file_format)
+        year_exports = year_exports.iloc[::-1] #a B3 exporta do mais recente para o mais antigo
+        if file_format == "xlsx":
+            year_exports.to_excel(path, index=False)
+        elif file_format == "csv":
+            year_exports.to_csv(path, index=False)
+        else:
+            year_exports.astype({"Preço unitário": str}).to_parquet(path, index=False) #coluna com números e '-'
+        paths.append(path)
+    return paths
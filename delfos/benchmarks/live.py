@@ -0,0 +1,112 @@
+"""
+Benchmark do caminho ao vivo dos preços (streamer -> Stock.__update_current_price) para uma sessão completa, contra um simulador local de quotes.
+
+Uso: python -m delfos.benchmarks.live --tickers 476 --duration 10 [--rate 5000] [--ticks ticks.csv] [--output live.json]
+"""
+from delfos.benchmarks.fixtures import make_session
+from delfos.benchmarks.measure import get_rss, get_percentiles
+from delfos.market.simulator import QuoteFeed, SimulatedQuoteStreamer, load_ticks, set_default_feed
+import delfos.market.simulator as simulator_module
+import delfos.market.stock as stock_module
+from delfos.common.events import BATCHER
+import numpy as np
+import argparse
+import json
+
+
+LATENCY_SAMPLES = 1000 #número máximo de latências individuais devolvidas (amostra espaçada igualmente ao longo do benchmark)
+
+
+
+def run_live_benchmark(n_tickers=476, duration=10, rate=None, ticks=None, seed=0, session=None):
+    """
+    Cria uma sessão offline, abre o stream simulado de preços de todas as suas ações e mede o caminho ao vivo.
+    Um consumidor é inscrito no evento 'price' da sessão (sem inscritos, os eventos ao vivo são descartados). Ao final, os streams são fechados,
+    a inscrição é cancelada e a fonte de quotes e o streamer padrão são restaurados, então o benchmark pode rodar várias vezes no mesmo processo.
+
+    Parameters
+    ----------
+    n_tickers : int
+        O número de ações da sessão. (default é 476, o universo da B3)
+    duration : int ou float
+        O tempo em segundos emitindo quotes. (default é 10 segundos)
+    rate : int ou float
+        A taxa agregada de emissão em quotes por segundo. (default é None, o mais rápido possível, mede a vazão sustentada)
+    ticks : list
+        Ticks gravados (ver 'delfos.market.simulator.load_ticks'). (default é None, gera ticks sintéticos)
+    seed : int
+        A semente dos dados sintéticos. (default é 0)
+    session : Session
+        Uma sessão já criada, usada no lugar da sessão sintética de 'n_tickers' ações. (default é None)
+
+    Returns
+    -------
+    dict
+        Os resultados: número de quotes, vazão (quotes/seg), percentis da latência (ms), uma amostra das latências de cada quote (s), número de lotes do evento 'price'
+        e crescimento da memória (bytes).
+    """
+    if session is None:
+        session = make_session(n_tickers, seed=seed)
+    base_prices = {stock.ticker + ".SA": stock.current_price for stock in session.select_stocks("all")}
+    feed = QuoteFeed(rate=rate, ticks=ticks, base_prices=base_prices, seed=seed)
+
+    previous_feed = simulator_module.DEFAULT_FEED
+    batches = []
+    set_default_feed(feed)
+    stock_module.set_quote_streamer_class(SimulatedQuoteStreamer)
+    callback = session.subscribe("price", batches.append) #consumidor dos lotes (como um portfolio ou um cliente do servidor)
+    try:
+        for stock in session.select_stocks("all"):
+            stock.stream_prices() #abre o stream simulado de cada ação (mesmo caminho do stream real)
+
+        memory_start = get_rss()
+        feed.run(duration=duration)
+        memory_end = get_rss()
+    finally:
+        for stock in session.select_stocks("all"):
+            stock.stop_price_stream()
+        BATCHER.flush() #publica o último lote antes de cancelar a inscrição
+        session.unsubscribe("price", callback)
+        stock_module.set_quote_streamer_class(None)
+        set_default_feed(previous_feed)
+
+    latencies = get_percentiles(feed.latencies * 1000)
+    samples = feed.latencies[np.linspace(0, len(feed.latencies) - 1, min(len(feed.latencies), LATENCY_SAMPLES)).astype(int)]
+    return {
+        "tickers": session.stocks_num,
+        "quotes": feed.delivered_num,
+        "elapsed_s": feed.elapsed,
+        "quotes_per_s": feed.delivered_num / feed.elapsed if feed.elapsed > 0 else None,
+        "target_rate": rate,
+        "latency_ms": latencies,
+        "latency_samples_s": samples.tolist(),
+        "price_batches": len(batches),
+        "memory_start_bytes": memory_start,
+        "memory_end_bytes": memory_end,
+        "memory_growth_bytes": memory_end - memory_start if memory_start is not None and memory_end is not None else None
+    }
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho ao vivo dos preços contra um simulador local de quotes.")
+    parser.add_argument("--tickers", type=int, default=476, help="número de ações da sessão")
+    parser.add_argument("--duration", type=float, default=10, help="tempo em segundos emitindo quotes")
+    parser.add_argument("--rate", type=float, default=None, help="taxa agregada em quotes/seg (default: o mais rápido possível)")
+    parser.add_argument("--ticks", default=None, help="arquivo csv com ticks gravados (identifier, price, dayVolume)")
+    parser.add_argument("--seed", type=int, default=0, help="semente dos dados sintéticos")
+    parser.add_argument("--output", default=None, help="arquivo json para os resultados")
+    args = parser.parse_args()
+
+    ticks = load_ticks(args.ticks) if args.ticks is not None else None
+    results = run_live_benchmark(args.tickers, args.duration, args.rate, ticks, args.seed)
+
+    print(json.dumps(results, indent=4))
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf8") as output_file:
+            json.dump(results, output_file, indent=4)
+
+
+
+if __name__ == "__main__":
+    main()
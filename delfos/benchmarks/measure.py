@@ -0,0 +1,49 @@
+import numpy as np
+import os
+
+
+
+def get_rss():
+    """
+    Mede a memória residente (RSS) atual do processo.
+
+    Returns
+    -------
+    int ou None
+        A memória residente em bytes. (None, se não for possível medir neste sistema)
+    """
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 #pico, em kilobytes no linux
+    except ImportError:
+        return None
+
+
+
+def get_percentiles(values, percentiles=(50, 90, 99)):
+    """
+    Calcula os percentis de uma lista de valores.
+
+    Parameters
+    ----------
+    values : list ou array
+        Os valores.
+    percentiles : tuple
+        Os percentis a serem calculados. (default é 50, 90 e 99)
+
+    Returns
+    -------
+    dict
+        Dicionário no formato {'p<percentil>': valor}, mais o valor máximo. (valores None, se a lista estiver vazia)
+    """
+    values = np.asarray(values, dtype=float)
+    result = {}
+    for percentile in percentiles:
+        result["p{}".format(percentile)] = float(np.percentile(values, percentile)) if len(values) > 0 else None
+    result["max"] = float(values.max()) if len(values) > 0 else None
+    return result
@@ -0,0 +1,263 @@
+"""
+Suíte de benchmarks offline dos caminhos críticos de Session, do modelo de alocação e de Portfolio, sobre fixtures sintéticas (nenhum download é feito).
+
+Etapas medidas separadamente, em várias escalas:
+    - session_build: criação da sessão (históricos, triagem e dados fundamentalistas)
+    - closing_prices_table: tabela de preços de fechamento
+    - covariances_table: matriz de covariância Ledoit-Wolf
+    - update_allocation_model: modelo Black Litterman completo
+    - b3_exports: leitura dos arquivos de movimentação da B3 ('get_movements_list_from_b3_exports')
+    - portfolio_parse: criação do portfolio (parse das movimentações e histórico)
+    - portfolio_history: histórico do portfolio
+    - live_quotes: caminho ao vivo dos preços contra o simulador local de quotes (os tempos são as latências de cada quote)
+
+Uso: python -m delfos.benchmarks.suite [--tickers 50 476 2000] [--movements 1000 100000] [--repeats 5] [--output results.json]
+Dois resultados são comparados (gate de regressão) com: python -m delfos.benchmarks.compare base.json candidato.json
+"""
+from delfos.benchmarks.fixtures import make_tickers, make_histories, make_fundamentals, make_movements, write_b3_exports
+from delfos.benchmarks.measure import get_rss
+from delfos.benchmarks.live import run_live_benchmark
+from delfos.market.session import Session
+from delfos.broker.portfolio import Portfolio, get_movements_list_from_b3_exports
+import delfos.common.utils as utils
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import tempfile
+import tracemalloc
+import subprocess
+import platform
+import argparse
+import json
+import time
+import sys
+
+
+STAGES = ("session_build", "closing_prices_table", "covariances_table", "update_allocation_model", "b3_exports", "portfolio_parse", "portfolio_history", "live_quotes")
+SUITE_VERSION = 1 #versão do formato dos resultados
+
+
+
+def measure(function, setup=None, repeats=3, max_time=None, memory=True):
+    """
+    Mede o tempo de uma função, repetindo 'repeats' vezes (ou até estourar 'max_time'), e o pico de memória alocada em uma execução extra (tracemalloc).
+
+    Parameters
+    ----------
+    function : function
+        A função medida. Recebe o retorno de 'setup', se passado.
+    setup : function
+        Função chamada antes de cada execução, fora da medição (ex: copiar dados que a função altera). (default é None)
+    repeats : int
+        O número de execuções medidas. (default é 3)
+    max_time : int ou float
+        O tempo máximo em segundos somando as execuções; pelo menos uma execução é sempre feita. (default é None, sem limite)
+    memory : bool
+        Se verdadeiro, faz uma execução extra com o tracemalloc ligado para medir o pico de memória alocada. (default é True)
+
+    Returns
+    -------
+    dict
+        Os tempos de cada execução (s), a mediana, o mínimo e o pico de memória (bytes, None se não medido).
+    """
+    times = []
+    started = time.perf_counter()
+    for i in range(repeats):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+        if max_time is not None and time.perf_counter() - started > max_time:
+            break
+
+    peak_memory = None
+    if memory:
+        args = (setup(),) if setup is not None else ()
+        tracemalloc.start()
+        try:
+            function(*args)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {"repeats": len(times), "times_s": times, "median_s": float(np.median(times)), "min_s": float(np.min(times)), "peak_memory_bytes": peak_memory}
+
+
+
+def get_environment():
+    """
+    Descreve o ambiente em que a suíte rodou (versões e commit), para comparar resultados.
+
+    Returns
+    -------
+    dict
+        As informações do ambiente.
+    """
+    import pandas as pd
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5, cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "suite_version": SUITE_VERSION,
+        "time": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__
+    }
+
+
+
+def run_suite(tickers_scales=(50, 476, 2000), movements_scales=(1000, 100000), stages=STAGES, repeats=5, max_time=60, years=6, seed=0, live_duration=2, memory=True, verbose=True):
+    """
+    Roda a suíte de benchmarks.
+
+    As etapas de sessão, alocação e ao vivo rodam em cada escala de tickers. As etapas de movimentações rodam em cada escala de movimentações,
+    sobre a sessão da menor escala de tickers.
+
+    Parameters
+    ----------
+    tickers_scales : tuple
+        Os números de ações das sessões. (default é 50, 476 e 2000)
+    movements_scales : tuple
+        Os números de movimentações dos portfolios. (default é 1000 e 100000)
+    stages : tuple
+        As etapas medidas. (default são todas, ver STAGES)
+    repeats : int
+        O número de execuções medidas de cada etapa. (default é 5, o mínimo da comparação)
+    max_time : int ou float
+        O tempo máximo em segundos das execuções de cada etapa. (default é 60 segundos)
+    years : int
+        O número de anos dos históricos. (default é 6 anos)
+    seed : int
+        A semente das fixtures. (default é 0)
+    live_duration : int ou float
+        O tempo em segundos emitindo quotes na etapa ao vivo. (default é 2 segundos)
+    memory : bool
+        Se verdadeiro, mede o pico de memória alocada de cada etapa. (default é True)
+    verbose : bool
+        Se verdadeiro, printa cada resultado. (default é True)
+
+    Raises
+    ------
+    ValueError
+        Se alguma etapa não existir.
+
+    Returns
+    -------
+    dict
+        O ambiente ('environment') e a lista de resultados ('results'), um por etapa e escala.
+    """
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError("Invalid stage '{}'. Valid stages: {}.".format(stage, ", ".join(STAGES)))
+
+    from pypfopt import risk_models, black_litterman #os imports pesados (feitos só no primeiro uso) ficam fora das medições
+
+    date = datetime.now()
+    results = []
+
+    def record(stage, measured, tickers, movements=None, items=None, extra=None):
+        result = {"stage": stage, "tickers": tickers, "movements": movements, "items": items}
+        result.update(measured)
+        result["throughput_per_s"] = items / measured["median_s"] if items and measured["median_s"] > 0 else None
+        if extra is not None:
+            result.update(extra)
+        results.append(result)
+        if verbose:
+            print("{:<24} tickers={:<6} movements={:<8} median={:.4f}s peak_memory={}".format(stage, tickers, movements if movements is not None else "-", result["median_s"], result["peak_memory_bytes"]), file=sys.stderr)
+
+    sessions = {}
+    for n_tickers in sorted(tickers_scales):
+        tickers = make_tickers(n_tickers)
+        histories = make_histories(list(tickers) + ["^BVSP"], date, years, seed)
+        fundamentals = make_fundamentals(tickers, seed)
+
+        def build():
+            return Session(date=date, period=years, tickers=tickers, risk_free_rate=0.1, histories=histories, fundamentals=fundamentals)
+
+        if "session_build" in stages:
+            record("session_build", measure(build, repeats=repeats, max_time=max_time, memory=memory), n_tickers, items=n_tickers)
+        session = build()
+        sessions[n_tickers] = session
+
+        #os métodos privados de cálculo são chamados direto para forçar o recálculo das tabelas em cada execução
+        if "closing_prices_table" in stages:
+            record("closing_prices_table", measure(session._Session__set_closing_prices_table, repeats=repeats, max_time=max_time, memory=memory), n_tickers, items=n_tickers)
+        if "covariances_table" in stages:
+            session.closing_prices_table
+            record("covariances_table", measure(session._Session__set_covariances_table, repeats=repeats, max_time=max_time, memory=memory), n_tickers, items=n_tickers)
+        if "update_allocation_model" in stages:
+            def allocate():
+                utils.block_print() #o modelo printa a performance
+                try:
+                    session.update_allocation_model()
+                finally:
+                    utils.enable_print()
+            record("update_allocation_model", measure(allocate, repeats=repeats, max_time=max_time, memory=memory), n_tickers, items=n_tickers)
+
+    #etapas de movimentações, sobre a sessão da menor escala
+    session = sessions[min(tickers_scales)]
+    for n_movements in sorted(movements_scales):
+        if not any(stage in stages for stage in ("b3_exports", "portfolio_parse", "portfolio_history")):
+            break
+        movements = make_movements(session, n_movements, seed=seed)
+
+        if "b3_exports" in stages:
+            with tempfile.TemporaryDirectory() as folder:
+                try:
+                    write_b3_exports(movements, folder)
+                except ImportError as e:
+                    print("skipping b3_exports: {}".format(e), file=sys.stderr) #a escrita/leitura de xlsx depende do openpyxl
+                else:
+                    record("b3_exports", measure(lambda: get_movements_list_from_b3_exports(folder), repeats=repeats, max_time=max_time, memory=memory), min(tickers_scales), n_movements, items=n_movements)
+
+        if "portfolio_parse" in stages:
+            record("portfolio_parse", measure(lambda: Portfolio(session, cash=0.0, movements=movements), repeats=repeats, max_time=max_time, memory=memory), min(tickers_scales), n_movements, items=n_movements)
+        if "portfolio_history" in stages:
+            portfolio = Portfolio(session, cash=0.0, movements=movements)
+            record("portfolio_history", measure(portfolio._Portfolio__set_history, repeats=repeats, max_time=max_time, memory=memory), min(tickers_scales), n_movements, items=n_movements)
+
+    #etapa ao vivo por último: as quotes alteram os históricos das sessões
+    if "live_quotes" in stages:
+        for n_tickers, session in sessions.items():
+            memory_start = get_rss()
+            live = run_live_benchmark(duration=live_duration, seed=seed, session=session)
+            #a duração da etapa é fixa: os tempos comparados são as latências de cada quote e a vazão vem do número de quotes entregues
+            samples = live["latency_samples_s"]
+            measured = {"repeats": len(samples), "times_s": samples, "median_s": float(np.median(samples)) if samples else 0.0, "min_s": float(np.min(samples)) if samples else 0.0, "peak_memory_bytes": live["memory_growth_bytes"]}
+            record("live_quotes", measured, n_tickers, items=live["quotes"], extra={"throughput_per_s": live["quotes_per_s"], "elapsed_s": live["elapsed_s"], "latency_ms": live["latency_ms"], "rss_bytes": memory_start})
+
+    return {"environment": get_environment(), "results": results}
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de benchmarks offline de Session, do modelo de alocação e de Portfolio.")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[50, 476, 2000], help="escalas de número de ações")
+    parser.add_argument("--movements", type=int, nargs="+", default=[1000, 100000], help="escalas de número de movimentações")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES, help="etapas medidas")
+    parser.add_argument("--repeats", type=int, default=5, help="execuções medidas por etapa (a comparação exige pelo menos 5)")
+    parser.add_argument("--max-time", type=float, default=60, help="tempo máximo em segundos das execuções de cada etapa")
+    parser.add_argument("--years", type=int, default=6, help="anos dos históricos")
+    parser.add_argument("--seed", type=int, default=0, help="semente das fixtures")
+    parser.add_argument("--live-duration", type=float, default=2, help="tempo em segundos emitindo quotes na etapa ao vivo")
+    parser.add_argument("--no-memory", action="store_true", help="não mede o pico de memória (mais rápido)")
+    parser.add_argument("--output", default=None, help="arquivo json para os resultados")
+    args = parser.parse_args()
+
+    results = run_suite(args.tickers, args.movements, tuple(args.stages), args.repeats, args.max_time, args.years, args.seed, args.live_duration, not args.no_memory)
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf8") as output_file:
+            json.dump(results, output_file, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+
+
+if __name__ == "__main__":
+    main()
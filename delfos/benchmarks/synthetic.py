@@ -0,0 +1,423 @@
+"""
+Gerador sintético (com semente) de mercados e carteiras em grande escala, para testes de escala e estresse de Session e Portfolio (ex: 5.000 tickers x 20 anos e 1 milhão de movimentações).
+
+Gera:
+    - infos dos tickers no formato do arquivo tickers.json (empresas com ações ON, PN e Units, setores da taxonomia da B3)
+    - históricos OHLCV com fator de mercado, desdobramentos/grupamentos, dividendos, buracos (dias sem negócio), novas listagens e deslistagens
+    - o histórico do índice de mercado e dados fundamentalistas
+    - movimentações no formato dos dicionários lidos pela classe Portfolio (preços da época, antes dos desdobramentos) e os arquivos de movimentação da B3
+
+Os dados gerados entram direto no caminho de dados gravados da classe Session ('histories' e 'fundamentals'). Gravados em disco (ver 'write_synthetic_dataset'),
+os históricos ficam em um HistoryStore mapeado em memória.
+
+Uso: python -m delfos.benchmarks.synthetic --output <pasta> [--tickers 5000] [--years 20] [--movements 1000000] [--seed 0] [--exports csv xlsx]
+"""
+from delfos.benchmarks.fixtures import make_fundamentals, write_b3_exports
+from delfos.market.store import write_history_store, HistoryStore
+from delfos.common.configs import Configs
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import sys
+
+
+CONFIGS = Configs()
+
+SESSION_FREQ_PER_YEAR = CONFIGS.DEFAULTS["SESSION_FREQ_PER_YEAR"] #número de dias no ano em que o mercado funciona
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SHARE_CLASSES = (("3",), ("3", "4"), ("3", "4", "11")) #classes de ações das empresas sintéticas (ON; ON e PN; ON, PN e Unit)
+SPLIT_RATIOS = (2.0, 3.0, 4.0, 5.0, 10.0) #desdobramentos
+REVERSE_SPLIT_RATIOS = (0.1, 0.2, 0.5) #grupamentos
+CHUNK_SIZE = 256 #número de tickers gerados por vez (limita o pico de memória)
+MARKET_DRIFT = 0.0005 #retorno log diário do fator de mercado (~13% ao ano), fixado em cada ano do histórico
+MARKET_VOLATILITY = 0.012 #volatilidade diária do fator de mercado
+RISK_FREE_RATE = 0.05 #taxa livre de risco anual dos datasets sintéticos (abaixo do retorno do mercado: o prêmio de risco do mercado é positivo)
+
+
+
+def make_synthetic_tickers(n_tickers, seed=0):
+    """
+    Gera as infos de tickers sintéticos no formato do arquivo tickers.json. Cada empresa (CNPJ) tem uma, duas ou três classes de ações (ON, PN e Unit)
+    e um setor, sub setor e segmento sorteados da taxonomia dos tickers da B3 (com os mesmos pesos). Os tickers não colidem com os da B3.
+
+    Parameters
+    ----------
+    n_tickers : int
+        O número de tickers.
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+
+    Returns
+    -------
+    dict
+        Dicionário com as infos dos tickers, no mesmo formato do arquivo tickers.json.
+    """
+    random = np.random.default_rng(seed)
+    b3_tickers = CONFIGS.TICKERS_DICT
+    taxonomy = [(info["Setor"], info["Sub Setor"], info["Segmento"]) for info in b3_tickers.values()] #com repetição: o sorteio mantém os pesos da B3
+    roots = {ticker[:4] for ticker in b3_tickers}
+
+    tickers = {}
+    company = 0
+    while len(tickers) < n_tickers:
+        #raiz de 4 letras a partir do número da empresa, começando em 'SAAA' para fugir das raízes mais comuns
+        code = company + 18 * 26 ** 3
+        root = "".join(LETTERS[code // 26 ** power % 26] for power in (3, 2, 1, 0))
+        company += 1
+        if root in roots:
+            continue
+
+        sector, sub_sector, segment = taxonomy[random.integers(len(taxonomy))]
+        cnpj = "{:02d}.{:03d}.{:03d}/0001-{:02d}".format(*random.integers(0, (100, 1000, 1000, 100)))
+        classes = SHARE_CLASSES[random.choice(len(SHARE_CLASSES), p=(0.6, 0.3, 0.1))]
+        for share_class in classes:
+            if len(tickers) == n_tickers:
+                break
+            tickers[root + share_class] = {
+                "Nome de pregão": "{} SINT".format(root),
+                "CNPJ": cnpj,
+                "Nome": "EMPRESA SINTETICA {} S.A.".format(root),
+                "Setor": sector,
+                "Sub Setor": sub_sector,
+                "Segmento": segment
+            }
+    return tickers
+
+
+
+def make_synthetic_histories(tickers, date, years=20, seed=0, index_ticker="^BVSP", listing_ratio=0.3, delisting_ratio=0.1, gap_ratio=0.02, splits_per_year=0.03, payers_ratio=0.6):
+    """
+    Gera históricos sintéticos realistas para os tickers passados, em dias úteis até a data passada, e o histórico do índice de mercado.
+
+    Os preços seguem um modelo de um fator: retorno = beta x retorno do mercado + ruído idiossincrático. O fator de mercado tem a mesma média (MARKET_DRIFT) em cada ano
+    do histórico, então qualquer período de análise tem prêmio de risco positivo sobre RISK_FREE_RATE (o preço de risco do modelo de alocação é positivo).
+    Os históricos têm o formato dos baixados pela api do yfinance:
+        - preços ajustados pelos desdobramentos (contínuos), com a razão de cada desdobramento/grupamento na coluna 'Stock Splits' da sua data
+        - dividendos por ação (nos preços ajustados) na coluna 'Dividends', pagos 1, 2 ou 4 vezes ao ano pelas pagadoras
+        - buracos: dias sem histórico e dias sem negócio (volume 0 e preços repetidos), mais comuns nas ações menos líquidas
+        - novas listagens (histórico começa depois do início do período) e deslistagens (histórico termina antes da data, ação inativa)
+
+    Parameters
+    ----------
+    tickers : list ou dict
+        Os tickers dos históricos.
+    date : datetime
+        A última data dos históricos.
+    years : int
+        O número de anos dos históricos. (default é 20 anos)
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+    index_ticker : str
+        O ticker do índice de mercado, gerado a partir do fator de mercado. (default é o ibovespa)
+    listing_ratio : float
+        A fração dos tickers listados depois do início do período. (default é 0.3)
+    delisting_ratio : float
+        A fração dos tickers deslistados antes da data. (default é 0.1)
+    gap_ratio : float
+        A fração média dos pregões sem negócio de cada ticker. (default é 0.02)
+    splits_per_year : float
+        O número médio de desdobramentos/grupamentos por ticker por ano. (default é 0.03)
+    payers_ratio : float
+        A fração dos tickers que pagam dividendos. (default é 0.6)
+
+    Returns
+    -------
+    dict
+        Dicionário no formato {ticker: DataFrame}, com as colunas Open, High, Low, Close, Volume, Dividends e Stock Splits (inclui o índice de mercado).
+    """
+    random = np.random.default_rng(seed)
+    tickers = list(tickers)
+    index = pd.bdate_range(end=pd.Timestamp(date.date()), periods=years * SESSION_FREQ_PER_YEAR)
+    n_days = len(index)
+
+    market = random.normal(0, MARKET_VOLATILITY, n_days) #retornos diários do fator de mercado
+    years_rows = (n_days - 1 - np.arange(n_days)) // SESSION_FREQ_PER_YEAR #ano de cada pregão, contado a partir do fim
+    market += MARKET_DRIFT - (np.bincount(years_rows, market) / np.bincount(years_rows))[years_rows] #a média de cada ano é o drift
+    index_close = 100000 * np.exp(np.cumsum(market))
+    histories = {index_ticker: pd.DataFrame({
+        "Open": np.concatenate([[index_close[0]], index_close[:-1]]),
+        "High": index_close * 1.005,
+        "Low": index_close * 0.995,
+        "Close": index_close,
+        "Volume": random.integers(1000000, 10000000, n_days),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0
+    }, index=index)}
+
+    for chunk_start in range(0, len(tickers), CHUNK_SIZE):
+        chunk = tickers[chunk_start:chunk_start + CHUNK_SIZE]
+        n = len(chunk)
+
+        #parâmetros de cada ticker
+        betas = random.uniform(0.5, 1.5, n)
+        vols = random.uniform(0.01, 0.035, n)
+        liquidity = random.lognormal(11, 1.5, n) #volume médio
+        gap_probabilities = np.clip(gap_ratio * 1e5 / np.maximum(liquidity, 1), 0, 0.5) #ações menos líquidas têm mais buracos
+        first_rows = np.where(random.random(n) < listing_ratio, random.integers(0, int(n_days * 0.9), n), 0)
+        delisting_rows = first_rows + SESSION_FREQ_PER_YEAR // 4 + (random.random(n) * np.maximum(n_days - 5 - first_rows - SESSION_FREQ_PER_YEAR // 4, 0)).astype(int) #pelo menos 3 meses listada
+        last_rows = np.minimum(np.where(random.random(n) < delisting_ratio, delisting_rows, n_days), n_days)
+
+        #preços ajustados (contínuos) e ohlc
+        rets = betas[None, :] * market[:, None] + random.normal(0, 1, (n_days, n)) * vols[None, :]
+        closes = random.lognormal(np.log(20), 0.8, n)[None, :] * np.exp(np.cumsum(rets, axis=0))
+        opens = np.vstack([closes[:1], closes[:-1]]) * np.exp(random.normal(0, 1, (n_days, n)) * vols[None, :] * 0.3)
+        highs = np.maximum(opens, closes) * (1 + np.abs(random.normal(0, 1, (n_days, n))) * vols[None, :] * 0.5)
+        lows = np.minimum(opens, closes) * (1 - np.clip(np.abs(random.normal(0, 1, (n_days, n))) * vols[None, :] * 0.5, 0, 0.5))
+        volumes = np.round(random.lognormal(0, 0.6, (n_days, n)) * liquidity[None, :] * (1 + np.abs(rets) * 20))
+
+        #buracos: metade some do histórico, metade fica como dia sem negócio (volume 0 e preços do último fechamento)
+        gaps = random.random((n_days, n)) < gap_probabilities[None, :]
+        dropped = gaps & (random.random((n_days, n)) < 0.5)
+        flat = gaps & ~dropped
+        flat[0] = False
+        previous_closes = np.vstack([closes[:1], closes[:-1]])
+        for prices in (opens, highs, lows, closes):
+            prices[flat] = previous_closes[flat]
+        volumes[flat] = 0
+
+        #desdobramentos e grupamentos
+        splits = np.zeros((n_days, n))
+        split_mask = random.random((n_days, n)) < splits_per_year / SESSION_FREQ_PER_YEAR
+        split_ratios = np.where(random.random((n_days, n)) < 0.85, random.choice(SPLIT_RATIOS, (n_days, n)), random.choice(REVERSE_SPLIT_RATIOS, (n_days, n)))
+        splits[split_mask] = split_ratios[split_mask]
+
+        #dividendos (yield anual de 2% a 10%, pagos 1, 2 ou 4 vezes ao ano)
+        dividends = np.zeros((n_days, n))
+        payers = random.random(n) < payers_ratio
+        frequencies = random.choice((1, 2, 4), n)
+        yields = random.uniform(0.02, 0.10, n)
+        for i in np.flatnonzero(payers):
+            step = SESSION_FREQ_PER_YEAR // frequencies[i]
+            rows = np.arange(random.integers(0, step), n_days, step)
+            dividends[rows, i] = np.round(closes[rows, i] * yields[i] / frequencies[i], 4)
+
+        for i, ticker in enumerate(chunk):
+            rows = np.arange(first_rows[i], last_rows[i])
+            rows = rows[~dropped[rows, i]]
+            histories[ticker] = pd.DataFrame({
+                "Open": opens[rows, i],
+                "High": highs[rows, i],
+                "Low": lows[rows, i],
+                "Close": closes[rows, i],
+                "Volume": volumes[rows, i],
+                "Dividends": dividends[rows, i],
+                "Stock Splits": splits[rows, i]
+            }, index=index[rows])
+    return histories
+
+
+
+def make_synthetic_movements(histories, n_movements, n_tickers=50, seed=0, index_ticker="^BVSP"):
+    """
+    Gera movimentações sintéticas a partir dos históricos, no formato dos dicionários lidos pela classe Portfolio.
+    As compras e vendas usam o preço e a quantidade da época (antes dos desdobramentos seguintes), como nos arquivos da B3; a classe Portfolio ajusta pelos desdobramentos.
+    As vendas nunca passam da quantidade em carteira. Os dividendos são creditados nas datas de dividendos dos históricos, sobre a quantidade em carteira.
+
+    Parameters
+    ----------
+    histories : dict
+        Dicionário no formato {ticker: DataFrame}. (ver 'make_synthetic_histories')
+    n_movements : int
+        O número de compras e vendas (os créditos de dividendos são somados a elas).
+    n_tickers : int
+        O número de ações diferentes na carteira. (default é 50)
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+    index_ticker : str
+        O ticker do índice de mercado, que não entra na carteira. (default é o ibovespa)
+
+    Returns
+    -------
+    list
+        Lista de dicionários (ticker, type, price_per_share, quantity, amount e date no formato '%d-%m-%Y'), ordenada por data.
+    """
+    random = np.random.default_rng(seed)
+    tickers = [ticker for ticker, history in histories.items() if ticker != index_ticker and len(history) > 0]
+    tickers = [tickers[i] for i in np.sort(random.choice(len(tickers), min(n_tickers, len(tickers)), replace=False))]
+
+    #fator de cada data para o preço/quantidade da época: produto dos desdobramentos posteriores
+    data = {}
+    for ticker in tickers:
+        history = histories[ticker]
+        ratios = np.where(history["Stock Splits"].to_numpy() > 0, history["Stock Splits"].to_numpy(), 1.0)
+        factors = np.concatenate([np.cumprod(ratios[::-1])[::-1][1:], [1.0]])
+        data[ticker] = (history.index, history["Close"].to_numpy(), factors, history["Dividends"].to_numpy())
+
+    chosen_tickers = random.integers(0, len(tickers), n_movements)
+    positions = random.random(n_movements)
+    kinds = random.random(n_movements)
+    quantities = random.integers(1, 10, n_movements) * 100 #lotes de 100
+
+    trades = []
+    for ticker_i, position in zip(chosen_tickers, positions):
+        index = data[tickers[ticker_i]][0]
+        row = int(position * len(index))
+        trades.append((index[row], ticker_i, row))
+    order = sorted(range(n_movements), key=lambda i: trades[i][0])
+
+    holdings = np.zeros(len(tickers)) #quantidade em carteira de cada ação, em ações ajustadas (de hoje)
+    timelines = {ticker_i: ([], []) for ticker_i in range(len(tickers))} #datas e quantidades ajustadas em carteira depois de cada negócio
+    movements = []
+    for i in order:
+        date, ticker_i, row = trades[i]
+        ticker = tickers[ticker_i]
+        _, closes, factors, _ = data[ticker]
+        price = round(float(closes[row] * factors[row]), 2) #preço da época
+        if price <= 0: #negócio descartado não pode mexer na quantidade em carteira
+            continue
+        held = int(holdings[ticker_i] / factors[row]) #quantidade da época em carteira
+        if kinds[i] < 0.35 and held > 0:
+            typ = "sell"
+            quantity = int(min(quantities[i], held))
+            holdings[ticker_i] -= quantity * factors[row]
+        else:
+            typ = "buy"
+            quantity = int(quantities[i])
+            holdings[ticker_i] += quantity * factors[row]
+        timelines[ticker_i][0].append(date)
+        timelines[ticker_i][1].append(holdings[ticker_i])
+        movements.append((date, {"ticker": ticker, "type": typ, "price_per_share": price, "quantity": quantity, "amount": round(price * quantity, 2), "date": date.strftime("%d-%m-%Y")}))
+
+    #dividendos sobre a quantidade em carteira antes de cada data de dividendos
+    for ticker_i, (dates, held) in timelines.items():
+        if len(dates) == 0:
+            continue
+        ticker = tickers[ticker_i]
+        index, _, factors, dividends = data[ticker]
+        rows = np.flatnonzero(dividends > 0)
+        rows = rows[index[rows] > dates[0]]
+        previous = np.searchsorted(pd.DatetimeIndex(dates), index[rows], side="left") - 1
+        for row, trade in zip(rows, previous):
+            if held[trade] <= 0:
+                continue
+            date = index[row]
+            quantity = int(held[trade] / factors[row])
+            movements.append((date, {"ticker": ticker, "type": "dividends", "price_per_share": 0.0, "quantity": quantity, "amount": round(float(held[trade] * dividends[row]), 2), "date": date.strftime("%d-%m-%Y")}))
+
+    movements.sort(key=lambda movement: movement[0])
+    return [movement for _, movement in movements]
+
+
+
+def write_synthetic_dataset(folder, n_tickers=5000, years=20, n_movements=1000000, seed=0, date=None, n_portfolio_tickers=50, exports=("csv",), dtype="float32"):
+    """
+    Gera e grava um dataset sintético completo, pronto para o caminho de dados gravados da classe Session (ver 'load_synthetic_dataset').
+
+    Arquivos gravados na pasta:
+        - tickers.json: infos dos tickers (formato do tickers.json do package)
+        - histories.dhs: históricos das ações e do índice de mercado (HistoryStore)
+        - fundamentals.json: dados fundamentalistas
+        - movements.json: movimentações no formato lido pela classe Portfolio
+        - movements/: arquivos de movimentação da B3, nos formatos pedidos (lidos pela função 'get_movements_list_from_b3_exports')
+
+    Parameters
+    ----------
+    folder : str ou Path
+        A pasta do dataset.
+    n_tickers : int
+        O número de tickers. (default é 5000)
+    years : int
+        O número de anos dos históricos. (default é 20 anos)
+    n_movements : int
+        O número de compras e vendas da carteira. (default é 1 milhão)
+    seed : int
+        A semente do gerador de números aleatórios. (default é 0)
+    date : datetime
+        A última data dos históricos. (default é None, a data atual)
+    n_portfolio_tickers : int
+        O número de ações diferentes na carteira. (default é 50)
+    exports : tuple
+        Os formatos dos arquivos de movimentação da B3 ('xlsx', 'csv' e/ou 'parquet'); vazio não grava os arquivos. (default é csv, o xlsx é lento para milhões de linhas)
+    dtype : str
+        O tipo dos dados do HistoryStore ('float64' ou 'float32'). (default é 'float32', metade do tamanho)
+
+    Returns
+    -------
+    Path
+        A pasta do dataset.
+    """
+    if date is None:
+        date = datetime.now()
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    tickers = make_synthetic_tickers(n_tickers, seed)
+    with open(folder / "tickers.json", "w", encoding="utf8") as tickers_file:
+        json.dump(tickers, tickers_file, indent=4)
+    with open(folder / "fundamentals.json", "w", encoding="utf8") as fundamentals_file:
+        json.dump(make_fundamentals(tickers, seed), fundamentals_file)
+
+    histories = make_synthetic_histories(tickers, date, years, seed)
+    movements = make_synthetic_movements(histories, n_movements, n_portfolio_tickers, seed)
+    write_history_store(folder / "histories.dhs", histories, metadata={"date": date.isoformat(), "years": years, "seed": seed, "index_ticker": "^BVSP", "risk_free_rate": RISK_FREE_RATE}, dtype=dtype)
+    del histories
+
+    with open(folder / "movements.json", "w", encoding="utf8") as movements_file:
+        json.dump(movements, movements_file)
+    for file_format in exports:
+        write_b3_exports(movements, folder / "movements", file_format)
+    return folder
+
+
+
+def load_synthetic_dataset(folder):
+    """
+    Carrega um dataset gravado pela função 'write_synthetic_dataset'. Os históricos são mapeados em memória (HistoryStore).
+
+    Ex:
+        dataset = load_synthetic_dataset(folder)
+        session = Session(date=dataset["date"], period=dataset["years"], tickers=dataset["tickers"], risk_free_rate=dataset["risk_free_rate"], histories=dataset["histories"], fundamentals=dataset["fundamentals"])
+        portfolio = Portfolio(session, cash=0.0, movements=dataset["movements"])
+
+    Parameters
+    ----------
+    folder : str ou Path
+        A pasta do dataset.
+
+    Returns
+    -------
+    dict
+        O dataset: 'date', 'years', 'risk_free_rate', 'tickers', 'histories', 'fundamentals' e 'movements'.
+    """
+    folder = Path(folder)
+    histories = HistoryStore(folder / "histories.dhs")
+    with open(folder / "tickers.json", "r", encoding="utf8") as tickers_file:
+        tickers = json.load(tickers_file)
+    with open(folder / "fundamentals.json", "r", encoding="utf8") as fundamentals_file:
+        fundamentals = json.load(fundamentals_file)
+    with open(folder / "movements.json", "r", encoding="utf8") as movements_file:
+        movements = json.load(movements_file)
+    return {
+        "date": datetime.fromisoformat(histories.metadata["date"]),
+        "years": histories.metadata["years"],
+        "risk_free_rate": histories.metadata.get("risk_free_rate", RISK_FREE_RATE),
+        "tickers": tickers,
+        "histories": histories,
+        "fundamentals": fundamentals,
+        "movements": movements
+    }
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de datasets sintéticos de mercado e carteira para testes de escala.")
+    parser.add_argument("--output", required=True, help="pasta do dataset")
+    parser.add_argument("--tickers", type=int, default=5000, help="número de tickers")
+    parser.add_argument("--years", type=int, default=20, help="anos dos históricos")
+    parser.add_argument("--movements", type=int, default=1000000, help="número de compras e vendas da carteira")
+    parser.add_argument("--portfolio-tickers", type=int, default=50, help="número de ações diferentes na carteira")
+    parser.add_argument("--seed", type=int, default=0, help="semente do gerador")
+    parser.add_argument("--exports", nargs="*", default=["csv"], choices=["xlsx", "csv", "parquet"], help="formatos dos arquivos de movimentação da B3")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float64"], help="tipo dos dados do HistoryStore")
+    args = parser.parse_args()
+
+    folder = write_synthetic_dataset(args.output, args.tickers, args.years, args.movements, args.seed, n_portfolio_tickers=args.portfolio_tickers, exports=tuple(args.exports), dtype=args.dtype)
+    print("dataset written to {}".format(folder), file=sys.stderr)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Atribuição de performance do portfolio por setor, sub setor, segmento e tipo de ação (B3), contra o mercado ponderado pelo valor de mercado das ações do pregão.
+
+O painel das posições (valores e fluxos de caixa diários, uma coluna por ticker, ver 'delfos.broker.returns.get_flows_tables') é agregado nos grupos em uma única redução:
+o produto do painel por uma matriz de pertinência (tickers x grupos). O mesmo vale para o mercado, com os valores de mercado (preço x ações em circulação) das ações do pregão.
+
+Efeitos de Brinson-Fachler de cada data e grupo (w = peso no começo do dia, R = retorno do dia, p = portfolio, b = mercado):
+    - Allocation: (w_p - w_b) * (R_b,grupo - R_b)
+    - Selection: w_b * (R_p,grupo - R_b,grupo)
+    - Interaction: (w_p - w_b) * (R_p,grupo - R_b,grupo)
+A soma dos efeitos de todos os grupos é o retorno ativo do dia (retorno do portfolio - retorno do mercado). Em intervalos, os efeitos diários são somados (sem ligação geométrica).
+
+Os retornos do portfolio descontam o fluxo de caixa do dia (o aporte entra no começo do dia), como os retornos do histórico do portfolio ('Daily Ret').
+Os valores das posições são só as ações em carteira ('Close (no income)'): o realizado (vendas e proventos) sai do grupo no fim do dia, como um fluxo externo,
+então o dinheiro das vendas e os proventos não ficam no grupo como uma posição de retorno zero (ver 'get_positions_tables').
+"""
+from delfos.broker.risk import get_window_sums
+from delfos.broker.returns import get_flows_tables
+import pandas as pd
+import numpy as np
+
+
+ATTRIBUTION_LEVELS = ("sector", "sub_sector", "segment", "type") #níveis de agrupamento (atributos das ações)
+EFFECTS = ("Allocation", "Selection", "Interaction") #efeitos de Brinson-Fachler
+TOTAL_GROUP = "Total" #rótulo da linha/coluna com o total de todos os grupos
+
+
+
+def get_group_labels(stocks, level):
+    """
+    Retorna o grupo de cada ação no nível de agrupamento.
+
+    Parameters
+    ----------
+    stocks : list
+        As ações (objetos Stock).
+    level : str
+        O nível de agrupamento: 'sector', 'sub_sector', 'segment' ou 'type'.
+
+    Raises
+    ------
+    ValueError
+        Se o nível de agrupamento não for válido.
+
+    Returns
+    -------
+    list
+        O grupo de cada ação, na ordem das ações. (ver 'get_group_label')
+    """
+    if level not in ATTRIBUTION_LEVELS:
+        raise ValueError("Argument 'level' must be one of: {}.".format(", ".join(ATTRIBUTION_LEVELS)))
+    return [get_group_label(getattr(stock, level)) for stock in stocks]
+
+
+
+def get_group_label(label):
+    """
+    Normaliza o rótulo de um grupo: espaços extras removidos e só a primeira letra maiúscula (o cadastro da B3 mistura 'Bens Industriais' e 'Bens industriais').
+    """
+    label = " ".join(label.split())
+    return label[:1].upper() + label[1:].lower()
+
+
+
+def get_group_matrix(labels, groups):
+    """
+    Monta a matriz de pertinência (linhas = itens, colunas = grupos), com 1 no grupo de cada item. O produto de uma tabela (datas x itens) pela matriz soma os itens de cada grupo.
+    """
+    positions = {group: i for i, group in enumerate(groups)}
+    matrix = np.zeros((len(labels), len(groups)))
+    matrix[np.arange(len(labels)), [positions[label] for label in labels]] = 1
+    return matrix
+
+
+
+def get_market_panel(session, index, level):
+    """
+    Monta o painel do mercado do pregão nas datas: preços de fechamento (datas sem pregão repetem o último preço), ações em circulação e grupo de cada ação.
+    Só entram as ações com ações em circulação positivas (sem elas, o valor de mercado é desconhecido).
+
+    Parameters
+    ----------
+    session : Session
+        O pregão.
+    index : DatetimeIndex
+        As datas do painel.
+    level : str
+        O nível de agrupamento.
+
+    Returns
+    -------
+    tuple
+        Os preços (DataFrame, datas x tickers), as ações em circulação (array) e os grupos das ações (list).
+    """
+    stocks = [stock for stock in session.stocks.values() if stock.shares_outstanding > 0]
+    prices = session.closing_prices_table.reindex(columns=[stock.ticker for stock in stocks]).astype(float)
+    prices = prices.reindex(prices.index.union(index)).ffill().reindex(index)
+    shares = np.array([stock.shares_outstanding for stock in stocks], dtype=float)
+    return prices, shares, get_group_labels(stocks, level)
+
+
+
+def get_positions_tables(histories):
+    """
+    Alinha os históricos das posições nas tabelas da atribuição (datas nas linhas, tickers nas colunas, ver 'delfos.broker.returns.get_flows_tables'):
+    os valores das ações em carteira ('Close (no income)'), os aportes ('Cash Flow', as compras) e o realizado (vendas e proventos, as variações de 'Income').
+
+    Parameters
+    ----------
+    histories : dict
+        Os históricos das posições no formato {ticker: DataFrame}. (ver 'Position.history')
+
+    Returns
+    -------
+    tuple
+        As tabelas de valores, de aportes e do realizado (DataFrames).
+    """
+    values, cash_flows = get_flows_tables({ticker: pd.DataFrame({"Close": history["Close (no income)"], "Cash Flow": history["Cash Flow"]}) for ticker, history in histories.items()})
+    _, income = get_flows_tables({ticker: pd.DataFrame({"Close": history["Close (no income)"], "Cash Flow": history["Income"].diff().fillna(history["Income"])}) for ticker, history in histories.items()})
+    return values, cash_flows, income
+
+
+
+def get_attribution_tables(values, cash_flows, labels, market_prices, market_shares, market_labels, income=None):
+    """
+    Calcula a atribuição diária por grupo: pesos e retornos do portfolio e do mercado e os efeitos de Brinson-Fachler, em uma única redução por grupo.
+    Só entram as datas com capital no portfolio e com o mercado definido (valor de mercado no começo do dia).
+
+    Parameters
+    ----------
+    values : DataFrame
+        Os valores das posições (datas x tickers).
+    cash_flows : DataFrame
+        Os fluxos de caixa das posições, alinhados com os valores. (entram no começo do dia)
+    labels : list
+        O grupo de cada posição, na ordem das colunas.
+    market_prices : DataFrame
+        Os preços das ações do mercado, nas datas dos valores (datas x tickers).
+    market_shares : array
+        As ações em circulação de cada ação do mercado, na ordem das colunas.
+    market_labels : list
+        O grupo de cada ação do mercado, na ordem das colunas.
+    income : DataFrame
+        O realizado das posições (vendas e proventos), alinhado com os valores. Sai do grupo no fim do dia e conta no retorno do dia. (default é None, sem realizado)
+
+    Returns
+    -------
+    DataFrame
+        A atribuição, com colunas em dois níveis (medida, grupo). Medidas: 'Weight', 'Return', 'Market Weight', 'Market Return', 'Allocation', 'Selection' e 'Interaction'.
+        Os retornos de grupos sem peso são NaN.
+    """
+    groups = sorted(set(labels) | set(market_labels))
+    matrix = get_group_matrix(labels, groups)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        #portfolio: valores, aportes e realizado agregados nos grupos, capital no começo do dia (valor anterior + aporte)
+        group_values = values.to_numpy(dtype=float) @ matrix
+        group_flows = cash_flows.to_numpy(dtype=float) @ matrix
+        group_income = income.to_numpy(dtype=float) @ matrix if income is not None else np.zeros_like(group_values)
+        base = np.vstack((np.zeros((1, len(groups))), group_values[:-1])) + group_flows
+        total_base = base.sum(axis=1, keepdims=True)
+        weights = np.where(total_base > 0, base / total_base, 0.0)
+
+        #mercado: valores de mercado no começo do dia e retornos ponderados por eles
+        prices = market_prices.to_numpy(dtype=float)
+        previous_prices = np.vstack((np.full((1, prices.shape[1]), np.nan), prices[:-1]))
+        caps = np.nan_to_num(previous_prices * market_shares)
+        stock_returns = np.nan_to_num(np.where(caps > 0, prices / previous_prices - 1, 0.0))
+        market_matrix = get_group_matrix(market_labels, groups)
+        group_caps = caps @ market_matrix
+        total_caps = group_caps.sum(axis=1, keepdims=True)
+        market_weights = np.where(total_caps > 0, group_caps / total_caps, 0.0)
+        market_total_return = np.sum(np.where(total_caps > 0, caps / total_caps, 0.0) * stock_returns, axis=1, keepdims=True)
+
+        #grupos fora do mercado têm o retorno do mercado e grupos fora do portfolio têm o retorno do grupo no mercado (efeitos neutros)
+        market_returns = np.where(group_caps > 0, ((caps * stock_returns) @ market_matrix) / group_caps, market_total_return)
+        returns = np.where(base > 0, (group_values + group_income - base) / base, market_returns)
+
+    allocation = (weights - market_weights) * (market_returns - market_total_return)
+    selection = market_weights * (returns - market_returns)
+    interaction = (weights - market_weights) * (returns - market_returns)
+
+    tables = {
+        "Weight": weights, "Return": np.where(base > 0, returns, np.nan), "Market Weight": market_weights, "Market Return": np.where(group_caps > 0, market_returns, np.nan),
+        "Allocation": allocation, "Selection": selection, "Interaction": interaction
+    }
+    valid = (total_base[:, 0] > 0) & (total_caps[:, 0] > 0)
+    return pd.concat({measure: pd.DataFrame(table[valid], index=values.index[valid], columns=groups) for measure, table in tables.items()}, axis=1)
+
+
+
+def get_attribution_summary(tables, start=None, end=None):
+    """
+    Resume a atribuição diária no intervalo: pesos médios, retornos acumulados (geométricos) e efeitos somados de cada grupo, mais a linha do total.
+
+    Parameters
+    ----------
+    tables : DataFrame
+        A atribuição diária (ver 'get_attribution_tables').
+    start : datetime
+        A primeira data do intervalo. (default é None, a primeira data)
+    end : datetime
+        A última data do intervalo. (default é None, a última data)
+
+    Returns
+    -------
+    DataFrame
+        O resumo (linhas = grupos e 'Total'; colunas = 'Weight', 'Return', 'Market Weight', 'Market Return', 'Allocation', 'Selection', 'Interaction' e 'Total Effect').
+        No total, 'Return' e 'Market Return' são os retornos acumulados do portfolio e do mercado e 'Total Effect' é a soma dos retornos ativos diários.
+    """
+    mask = np.ones(len(tables), dtype=bool)
+    if start is not None:
+        mask &= tables.index >= pd.Timestamp(start)
+    if end is not None:
+        mask &= tables.index <= pd.Timestamp(end)
+    tables = tables[mask]
+    groups = tables["Weight"].columns
+
+    weights, market_weights = tables["Weight"].to_numpy(), tables["Market Weight"].to_numpy()
+    returns, market_returns = tables["Return"].to_numpy(), tables["Market Return"].to_numpy()
+    summary = pd.DataFrame({
+        "Weight": weights.mean(axis=0) if len(tables) > 0 else np.nan,
+        "Return": np.where(np.isnan(returns).all(axis=0), np.nan, np.prod(1 + np.nan_to_num(returns), axis=0) - 1),
+        "Market Weight": market_weights.mean(axis=0) if len(tables) > 0 else np.nan,
+        "Market Return": np.where(np.isnan(market_returns).all(axis=0), np.nan, np.prod(1 + np.nan_to_num(market_returns), axis=0) - 1),
+        **{effect: tables[effect].to_numpy().sum(axis=0) for effect in EFFECTS}
+    }, index=groups)
+    summary["Total Effect"] = summary[list(EFFECTS)].sum(axis=1)
+
+    summary.loc[TOTAL_GROUP] = {
+        "Weight": summary["Weight"].sum(), "Return": np.prod(1 + np.nansum(weights * np.nan_to_num(returns), axis=1)) - 1,
+        "Market Weight": summary["Market Weight"].sum(), "Market Return": np.prod(1 + np.nansum(market_weights * np.nan_to_num(market_returns), axis=1)) - 1,
+        **{effect: summary[effect].sum() for effect in EFFECTS + ("Total Effect",)}
+    }
+    summary.index.name = "group"
+    return summary
+
+
+
+def get_rolling_attribution(tables, window):
+    """
+    Soma os efeitos diários de cada grupo em janelas móveis, em O(n) por somas acumuladas (ver 'delfos.broker.risk.get_window_sums').
+
+    Parameters
+    ----------
+    tables : DataFrame
+        A atribuição diária (ver 'get_attribution_tables').
+    window : int
+        O número de pregões de cada janela.
+
+    Raises
+    ------
+    TypeError
+        Se a janela não for um inteiro.
+    ValueError
+        Se a janela for menor que 1.
+
+    Returns
+    -------
+    DataFrame
+        Os efeitos de cada janela (terminando em cada data), com colunas em dois níveis (efeito, grupo), incluindo o efeito total ('Total Effect') e o total dos grupos ('Total').
+        As primeiras 'window - 1' datas são NaN.
+    """
+    if not isinstance(window, int):
+        raise TypeError("Argument 'window' must be an integer.")
+    if window < 1:
+        raise ValueError("Argument 'window' must be greater than 0.")
+    effects = {effect: tables[effect] for effect in EFFECTS}
+    effects["Total Effect"] = sum(effects.values())
+
+    rolling = {}
+    for effect, table in effects.items():
+        table = table.assign(**{TOTAL_GROUP: table.sum(axis=1)})
+        rolling[effect] = pd.DataFrame(get_window_sums(table.to_numpy(), window), index=table.index, columns=table.columns)
+    return pd.concat(rolling, axis=1)
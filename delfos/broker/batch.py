@@ -0,0 +1,178 @@
+"""
+Avaliação em lote de muitas contas (portfolios) em um único pregão compartilhado.
+
+Os dados de mercado são preparados uma única vez para todas as contas: o pregão, os desdobramentos das ações usados no ajuste das movimentações
+(ver 'get_stock_splits') e a tabela alinhada dos preços de fechamento das ações das movimentações (recorte de 'Session.closing_prices_table'),
+usada no histórico das posições. Um Portfolio avulso usa a mesma tabela do pregão, então as métricas do lote são as mesmas de cada conta avaliada sozinha
+(ver a checagem 'batch_matches_serial' em 'delfos.benchmarks.checks'). As contas são divididas em blocos contíguos entre os processos; cada processo
+recebe o pregão, os desdobramentos e os preços uma única vez (no inicializador) e monta os portfolios do seu bloco.
+
+O resultado é uma tabela com as métricas de todas as contas (valores, retornos, TWR, IRR e métricas de risco) e os históricos de cada conta.
+Erros de uma conta não interrompem o lote: ficam na coluna 'error' da tabela.
+
+Ex:
+    metrics, histories = evaluate_portfolios(session, {"conta1": movimentacoes1, "conta2": {"movements": movimentacoes2, "cash": 1000.0}}, workers=4)
+"""
+from delfos.market.session import Session
+from delfos.broker.portfolio import Portfolio, get_stock_splits
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import math
+
+
+SESSION = None #pregão compartilhado do processo (setado por 'init_worker')
+SPLITS = None #desdobramentos das ações compartilhados do processo
+PRICES = None #tabela alinhada de preços de fechamento compartilhada do processo
+RISK_METRICS = ("annual_volatility", "sharpe", "sortino", "max_drawdown", "var", "cvar", "beta", "excess_return") #métricas de risco da tabela
+
+
+
+def init_worker(session, splits, prices):
+    """
+    Inicializa o pregão, os desdobramentos e os preços compartilhados do processo (o próprio processo, sem workers, ou cada processo do pool).
+    """
+    global SESSION, SPLITS, PRICES
+    SESSION = session
+    SPLITS = splits
+    PRICES = prices
+
+
+
+def get_portfolio_metrics(portfolio, risk=True):
+    """
+    Monta as métricas de um portfolio: valores e retornos, TWR e IRR do histórico inteiro e, opcionalmente, as métricas de risco.
+
+    Parameters
+    ----------
+    portfolio : Portfolio
+        O portfolio.
+    risk : bool
+        Se verdadeiro, inclui as métricas de risco (ver 'delfos.broker.risk'). (default é True)
+
+    Returns
+    -------
+    dict
+        As métricas.
+    """
+    metrics = {
+        "cash": float(portfolio.cash),
+        "positions": len(portfolio.positions),
+        "total_cost": float(portfolio.total_cost),
+        "total_income": float(portfolio.total_income),
+        "total_dividends": float(portfolio.total_dividends),
+        "held_shares_cost": float(portfolio.held_shares_cost),
+        "held_shares_value": float(portfolio.held_shares_value),
+        "held_shares_return": float(portfolio.held_shares_return),
+        "total_value": float(portfolio.total_value),
+        "total_change": float(portfolio.total_change),
+        "total_return": float(portfolio.total_return),
+        "twr": float(portfolio.get_time_weighted_returns()["Portfolio"].iloc[-1]),
+        "irr": float(portfolio.get_money_weighted_returns()["Portfolio"].iloc[-1]),
+        "failed_positions": ", ".join(portfolio.failed_positions)
+    }
+    if risk:
+        risk_metrics = portfolio.get_risk_metrics()
+        metrics.update({name: risk_metrics[name] for name in RISK_METRICS})
+    return metrics
+
+
+
+def evaluate_account(task):
+    """
+    Tarefa de uma conta: cria o portfolio no pregão compartilhado do processo e monta as suas métricas e o seu histórico.
+
+    Parameters
+    ----------
+    task : tuple
+        A tarefa, no formato (nome, movimentações, dinheiro, histories, risk).
+
+    Returns
+    -------
+    tuple
+        O nome, as métricas (dict) e o histórico (DataFrame ou None). Se a conta falhar, as métricas só têm o erro.
+    """
+    name, movements, cash, histories, risk = task
+    try:
+        if len(movements) == 0:
+            raise ValueError("The account has no movements.") #o Portfolio leria a pasta de movimentações das configurações
+        portfolio = Portfolio(SESSION, cash, movements, splits=SPLITS, prices=PRICES)
+        return name, {**get_portfolio_metrics(portfolio, risk), "error": None}, portfolio.portfolio_history if histories else None
+    except Exception as e:
+        return name, {"error": "{}: {}".format(type(e).__name__, e)}, None
+
+
+
+def evaluate_portfolios(session, accounts, cash=None, workers=1, histories=True, risk=True):
+    """
+    Avalia muitas contas em um único pregão, compartilhando os dados de mercado e dividindo as contas entre processos.
+
+    Parameters
+    ----------
+    session : Session
+        O pregão compartilhado.
+    accounts : dict ou list
+        As contas: {nome: movimentações} ou {nome: {'movements': movimentações, 'cash': float}}, ou uma lista de listas de movimentações (os nomes são as posições).
+    cash : int, float ou list
+        O dinheiro disponível das contas sem 'cash' próprio: um valor para todas ou uma lista alinhada com as contas. (default é None, o último registro do cash.json)
+    workers : int
+        O número de processos. (default é 1, sem pool)
+    histories : bool
+        Se verdadeiro, retorna o histórico de cada conta. (default é True)
+    risk : bool
+        Se verdadeiro, inclui as métricas de risco na tabela. (default é True)
+
+    Raises
+    ------
+    TypeError
+        Se os parâmetros não baterem com seus respectivos tipos.
+    ValueError
+        Se o número de processos for menor que 1 ou se a lista de dinheiro não tiver o tamanho das contas.
+
+    Returns
+    -------
+    tuple
+        A tabela de métricas (DataFrame, uma linha por conta, na ordem das contas) e os históricos no formato {nome: DataFrame} (vazio se 'histories' for falso).
+    """
+    #checando se os tipos dos parâmetros estão corretos
+    if not isinstance(session, Session):
+        raise TypeError("Argument 'session' must be a Session object.")
+    if not isinstance(accounts, (dict, list)):
+        raise TypeError("Argument 'accounts' must be a dictionary or a list.")
+    if cash is not None and not isinstance(cash, (int, float, list)):
+        raise TypeError("Argument 'cash' must be an integer, a float or a list.")
+    if not isinstance(workers, int):
+        raise TypeError("Argument 'workers' must be an integer.")
+    if workers < 1:
+        raise ValueError("Argument 'workers' must be greater than 0.")
+
+    accounts = accounts if isinstance(accounts, dict) else dict(enumerate(accounts))
+    if isinstance(cash, list) and len(cash) != len(accounts):
+        raise ValueError("Argument 'cash' must have one value per account.")
+    tasks = []
+    for i, (name, account) in enumerate(accounts.items()):
+        account_cash = cash[i] if isinstance(cash, list) else cash
+        if isinstance(account, dict):
+            account_cash = account.get("cash") if account.get("cash") is not None else account_cash
+            account = account.get("movements", [])
+        tasks.append((name, list(account), account_cash, histories, risk))
+
+    #desdobramentos e preços de todos os tickers das movimentações, lidos uma única vez para todas as contas
+    tickers = sorted({movement["ticker"] for task in tasks for movement in task[1] if isinstance(movement.get("ticker"), str)})
+    splits = get_stock_splits(session, tickers)
+    prices = session.closing_prices_table.filter(items=tickers, axis=1)
+
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        previous = (SESSION, SPLITS, PRICES)
+        init_worker(session, splits, prices)
+        try:
+            results = [evaluate_account(task) for task in tasks]
+        finally:
+            init_worker(*previous) #sem pool, o próprio processo foi inicializado: o estado anterior é restaurado (o pregão não fica preso no módulo)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(session, splits, prices)) as executor:
+            results = list(executor.map(evaluate_account, tasks, chunksize=math.ceil(len(tasks) / workers)))
+
+    metrics = pd.DataFrame.from_dict({name: account_metrics for name, account_metrics, _ in results}, orient="index")
+    metrics.index.name = "account"
+    return metrics, {name: history for name, _, history in results if history is not None}
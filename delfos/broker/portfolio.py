@@ -1,9 +1,16 @@
 from delfos.market.session import Session
 from delfos.broker.position import Position
+from delfos.broker.risk import get_risk_series, get_risk_metrics, get_rolling_risk_metrics
+from delfos.broker.returns import get_flows_tables, get_daily_returns, get_time_weighted_returns, get_money_weighted_returns
+from delfos.broker.rebalance import get_rebalance_trades
+from delfos.broker.attribution import get_group_labels, get_positions_tables, get_market_panel, get_attribution_tables, get_attribution_summary, get_rolling_attribution
 from delfos.common.configs import Configs
+from delfos.common.events import EventHub
+from delfos.common.profiling import profiled
 import delfos.common.utils as utils
 import json
 from datetime import datetime
+from pathlib import Path
 import pandas as pd
 import time #apenas para testes
 import os
@@ -12,34 +19,45 @@ import math
 CONFIGS = Configs()
 
 
-CASH = CONFIGS.CASH[-1]["available_cash"] #dinheiro disponível para a última data registrada (último registro do patrimonio)
 MOVEMENTS_PATH = CONFIGS.PATHS["movements_folder"] #caminho para a pasta com os arquivos de movimentação (compras e vendas). 1 arquivo xlsx por ano (baixado do CEI área logada).
 CASH_FILE_PATH = CONFIGS.PATHS["cash"] #caminho para a pasta com o arquivo que contém as informações da parte do portfolio que não está alocada à ações.
 NOW = datetime.now() #data do dia
+SESSION_FREQ_PER_YEAR = CONFIGS.DEFAULTS["SESSION_FREQ_PER_YEAR"] #número de dias no ano em que o mercado funciona
 
 
 
-def get_movements_list_from_b3_exports():
+@profiled("portfolio.b3_exports")
+def get_movements_list_from_b3_exports(path=None):
     """
     Analisa os documentos de movimentação baixados da B3 (área logada). É necessário 1 arquivo xlsx por ano, filtrados e baixados pelo próprio site.
+    Também lê os mesmos documentos convertidos para csv ou parquet (mesmas colunas), mais rápidos de ler em grandes volumes.
     Os arquivos devem ser colocados na pasta: "./delfos/data/broker/movements/".
     Retorna as movientações extraídas dos documentos, já com a estrutura correta para a análise feita pelo script.
 
     URL: https://www.investidor.b3.com.br/login
 
+    Parameters
+    ----------
+    path : str ou Path
+        A pasta com os arquivos de movimentação. (default é None, a pasta das configurações)
+
     Returns
     -------
     list
         Lista de dicionários que representam a movimentação das ações (compras, vendas e dividendos). Cada movimentação possui: data, símbolo, tipo de movimentação, quantidade de ações, preço por ação e valor da operação.
     """
 
+    movements_path = Path(path) if path is not None else MOVEMENTS_PATH
     movements_dfs = []
 
-    for movement_file in os.listdir(MOVEMENTS_PATH):
+    for movement_file in sorted(os.listdir(movements_path)):
         ext = os.path.splitext(movement_file)[-1].lower()
         if ext == ".xlsx":
-            movements = pd.read_excel(MOVEMENTS_PATH / movement_file)
-            movements_dfs.append(movements)
+            movements_dfs.append(pd.read_excel(movements_path / movement_file))
+        elif ext == ".csv":
+            movements_dfs.append(pd.read_csv(movements_path / movement_file))
+        elif ext == ".parquet":
+            movements_dfs.append(pd.read_parquet(movements_path / movement_file)) #depende do pyarrow ou do fastparquet
 
     if len(movements_dfs) == 0:
         return []
@@ -92,6 +110,36 @@ def get_movements_list_from_b3_exports():
 
 
 
+def get_stock_splits(session, tickers=None):
+    """
+    Lê os desdobramentos (stock splits) das ações do pregão, usados para corrigir a quantidade e o preço das movimentações anteriores a eles.
+    O resultado pode ser compartilhado por todos os portfolios do mesmo pregão (ver 'Portfolio' e 'delfos.broker.batch').
+
+    Parameters
+    ----------
+    session : Session
+        O pregão.
+    tickers : list
+        Os tickers. (default é None, todos os tickers do pregão)
+
+    Returns
+    -------
+    dict
+        Os desdobramentos no formato {ticker: [(data, fator)]}, em ordem cronológica. Tickers fora do pregão ficam com a lista vazia.
+    """
+    splits = {}
+    for ticker in tickers if tickers is not None else session.tickers:
+        stock = session.select_stocks(ticker)
+        if isinstance(stock, list) or "Stock Splits" not in stock.history.columns:
+            splits[ticker] = []
+            continue
+        events = stock.history.loc[stock.history["Stock Splits"] > 0, "Stock Splits"]
+        splits[ticker] = list(zip(events.index.date, events.astype(float).tolist()))
+    return splits
+
+
+
+
 class Portfolio():
     """
     Classe que representa um portfolio de ações. Possui uma sessão (pregão) de acordo com a data em que o portfolio será analisado.
@@ -99,16 +147,22 @@ class Portfolio():
     Também deve ser passado por parâmetro a lista de movimentações já realizadas no portfolio. A lista vem da função 'get_movements_list_from_b3_exports()'.
     """
 
-    def __init__(self, session, cash=CASH, movements=[]):
+    def __init__(self, session, cash=None, movements=[], splits=None, prices=None):
         """
         Parameters
         ----------
         session : Session
             O objeto Session que representa o pregão para a análise.
         cash : int ou float
-            O valor em reais disponível para compra de ações.
+            O valor em reais disponível para compra de ações. (default é None, o último registro do arquivo cash.json)
         movements : lista de dicionários
-            Lista com todas as movimentações do portfolio.
+            Lista com todas as movimentações do portfolio. (as movimentações passadas não são alteradas)
+        splits : dict
+            Os desdobramentos das ações, no formato {ticker: [(data, fator)]}, compartilhados entre portfolios do mesmo pregão (ver 'get_stock_splits').
+            Tickers ausentes são lidos dos históricos das ações. (default é None, todos lidos dos históricos)
+        prices : DataFrame
+            A tabela alinhada dos preços de fechamento das ações (datas x tickers), compartilhada entre portfolios do mesmo pregão (ex: um recorte de 'Session.closing_prices_table').
+            Usada no histórico das posições; tickers ausentes usam os históricos das ações. (default é None, a tabela 'closing_prices_table' do pregão)
 
         Raises
         ------
@@ -120,10 +174,16 @@ class Portfolio():
         #checando se os tipos dos parâmetros estão corretos
         if not isinstance(session, Session):
             raise TypeError("Argument 'session' must be a Session object.")
+        if cash is None:
+            cash = CONFIGS.CASH[-1]["available_cash"] #dinheiro disponível para a última data registrada (último registro do patrimonio, lido só no primeiro uso)
         if not isinstance(cash, (int, float)):
             raise TypeError("Argument 'cash' must be an integer or a float.")
         if not isinstance(movements, list):
             raise TypeError("Argument 'movements' must be a list of dicts.")
+        if splits is not None and not isinstance(splits, dict):
+            raise TypeError("Argument 'splits' must be a dictionary.")
+        if prices is not None and not isinstance(prices, pd.DataFrame):
+            raise TypeError("Argument 'prices' must be a DataFrame.")
 
         if cash < 0:
             raise ValueError("The portfolio's cash can't be lesser than 0.")
@@ -132,11 +192,19 @@ class Portfolio():
         self.__cash = cash
         self.__date = self.__session.date.date()
         self.__first_date = None
+        self.__events = EventHub(("position", "cash", "value")) #hub dos eventos do portfolio
+        self.__positions = {}
+        self.__splits = dict(splits) if splits is not None else {} #desdobramentos das ações das movimentações ({ticker: [(data, fator)]})
+        self.__prices = prices #tabela alinhada de preços de fechamento compartilhada (None, a tabela do pregão)
+        self.__history_version = 0 #versão do histórico do portfolio (incrementada a cada recriação do histórico)
+        self.__risk_cache = {} #métricas de risco e atribuições calculadas para a versão atual do histórico
+        self.__risk_cache_version = None #versão dos dados do cache (versão do histórico e último preço do índice de mercado)
         if len(movements) == 0:
             self.__movements = get_movements_list_from_b3_exports()
         else:
             self.__movements = movements
         self.__parse_movements()
+        self.__session.subscribe("price", self.__on_prices, weak=True) #referência fraca: o pregão não mantém o portfolio vivo
 
 
 
@@ -190,6 +258,14 @@ class Portfolio():
     def portfolio_history(self):
         return self.get_portfolio_history() #dataframe com a série histórica de preços do portfolio
 
+    @property
+    def history_version(self):
+        return self.__history_version #versão do histórico do portfolio (muda a cada recriação do histórico)
+
+    @property
+    def risk_metrics(self):
+        return self.get_risk_metrics() #métricas de risco do portfolio (sharpe, sortino, drawdown, VaR, CVaR, beta e excesso sobre a selic)
+
     @property
     def held_shares_cost(self):
         return self.get_held_shares_cost() #custo das ações mantidas (não contam as que foram vendidas)
@@ -234,6 +310,7 @@ class Portfolio():
 
 
 
+    @profiled("portfolio.parse_movements")
     def __parse_movements(self):
         """
         Lê as movimentações e estrutura as posições da carteira para a data de análise.
@@ -248,10 +325,12 @@ class Portfolio():
             Se a data das movimentações não estiver no formato '%d-%m-%Y'.
             Se o tipo das movimentações não for "buy", "sell" ou "dividends"
         """
+        previous_positions = {ticker: (position.quantity, position.total_cost, position.total_income) for ticker, position in self.__positions.items()}
         self.__parsed_movements = {"total": {}}
         self.__failed_positions = [] #lista com as posições cuja as ações não estejam na sessão
         #para cada movimento na carteira
         for i, movement in enumerate(self.__movements):
+            movement = dict(movement) #o ajuste dos desdobramentos não altera as movimentações guardadas (que são parseadas de novo a cada nova movimentação)
 
             if not isinstance(movement["ticker"], str):
                 raise TypeError("All movement's ticker on movements json must be a string.")
@@ -287,9 +366,12 @@ class Portfolio():
                 if i == 0:
                     self.__first_date = movement_date
 
-                for i, row in stock.history[(stock.history["Stock Splits"] > 0) & (stock.history.index.date > movement_date)].iterrows():
-                    movement["quantity"] = int(math.floor(movement["quantity"] * row["Stock Splits"]))
-                    movement["price_per_share"] = movement["price_per_share"] / row["Stock Splits"]
+                if movement["ticker"] not in self.__splits:
+                    self.__splits[movement["ticker"]] = get_stock_splits(self.__session, [movement["ticker"]])[movement["ticker"]]
+                for split_date, split_factor in self.__splits[movement["ticker"]]:
+                    if split_date > movement_date:
+                        movement["quantity"] = int(math.floor(movement["quantity"] * split_factor))
+                        movement["price_per_share"] = movement["price_per_share"] / split_factor
 
                 if movement["date"] not in self.__parsed_movements:
                     if movement["ticker"] not in self.__parsed_movements["total"]:
@@ -362,6 +444,84 @@ class Portfolio():
 
         self.__set_history()
 
+        #publica as posições que mudaram (novas, alteradas ou removidas)
+        if self.__events.has_subscribers("position"):
+            changed_positions = []
+            for ticker in set(previous_positions) | set(self.__positions):
+                position = self.__positions.get(ticker)
+                current = (position.quantity, position.total_cost, position.total_income) if position is not None else None
+                if current != previous_positions.get(ticker):
+                    changed_positions.append({"ticker": ticker, "quantity": current[0] if current else 0, "total_cost": current[1] if current else 0, "total_income": current[2] if current else 0, "position": position})
+            if len(changed_positions) > 0:
+                self.__events.publish("position", changed_positions)
+
+
+
+    def __publish_cash(self):
+        """
+        Publica o evento 'cash' com o dinheiro atual disponível no portfolio.
+        """
+        if self.__events.has_subscribers("cash"):
+            self.__events.publish("cash", [{"cash": self.__cash}])
+
+
+
+    def __on_prices(self, batch):
+        """
+        Recebe os lotes de preços ao vivo do pregão e, se alguma ação do portfolio estiver no lote, publica o evento 'value' com os valores atualizados do portfolio.
+
+        Parameters
+        ----------
+        batch : list
+            Lote de payloads do evento 'price' do pregão.
+        """
+        if not self.__events.has_subscribers("value"):
+            return
+        tickers = [payload["ticker"] for payload in batch if payload["ticker"] in self.__positions]
+        if len(tickers) > 0:
+            self.__events.publish("value", [{"tickers": tickers, "held_shares_value": self.held_shares_value, "total_value": self.total_value, "total_change": self.total_change, "total_return": self.total_return}])
+
+
+
+    def subscribe(self, event, callback):
+        """
+        Inscreve um callback em um evento do portfolio. O callback é chamado com a lista de payloads (dicts) de cada lote do evento.
+
+        Eventos:
+            - position: posições do portfolio mudaram (ticker, quantity, total_cost, total_income, position)
+            - cash: o dinheiro disponível para compras mudou (cash)
+            - value: o preço ao vivo de ações do portfolio mudou (tickers, held_shares_value, total_value, total_change, total_return)
+
+        Parameters
+        ----------
+        event : str
+            O nome do evento ('position', 'cash' ou 'value').
+        callback : function
+            A função chamada a cada lote do evento, no formato callback(batch).
+
+        Returns
+        -------
+        function
+            O callback inscrito, que deve ser usado para cancelar a inscrição.
+        """
+        return self.__events.subscribe(event, callback)
+
+
+
+    def unsubscribe(self, event, callback):
+        """
+        Cancela a inscrição de um callback em um evento do portfolio.
+        """
+        self.__events.unsubscribe(event, callback)
+
+
+
+    def stream(self, event):
+        """
+        Stream assíncrono (asyncio) dos lotes de um evento do portfolio. Deve ser usado com 'async for'. (ver 'subscribe')
+        """
+        return self.__events.stream(event)
+
 
 
     def __add_position(self, ticker, quantity, price_per_share, cost, income, selled):
@@ -475,6 +635,7 @@ class Portfolio():
         if success == True:
             self.__movements.append({"ticker": ticker, "type": type, "price_per_share": price_per_share, "quantity": quantity, "amount":quantity*price_per_share , "date": date_string})
             self.__parse_movements() #atualiza os movimentos da carteira
+            self.__publish_cash()
             #self.update_cash_file()
         return success, error_message
 
@@ -503,6 +664,7 @@ class Portfolio():
 
         if amount != 0:
             self.__cash += amount
+            self.__publish_cash()
             #self.update_cash_file()
 
 
@@ -532,10 +694,12 @@ class Portfolio():
 
         if amount != 0:
             self.__cash -= amount
+            self.__publish_cash()
             #self.update_cash_file()
 
 
 
+    @profiled("portfolio.history")
     def __set_history(self):
         """
         Cria o histórico de preços do portfolio como um todo, a partir das posições. (Série histórica)
@@ -550,35 +714,34 @@ class Portfolio():
             - Daily Ret: Rentabilidade do portfolio entre a data atual e a anterior
             - Total Ret: Rentabilidade total do portfolio
         """
-        tickers_df = {}
+        #junta as linhas (data, movimentações acumuladas) de cada ação, para montar um único dataframe por ação
+        tickers_rows = {}
         for date in self.__parsed_movements:
             if date != "total":
                 for ticker in self.__parsed_movements[date]:
-                    date_df = pd.DataFrame.from_dict({date: self.__parsed_movements[date][ticker]}, "index")
-                    date_df.index = pd.to_datetime(date_df.index, format="%d-%m-%Y")
-                    date_df["ticker"] = ticker
-
-                    if ticker not in tickers_df:
-                        tickers_df.update({ticker: [date_df]})
-                    else:
-                        tickers_df[ticker].append(date_df)
-
-        self.__portfolio_history = pd.DataFrame(columns=["Close", "Cost"])
-
-        for i, ticker in enumerate(tickers_df):
-            ticker_df = pd.concat(tickers_df[ticker])
+                    dates, rows = tickers_rows.setdefault(ticker, ([], []))
+                    dates.append(date)
+                    rows.append(self.__parsed_movements[date][ticker])
+
+        #os preços das posições vêm sempre de uma tabela alinhada (a compartilhada ou a do pregão), então um portfolio avulso e o lote (ver 'delfos.broker.batch') dão o mesmo resultado
+        prices = self.__prices if self.__prices is not None else self.__session.closing_prices_table
+        columns = ["Close", "Close (no income)", "Cost"]
+        positions_histories = {}
+        for ticker in tickers_rows:
+            dates, rows = tickers_rows[ticker]
+            ticker_df = pd.DataFrame(rows, index=pd.to_datetime(dates, format="%d-%m-%Y"))
+            ticker_df["ticker"] = ticker
             position = self.__positions[ticker]
-            position.set_history(ticker_df)
-
-            if i == 0:
-                self.__portfolio_history["Close"] = position.history["Close"]
-                self.__portfolio_history["Close (no income)"] = position.history["Close (no income)"]
-                self.__portfolio_history["Cost"] = position.history["Cost"]
-
-            else:
-                self.__portfolio_history["Close"] = self.__portfolio_history["Close"].add(position.history["Close"], fill_value=0)
-                self.__portfolio_history["Close (no income)"] = self.__portfolio_history["Close (no income)"].add(position.history["Close (no income)"], fill_value=0)
-                self.__portfolio_history["Cost"] = self.__portfolio_history["Cost"].add(position.history["Cost"], fill_value=0)
+            position.set_history(ticker_df, prices[ticker] if ticker in prices.columns else None)
+            positions_histories[ticker] = position.history[columns].astype(float).where(position.history["Close"].notna()) #custo e valor só a partir da primeira data com preço
+
+        #as posições são alinhadas na união das datas antes da soma: numa data sem linha de uma posição (ação sem pregão, movimentação em fim de semana),
+        #a posição vale o seu último valor (e zero antes da sua primeira data com preço), e não zero, como nas tabelas de 'delfos.broker.returns.get_flows_tables'
+        if len(positions_histories) > 0:
+            aligned = pd.concat(positions_histories, axis=1).sort_index().ffill().fillna(0)
+            self.__portfolio_history = pd.DataFrame({column: aligned.xs(column, axis=1, level=1).sum(axis=1) for column in columns})
+        else:
+            self.__portfolio_history = pd.DataFrame(columns=columns, dtype=float)
 
         self.__portfolio_history["Cash Flow"] = self.__portfolio_history["Cost"].diff()
         self.__portfolio_history["Cash Flow"].iloc[0] = self.__portfolio_history["Cost"].iloc[0]
@@ -588,6 +751,8 @@ class Portfolio():
         self.__portfolio_history["Pct Change w/ CF"] = self.__portfolio_history["Close"].pct_change()
         self.__portfolio_history["Daily Ret"] = ( self.__portfolio_history["Close"].diff() - self.__portfolio_history["Cost"].diff() ) / (self.__portfolio_history["Cost"].diff() +  self.__portfolio_history["Close"].shift(1))
         self.__portfolio_history["Total Ret"] = ((self.__portfolio_history["Close"].sub(self.__portfolio_history["Cost"], fill_value=0)) / self.__portfolio_history["Cost"])
+        self.__history_version += 1
+        self.__risk_cache = {} #as métricas de risco da versão anterior do histórico não valem mais
 
 
 
@@ -604,6 +769,252 @@ class Portfolio():
 
 
 
+    def __get_risk_cache_key(self, *params):
+        """
+        Chave do cache das métricas de risco: os parâmetros, a versão do histórico e o último preço do índice de mercado (que muda durante o pregão).
+        O cache só guarda as entradas da versão atual dos dados: quando o preço do índice (ou o histórico) muda, as entradas anteriores são descartadas.
+        """
+        market_index = self.__session.market_index
+        last_index_price = float(market_index.history["Close"].iloc[-1]) if market_index is not None and not market_index.history.empty else None
+        version = (self.__history_version, last_index_price)
+        if version != self.__risk_cache_version:
+            self.__risk_cache = {} #sem isso, cada novo preço do índice deixaria uma geração de entradas no cache (memória sem limite no daemon)
+            self.__risk_cache_version = version
+        return params + version
+
+
+
+    def get_risk_metrics(self, confidence=0.95):
+        """
+        Calcula as métricas de risco do portfolio em uma única passada vetorizada sobre o histórico (ver 'delfos.broker.risk').
+        O resultado é guardado em cache até a próxima versão do histórico do portfolio.
+
+        Parameters
+        ----------
+        confidence : float
+            O nível de confiança do VaR e do CVaR. (default é 0.95)
+
+        Returns
+        -------
+        dict
+            As métricas: observations, annual_return, annual_volatility, sharpe, sortino, max_drawdown, var, cvar, beta, risk_free_return e excess_return.
+        """
+        key = self.__get_risk_cache_key("metrics", confidence)
+        if key not in self.__risk_cache:
+            series = get_risk_series(self)
+            self.__risk_cache[key] = get_risk_metrics(series["Return"], series["Market Return"], series["Risk Free Return"], confidence)
+        return dict(self.__risk_cache[key])
+
+
+
+    def get_rolling_risk_metrics(self, window=SESSION_FREQ_PER_YEAR // 4):
+        """
+        Calcula as métricas de risco do portfolio em janelas móveis, em O(n) por somas acumuladas (ver 'delfos.broker.risk').
+        O resultado é guardado em cache até a próxima versão do histórico do portfolio.
+
+        Parameters
+        ----------
+        window : int
+            O número de pregões de cada janela. (default é um trimestre de pregões)
+
+        Returns
+        -------
+        DataFrame
+            As métricas de cada data do histórico (colunas 'Annual Return', 'Annual Volatility', 'Sharpe', 'Sortino', 'Beta', 'Excess Return' e 'Drawdown').
+        """
+        key = self.__get_risk_cache_key("rolling", window)
+        if key not in self.__risk_cache:
+            series = get_risk_series(self)
+            self.__risk_cache[key] = get_rolling_risk_metrics(series["Return"], window, series["Market Return"], series["Risk Free Return"])
+        return self.__risk_cache[key].copy()
+
+
+
+    def __get_flows_tables(self, positions=False):
+        """
+        Alinha os valores e os fluxos de caixa do portfolio (coluna 'Portfolio') e, se 'positions', das posições (uma coluna por ticker).
+        A coluna do portfolio é a soma das posições já alinhadas (valores repetidos nas datas sem preço e fluxos passados para a próxima data com preço).
+        """
+        values, cash_flows = get_flows_tables({ticker: position.history for ticker, position in self.__positions.items()})
+        values.insert(0, "Portfolio", values.sum(axis=1))
+        cash_flows.insert(0, "Portfolio", cash_flows.sum(axis=1))
+        if not positions:
+            return values[["Portfolio"]], cash_flows[["Portfolio"]]
+        return values, cash_flows
+
+
+
+    def get_daily_returns(self, positions=False):
+        """
+        Calcula os retornos diários do portfolio e, opcionalmente, de todas as posições, a partir das tabelas alinhadas de valores e fluxos de caixa (ver 'delfos.broker.returns').
+        O aporte do dia entra no começo do dia, como na TWR.
+
+        Parameters
+        ----------
+        positions : bool
+            Se verdadeiro, calcula também os retornos de cada posição. (default é False)
+
+        Returns
+        -------
+        DataFrame
+            Os retornos diários (linhas = datas) do portfolio (coluna 'Portfolio') e das posições (uma coluna por ticker). Datas sem capital no começo do dia são NaN.
+        """
+        values, cash_flows = self.__get_flows_tables(positions)
+        base = values.shift(1).fillna(0) + cash_flows
+        return get_daily_returns(values, cash_flows).where(base > 0)
+
+
+
+    def get_time_weighted_returns(self, start=None, end=None, freq=None, positions=False):
+        """
+        Calcula os retornos ponderados pelo tempo (TWR) do portfolio e, opcionalmente, de todas as posições de uma vez (ver 'delfos.broker.returns').
+
+        Parameters
+        ----------
+        start : datetime
+            A primeira data do intervalo. (default é None, a primeira data do histórico)
+        end : datetime
+            A última data do intervalo. (default é None, a última data do histórico)
+        freq : str
+            A frequência dos sub-períodos, no formato dos períodos do pandas (ex: 'M', 'Q', 'Y'). (default é None, o intervalo inteiro)
+        positions : bool
+            Se verdadeiro, calcula também a TWR de cada posição. (default é False)
+
+        Returns
+        -------
+        DataFrame
+            A TWR (não anualizada) de cada sub-período (linhas) para o portfolio (coluna 'Portfolio') e as posições (uma coluna por ticker).
+        """
+        return get_time_weighted_returns(*self.__get_flows_tables(positions), start, end, freq)
+
+
+
+    def get_money_weighted_returns(self, start=None, end=None, freq=None, positions=False):
+        """
+        Calcula as taxas internas de retorno anuais (XIRR) do portfolio e, opcionalmente, de todas as posições, resolvidas em uma única chamada em lote (ver 'delfos.broker.returns').
+
+        Parameters
+        ----------
+        start : datetime
+            A primeira data do intervalo. (default é None, a primeira data do histórico)
+        end : datetime
+            A última data do intervalo. (default é None, a última data do histórico)
+        freq : str
+            A frequência dos sub-períodos, no formato dos períodos do pandas (ex: 'M', 'Q', 'Y'). (default é None, o intervalo inteiro)
+        positions : bool
+            Se verdadeiro, calcula também a IRR de cada posição. (default é False)
+
+        Returns
+        -------
+        DataFrame
+            A IRR anual de cada sub-período (linhas) para o portfolio (coluna 'Portfolio') e as posições (uma coluna por ticker).
+        """
+        return get_money_weighted_returns(*self.__get_flows_tables(positions), start, end, freq)
+
+
+
+    def get_attribution_tables(self, level="sector"):
+        """
+        Calcula a atribuição diária de performance do portfolio por grupo de ações, contra o mercado ponderado pelo valor de mercado das ações do pregão (ver 'delfos.broker.attribution').
+        O resultado é guardado em cache até a próxima versão do histórico do portfolio.
+
+        Parameters
+        ----------
+        level : str
+            O nível de agrupamento: 'sector', 'sub_sector', 'segment' ou 'type'. (default é 'sector')
+
+        Returns
+        -------
+        DataFrame
+            A atribuição diária, com colunas em dois níveis (medida, grupo): 'Weight', 'Return', 'Market Weight', 'Market Return', 'Allocation', 'Selection' e 'Interaction'.
+        """
+        key = self.__get_risk_cache_key("attribution", level)
+        if key not in self.__risk_cache:
+            values, cash_flows, income = get_positions_tables({ticker: position.history for ticker, position in self.__positions.items()})
+            labels = get_group_labels([self.__positions[ticker].stock for ticker in values.columns], level)
+            self.__risk_cache[key] = get_attribution_tables(values, cash_flows, labels, *get_market_panel(self.__session, values.index, level), income=income)
+        return self.__risk_cache[key].copy()
+
+
+
+    def get_attribution(self, level="sector", start=None, end=None):
+        """
+        Resume a atribuição de performance do portfolio por grupo de ações no intervalo: pesos, retornos e efeitos de Brinson-Fachler (alocação, seleção e interação).
+        O resultado é guardado em cache até a próxima versão do histórico do portfolio.
+
+        Parameters
+        ----------
+        level : str
+            O nível de agrupamento: 'sector', 'sub_sector', 'segment' ou 'type'. (default é 'sector')
+        start : datetime
+            A primeira data do intervalo. (default é None, a primeira data do histórico)
+        end : datetime
+            A última data do intervalo. (default é None, a última data do histórico)
+
+        Returns
+        -------
+        DataFrame
+            O resumo de cada grupo e do total (colunas 'Weight', 'Return', 'Market Weight', 'Market Return', 'Allocation', 'Selection', 'Interaction' e 'Total Effect').
+        """
+        key = self.__get_risk_cache_key("attribution summary", level, start, end)
+        if key not in self.__risk_cache:
+            self.__risk_cache[key] = get_attribution_summary(self.get_attribution_tables(level), start, end)
+        return self.__risk_cache[key].copy()
+
+
+
+    def get_rolling_attribution(self, level="sector", window=SESSION_FREQ_PER_YEAR // 4):
+        """
+        Calcula os efeitos de Brinson-Fachler de cada grupo de ações em janelas móveis, em O(n) por somas acumuladas (ver 'delfos.broker.attribution').
+        O resultado é guardado em cache até a próxima versão do histórico do portfolio.
+
+        Parameters
+        ----------
+        level : str
+            O nível de agrupamento: 'sector', 'sub_sector', 'segment' ou 'type'. (default é 'sector')
+        window : int
+            O número de pregões de cada janela. (default é um trimestre de pregões)
+
+        Returns
+        -------
+        DataFrame
+            Os efeitos de cada janela, com colunas em dois níveis (efeito, grupo).
+        """
+        key = self.__get_risk_cache_key("rolling attribution", level, window)
+        if key not in self.__risk_cache:
+            self.__risk_cache[key] = get_rolling_attribution(self.get_attribution_tables(level), window)
+        return self.__risk_cache[key].copy()
+
+
+
+    def get_rebalance_trades(self, buy_weights=None, rebalance=None):
+        """
+        Calcula as ordens que levam as posições do portfolio e o seu dinheiro para os pesos de compra, com os preços atuais das ações (ver 'delfos.broker.rebalance').
+        O portfolio não é alterado.
+
+        Parameters
+        ----------
+        buy_weights : dict
+            Os pesos alvo, no formato {ticker: peso}. (default é None, os pesos de compra do modelo de alocação do pregão)
+        rebalance : dict
+            Parâmetros do rebalanceamento: fractional, min_trade_value, max_turnover e cash_reserve. (default é None, os parâmetros de default)
+
+        Returns
+        -------
+        dict
+            As ordens (DataFrame em 'trades') e o resumo do rebalanceamento. (ver 'delfos.broker.rebalance.get_rebalance_trades')
+        """
+        buy_weights = buy_weights if buy_weights is not None else self.__session.buy_weights
+        quantities = {ticker: position.quantity for ticker, position in self.__positions.items() if position.quantity > 0}
+        prices = {}
+        for ticker in set(quantities) | set(buy_weights):
+            stock = self.__session.select_stocks(ticker)
+            if not isinstance(stock, list):
+                prices[ticker] = float(stock.current_price)
+        return get_rebalance_trades(quantities, prices, float(self.__cash), buy_weights, rebalance)
+
+
+
     def get_held_shares_cost(self):
         """
         Cálcula através das posições da carteira o custo das ações atuais (não conta as vendidas/realizadas)
@@ -1,4 +1,5 @@
 from delfos.market.stock import Stock
+from delfos.broker.returns import get_flows_tables, get_time_weighted_returns, get_money_weighted_returns
 import pandas as pd
 
 
@@ -266,7 +267,7 @@ class Position():
 
 
 
-    def set_history(self, history):
+    def set_history(self, history, prices=None):
         """
         Cria o histórico (Série histórica) de preços da posição, a partir dos movimentos extraídos pela classe Portfolio.
         O histórico é um dataframe (datetime index) e apresenta as seguintes colunas:
@@ -284,10 +285,15 @@ class Position():
         ----------
          Dataframe
             dataframe com as movimentações da posição, extraídas pela classe Portfolio. Também é possível passar o histórico manualmente por argumento.
+        prices : Series
+            Os preços de fechamento da ação, de uma tabela alinhada (ver 'Portfolio'). As datas do histórico da ação depois da última data da tabela
+            (barras ao vivo) são acrescentadas. (default é None, o histórico da ação)
         """
         self.__history = history
 
         hist = self.__stock.history["Close"]
+        if prices is not None and len(prices) > 0:
+            hist = pd.concat([prices, hist[hist.index > prices.index[-1]]]).rename("Close")
         hist = hist[hist.index >= self.__history.index[0]]
 
         self.__history = self.__history.merge(hist, left_index=True, right_index=True, how="outer")
@@ -317,3 +323,45 @@ class Position():
             Histórico da posição.
         """
         return self.__history
+
+
+
+    def get_time_weighted_return(self, start=None, end=None):
+        """
+        Calcula o retorno ponderado pelo tempo (TWR) da posição no intervalo, a partir do histórico (ver 'delfos.broker.returns').
+
+        Parameters
+        ----------
+        start : datetime
+            A primeira data do intervalo. (default é None, a primeira data do histórico)
+        end : datetime
+            A última data do intervalo. (default é None, a última data do histórico)
+
+        Returns
+        -------
+        float
+            A TWR do intervalo (não anualizada). NaN se o intervalo não tiver datas.
+        """
+        returns = get_time_weighted_returns(*get_flows_tables({self.__stock.ticker: self.__history}), start, end)
+        return float(returns.iloc[0, 0]) if len(returns) > 0 else float("nan")
+
+
+
+    def get_money_weighted_return(self, start=None, end=None):
+        """
+        Calcula a taxa interna de retorno anual (XIRR) da posição no intervalo, a partir dos aportes datados do histórico (ver 'delfos.broker.returns').
+
+        Parameters
+        ----------
+        start : datetime
+            A primeira data do intervalo. (default é None, a primeira data do histórico)
+        end : datetime
+            A última data do intervalo. (default é None, a última data do histórico)
+
+        Returns
+        -------
+        float
+            A IRR anual do intervalo. NaN se o intervalo não tiver datas ou se os fluxos não trocarem de sinal.
+        """
+        returns = get_money_weighted_returns(*get_flows_tables({self.__stock.ticker: self.__history}), start, end)
+        return float(returns.iloc[0, 0]) if len(returns) > 0 else float("nan")
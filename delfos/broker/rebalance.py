@@ -0,0 +1,192 @@
+"""
+Gerador das ordens de rebalanceamento: leva as posições atuais de um portfolio (e o seu dinheiro) para os pesos de compra do modelo de alocação ('Session.buy_weights').
+
+Restrições:
+    - dinheiro: as compras são pagas pelo dinheiro disponível mais as vendas (menos a reserva de dinheiro)
+    - lotes da B3: quantidades em lotes padrão (100 ações) e, com o mercado fracionário, sobras de 1 a 99 ações (ticker com sufixo 'F')
+    - valor mínimo de cada ordem
+    - giro máximo: soma das ordens sobre o valor líquido do portfolio
+
+A alocação inteira é resolvida por um guloso com reparo, em O(n log n):
+    1. as diferenças contínuas entre os valores alvo e os atuais são reduzidas proporcionalmente até caber no giro máximo;
+    2. as quantidades são arredondadas para baixo (em direção a zero) na unidade de negociação (1 ação com o fracionário, senão 1 lote) e as ordens abaixo do mínimo são descartadas;
+    3. reparo: se o dinheiro não fechar, as compras com menor falta para o alvo perdem unidades até fechar;
+    4. preenchimento: o dinheiro que sobrou compra unidades das ações com maior falta para o alvo (heap), enquanto couber no dinheiro e no giro e a unidade aproximar a ação do alvo.
+"""
+from delfos.common.configs import Configs
+import pandas as pd
+import numpy as np
+import heapq
+
+
+CONFIGS = Configs()
+
+REBALANCE = CONFIGS.DEFAULTS["REBALANCE"] #parâmetros de default do rebalanceamento
+B3_ROUND_LOT = CONFIGS.CONSTANTS["B3_ROUND_LOT"] #lote padrão da B3
+FRACTIONAL_SUFFIX = "F" #sufixo dos tickers do mercado fracionário
+
+
+
+def get_rebalance_params(rebalance=None):
+    """
+    Monta os parâmetros do rebalanceamento, completando os passados com os de default das configurações.
+
+    Parameters
+    ----------
+    rebalance : dict
+        Parâmetros que substituem os de default. (default é None, os parâmetros de default)
+
+    Raises
+    ------
+    TypeError
+        Se o parâmetro 'rebalance' não for um dicionário.
+    ValueError
+        Se algum parâmetro não existir ou tiver um valor inválido.
+
+    Returns
+    -------
+    dict
+        Os parâmetros do rebalanceamento.
+    """
+    if rebalance is None:
+        rebalance = {}
+    if not isinstance(rebalance, dict):
+        raise TypeError("Argument 'rebalance' must be a dictionary.")
+    for key in rebalance:
+        if key not in REBALANCE:
+            raise ValueError("Invalid rebalance parameter '{}'. Valid parameters: {}.".format(key, ", ".join(REBALANCE)))
+    params = {**REBALANCE, **rebalance}
+    if params["min_trade_value"] < 0:
+        raise ValueError("Rebalance parameter 'min_trade_value' must be greater or equal 0.")
+    if params["max_turnover"] is not None and params["max_turnover"] < 0:
+        raise ValueError("Rebalance parameter 'max_turnover' must be greater or equal 0.")
+    if not 0 <= params["cash_reserve"] < 1:
+        raise ValueError("Rebalance parameter 'cash_reserve' must be a float between 0 and 1.")
+    return params
+
+
+
+def get_rebalance_trades(quantities, prices, cash, buy_weights, rebalance=None):
+    """
+    Calcula as ordens que levam as posições para os pesos de compra, respeitando o dinheiro, os lotes, o valor mínimo das ordens e o giro máximo.
+
+    Parameters
+    ----------
+    quantities : dict
+        As quantidades atuais de ações, no formato {ticker: quantidade}.
+    prices : dict
+        Os preços atuais, no formato {ticker: preço}. Tickers sem preço positivo não são negociados (ficam em 'skipped').
+    cash : int ou float
+        O dinheiro disponível.
+    buy_weights : dict
+        Os pesos alvo no valor líquido do portfolio (ações + dinheiro), no formato {ticker: peso}. Ações mantidas fora dos pesos têm alvo zero.
+    rebalance : dict
+        Parâmetros do rebalanceamento: fractional, min_trade_value, max_turnover e cash_reserve. (default é None, os parâmetros de default, ver 'get_rebalance_params')
+
+    Raises
+    ------
+    ValueError
+        Se o dinheiro for menor que 0.
+
+    Returns
+    -------
+    dict
+        Dicionário com:
+            - trades: DataFrame com as ordens (index ticker; colunas side, quantity, lot_quantity, odd_quantity, odd_ticker, price, value, current_weight, target_weight, post_weight; pesos no valor líquido)
+            - cash: o dinheiro depois das ordens
+            - net_value: o valor líquido do portfolio (ações negociáveis + dinheiro)
+            - buy_value / sell_value: os totais das compras e das vendas
+            - turnover: o giro das ordens (soma das ordens sobre o valor líquido)
+            - weight_gap: a distância entre os pesos depois das ordens e os alvos (metade da soma das diferenças absolutas)
+            - skipped: os tickers sem preço, que não foram negociados
+    """
+    if cash < 0:
+        raise ValueError("Argument 'cash' must be greater or equal 0.")
+    params = get_rebalance_params(rebalance)
+    unit = 1 if params["fractional"] else B3_ROUND_LOT
+
+    #universo: ações mantidas e ações com peso de compra, com preço positivo
+    universe = sorted({ticker for ticker, quantity in quantities.items() if quantity > 0} | {ticker for ticker, weight in buy_weights.items() if weight > 0})
+    skipped = [ticker for ticker in universe if not prices.get(ticker, 0) > 0]
+    tickers = [ticker for ticker in universe if prices.get(ticker, 0) > 0]
+    price = np.array([prices[ticker] for ticker in tickers], dtype=float)
+    held = np.array([quantities.get(ticker, 0) for ticker in tickers], dtype=float)
+    weights = np.array([buy_weights.get(ticker, 0) for ticker in tickers], dtype=float)
+
+    current_values = held * price
+    net_value = float(cash + current_values.sum())
+    targets = weights * net_value * (1 - params["cash_reserve"])
+    target_weights = targets / net_value if net_value > 0 else np.zeros(len(tickers))
+    available_cash = cash - params["cash_reserve"] * net_value #dinheiro que pode ser gasto (pode começar negativo: as vendas cobrem a reserva)
+
+    #1. diferenças contínuas, reduzidas proporcionalmente até o giro máximo
+    deltas = targets - current_values
+    turnover_budget = params["max_turnover"] * net_value if params["max_turnover"] is not None else np.inf
+    if np.abs(deltas).sum() > turnover_budget:
+        deltas *= turnover_budget / np.abs(deltas).sum()
+
+    #2. arredondamento em direção a zero na unidade de negociação (vendas limitadas às ações mantidas) e corte das ordens abaixo do mínimo
+    shares = np.trunc(deltas / price / unit) * unit
+    shares = np.maximum(shares, -held)
+    shares[np.abs(shares * price) < params["min_trade_value"]] = 0
+
+    #3. reparo do dinheiro: tira unidades das compras com menor falta para o alvo
+    remaining_cash = available_cash - np.sum(shares * price)
+    if remaining_cash < 0:
+        heap = [(-(targets[i] - (held[i] + shares[i]) * price[i]), i) for i in np.flatnonzero(shares > 0)]
+        heapq.heapify(heap) #menor falta (maior excesso) primeiro
+        while remaining_cash < 0 and len(heap) > 0:
+            _, i = heapq.heappop(heap)
+            removed = min(shares[i], np.ceil(-remaining_cash / (unit * price[i])) * unit)
+            if shares[i] - removed > 0 and (shares[i] - removed) * price[i] < params["min_trade_value"]:
+                removed = shares[i] #a compra que sobraria fica abaixo do mínimo
+            shares[i] -= removed
+            remaining_cash += removed * price[i]
+            if shares[i] > 0:
+                heapq.heappush(heap, (-(targets[i] - (held[i] + shares[i]) * price[i]), i))
+
+    #4. preenchimento: compra unidades das ações com maior falta para o alvo enquanto houver dinheiro e giro
+    turnover = np.sum(np.abs(shares) * price)
+    heap = [(-(targets[i] - (held[i] + shares[i]) * price[i]), i) for i in np.flatnonzero(shares >= 0)]
+    heapq.heapify(heap)
+    while len(heap) > 0 and remaining_cash > 0:
+        deficit, i = heapq.heappop(heap)
+        deficit = -deficit
+        cost = unit * price[i]
+        if deficit <= 0:
+            break #nenhuma outra ação está abaixo do alvo
+        if deficit <= cost / 2 or cost > remaining_cash or turnover + cost > turnover_budget or (shares[i] + unit) * price[i] < params["min_trade_value"]:
+            continue #a unidade afastaria a ação do alvo ou não cabe: a ação sai do preenchimento (outras, mais baratas, ainda podem caber)
+        shares[i] += unit
+        remaining_cash -= cost
+        turnover += cost
+        heapq.heappush(heap, (-(deficit - cost), i))
+
+    post_values = (held + shares) * price
+    traded = np.flatnonzero(shares != 0)
+    quantity = np.abs(shares[traded]).astype(int)
+    trades = pd.DataFrame({
+        "side": np.where(shares[traded] > 0, "buy", "sell"),
+        "quantity": quantity,
+        "lot_quantity": quantity // B3_ROUND_LOT * B3_ROUND_LOT,
+        "odd_quantity": quantity % B3_ROUND_LOT,
+        "odd_ticker": [tickers[i] + FRACTIONAL_SUFFIX if quantity[j] % B3_ROUND_LOT > 0 else None for j, i in enumerate(traded)],
+        "price": price[traded],
+        "value": np.abs(shares[traded]) * price[traded],
+        "current_weight": current_values[traded] / net_value if net_value > 0 else 0.0,
+        "target_weight": target_weights[traded],
+        "post_weight": post_values[traded] / net_value if net_value > 0 else 0.0
+    }, index=pd.Index([tickers[i] for i in traded], name="ticker"))
+
+    buy_value = float(np.sum(np.maximum(shares, 0) * price))
+    sell_value = float(np.sum(np.maximum(-shares, 0) * price))
+    return {
+        "trades": trades,
+        "cash": float(cash - buy_value + sell_value),
+        "net_value": net_value,
+        "buy_value": buy_value,
+        "sell_value": sell_value,
+        "turnover": float((buy_value + sell_value) / net_value) if net_value > 0 else 0.0,
+        "weight_gap": float(np.sum(np.abs(post_values / net_value - target_weights)) / 2) if net_value > 0 else 0.0,
+        "skipped": skipped
+    }
@@ -0,0 +1,279 @@
+"""
+Retornos ponderados pelo tempo (TWR) e pelo dinheiro (IRR/XIRR) das posições e do portfolio, em qualquer intervalo de datas e em sub-períodos (ex: mensais).
+
+O 'Total Ret' dos históricos ((Close - Cost) / Cost) mistura o momento dos aportes com a performance. Aqui:
+    - TWR: encadeia os retornos diários descontando o fluxo de caixa do dia, na mesma convenção do 'Daily Ret' (o aporte entra no começo do dia):
+      r = (Close - Close anterior - Cash Flow) / (Close anterior + Cash Flow). Independe do tamanho e do momento dos aportes.
+    - IRR (XIRR): taxa anual que zera o valor presente dos fluxos datados do intervalo: o valor no começo e os aportes (saídas) e o valor no fim (entrada).
+      Anos de 365 dias corridos.
+
+Os valores (Close) incluem o realizado (vendas e dividendos), então vendas e dividendos não são fluxos: o fluxo de caixa é só o aporte (variação do custo).
+
+Todas as séries (várias posições e vários sub-períodos) são resolvidas juntas: as TWRs por produtos vetorizados e as IRRs por um único Newton-Raphson
+em lote, com bisseção de segurança dentro de um intervalo com troca de sinal para cada linha.
+"""
+import pandas as pd
+import numpy as np
+
+
+DAYS_PER_YEAR = 365 #dias corridos por ano no XIRR
+IRR_BRACKETS = (10.0, 1e3, 1e6) #limites superiores testados até achar a troca de sinal do valor presente
+IRR_MIN_RATE = -0.999999 #limite inferior das taxas (perda quase total)
+
+
+
+def get_npv(rates, amounts, times):
+    """
+    Calcula, por linha, o valor presente dos fluxos e a sua derivada em relação à taxa.
+
+    Parameters
+    ----------
+    rates : array
+        As taxas de cada linha (m).
+    amounts : array
+        Os fluxos (m x k), com zeros nas posições sem fluxo.
+    times : array
+        Os tempos dos fluxos em anos (m x k), contados a partir do primeiro fluxo.
+
+    Returns
+    -------
+    tuple
+        Os valores presentes (m) e as derivadas (m).
+    """
+    log_base = np.log1p(rates)[:, None]
+    discounts = np.exp(-times * log_base)
+    npv = np.sum(amounts * discounts, axis=1)
+    derivative = np.sum(-times * amounts * discounts, axis=1) / (1 + rates)
+    return npv, derivative
+
+
+
+def solve_irr(amounts, times, tol=1e-10, max_iter=100):
+    """
+    Resolve a taxa interna de retorno de várias séries de fluxos em uma única chamada (Newton-Raphson vetorizado, com bisseção quando o passo de Newton
+    sai do intervalo com troca de sinal).
+
+    Parameters
+    ----------
+    amounts : array
+        Os fluxos de cada série (m x k): negativos são aportes e positivos são retiradas/valor final. Zeros completam as séries mais curtas.
+    times : array
+        Os tempos dos fluxos em anos (m x k), contados a partir do primeiro fluxo de cada série.
+    tol : float
+        A tolerância da taxa. (default é 1e-10)
+    max_iter : int
+        O número máximo de iterações. (default é 100)
+
+    Raises
+    ------
+    ValueError
+        Se os fluxos e os tempos não tiverem o mesmo formato (m x k).
+
+    Returns
+    -------
+    array
+        A taxa anual de cada série (m). Séries sem troca de sinal nos fluxos (ou sem fluxos) são NaN.
+    """
+    amounts = np.atleast_2d(np.asarray(amounts, dtype=float))
+    times = np.atleast_2d(np.asarray(times, dtype=float))
+    if amounts.shape != times.shape:
+        raise ValueError("Arguments 'amounts' and 'times' must have the same shape.")
+    m = amounts.shape[0]
+
+    #intervalo inicial com troca de sinal: do limite inferior até o primeiro limite superior que troca o sinal do valor presente
+    low = np.full(m, IRR_MIN_RATE)
+    high = np.full(m, np.nan)
+    npv_low = get_npv(low, amounts, times)[0]
+    for bracket in IRR_BRACKETS:
+        missing = np.isnan(high)
+        if not missing.any():
+            break
+        candidate = np.full(m, bracket)
+        npv_candidate = get_npv(candidate, amounts, times)[0]
+        found = missing & (np.sign(npv_candidate) != np.sign(npv_low)) & (npv_candidate != 0)
+        high[found] = bracket
+    solvable = ~np.isnan(high) & np.any(amounts < 0, axis=1) & np.any(amounts > 0, axis=1)
+
+    rates = np.where(solvable, 0.1, np.nan)
+    low, high = np.where(solvable, low, np.nan), np.where(solvable, high, np.nan)
+    rates = np.clip(rates, low, high)
+    active = solvable.copy()
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        for _ in range(max_iter):
+            if not active.any():
+                break
+            npv, derivative = get_npv(rates[active], amounts[active], times[active])
+            npv_low = get_npv(low[active], amounts[active], times[active])[0]
+
+            #atualiza o intervalo: a raiz fica do lado em que o sinal troca
+            same_side = np.sign(npv) == np.sign(npv_low)
+            low[active] = np.where(same_side, rates[active], low[active])
+            high[active] = np.where(same_side, high[active], rates[active])
+
+            newton = rates[active] - npv / derivative
+            bisection = (low[active] + high[active]) / 2
+            inside = np.isfinite(newton) & (newton >= low[active]) & (newton <= high[active])
+            new_rates = np.where(npv == 0, rates[active], np.where(inside, newton, bisection)) #raiz exata: mantém a taxa
+
+            converged = (np.abs(new_rates - rates[active]) < tol) | (npv == 0) | (high[active] - low[active] < tol)
+            rates[active] = new_rates
+            indexes = np.flatnonzero(active)
+            active[indexes[converged]] = False
+    return rates
+
+
+
+def get_flows_tables(histories):
+    """
+    Alinha os históricos (posições ou portfolio) em duas tabelas (datas nas linhas, nomes nas colunas): os valores (Close) e os fluxos de caixa (Cash Flow).
+    Antes da primeira data de cada histórico, o valor e o fluxo são zero; datas sem preço (ex: movimentações em fins de semana) repetem o último valor
+    e os seus fluxos passam para a próxima data com preço, quando as ações compradas entram no valor.
+
+    Parameters
+    ----------
+    histories : dict
+        Os históricos no formato {nome: DataFrame com as colunas 'Close' e 'Cash Flow'}.
+
+    Returns
+    -------
+    tuple
+        As tabelas de valores e de fluxos de caixa (DataFrames).
+    """
+    if len(histories) == 0:
+        return pd.DataFrame(dtype=float), pd.DataFrame(dtype=float)
+    values = pd.DataFrame({name: history["Close"] for name, history in histories.items()}).sort_index()
+    cash_flows = pd.DataFrame({name: history["Cash Flow"] for name, history in histories.items()}).sort_index()
+    values = values.astype(float)
+    priced = values.notna()
+    cumulative_flows = cash_flows.astype(float).fillna(0).cumsum().where(priced) #fluxos acumulados até cada data com preço
+    cash_flows = (cumulative_flows - cumulative_flows.ffill().shift(1).fillna(0)).where(priced, 0)
+    return values.ffill().fillna(0), cash_flows
+
+
+
+def get_periods(index, start=None, end=None, freq=None):
+    """
+    Divide as datas do intervalo em sub-períodos.
+
+    Parameters
+    ----------
+    index : DatetimeIndex
+        As datas.
+    start : datetime
+        A primeira data do intervalo. (default é None, a primeira data)
+    end : datetime
+        A última data do intervalo. (default é None, a última data)
+    freq : str
+        A frequência dos sub-períodos, no formato dos períodos do pandas (ex: 'M', 'Q', 'Y'). (default é None, o intervalo inteiro é um período)
+
+    Returns
+    -------
+    tuple
+        A máscara das datas do intervalo (array de bool) e o rótulo do período de cada data do intervalo (array). Sem 'freq', o rótulo é a última data do intervalo.
+    """
+    mask = np.ones(len(index), dtype=bool)
+    if start is not None:
+        mask &= index >= pd.Timestamp(start)
+    if end is not None:
+        mask &= index <= pd.Timestamp(end)
+    dates = index[mask]
+    if freq is None:
+        labels = np.full(len(dates), dates[-1] if len(dates) > 0 else None, dtype=object)
+    else:
+        labels = np.asarray(dates.to_period(freq))
+    return mask, labels
+
+
+
+def get_daily_returns(values, cash_flows):
+    """
+    Calcula os retornos diários de cada coluna descontando o fluxo de caixa do dia (o aporte entra no começo do dia). Dias sem capital têm retorno zero.
+    """
+    previous = values.shift(1).fillna(0).to_numpy()
+    flows = cash_flows.to_numpy()
+    base = previous + flows
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = np.where(base != 0, (values.to_numpy() - base) / base, 0.0)
+    return pd.DataFrame(returns, index=values.index, columns=values.columns)
+
+
+
+def get_time_weighted_returns(values, cash_flows, start=None, end=None, freq=None):
+    """
+    Calcula os retornos ponderados pelo tempo (TWR, não anualizados) de todas as colunas e de todos os sub-períodos de uma vez.
+
+    Parameters
+    ----------
+    values : DataFrame
+        Os valores (Close) de cada coluna. (ver 'get_flows_tables')
+    cash_flows : DataFrame
+        Os fluxos de caixa (Cash Flow) de cada coluna, alinhados com os valores.
+    start : datetime
+        A primeira data do intervalo. (default é None, a primeira data)
+    end : datetime
+        A última data do intervalo. (default é None, a última data)
+    freq : str
+        A frequência dos sub-períodos (ex: 'M', 'Q', 'Y'). (default é None, o intervalo inteiro)
+
+    Returns
+    -------
+    DataFrame
+        A TWR de cada sub-período (linhas) e coluna. Sem 'freq', uma única linha com a última data do intervalo.
+    """
+    mask, labels = get_periods(values.index, start, end, freq)
+    returns = get_daily_returns(values, cash_flows)[mask]
+    if len(returns) == 0:
+        return pd.DataFrame(columns=values.columns, dtype=float)
+    return (1 + returns).groupby(labels, sort=False).prod() - 1
+
+
+
+def get_money_weighted_returns(values, cash_flows, start=None, end=None, freq=None):
+    """
+    Calcula as taxas internas de retorno anuais (XIRR) de todas as colunas e de todos os sub-períodos de uma vez, em uma única chamada do solver.
+    Os fluxos de cada período são: o valor no começo do período mais o aporte do primeiro dia (saída), os aportes dos dias seguintes (saídas) e o valor no último dia (entrada).
+
+    Parameters
+    ----------
+    values : DataFrame
+        Os valores (Close) de cada coluna. (ver 'get_flows_tables')
+    cash_flows : DataFrame
+        Os fluxos de caixa (Cash Flow) de cada coluna, alinhados com os valores.
+    start : datetime
+        A primeira data do intervalo. (default é None, a primeira data)
+    end : datetime
+        A última data do intervalo. (default é None, a última data)
+    freq : str
+        A frequência dos sub-períodos (ex: 'M', 'Q', 'Y'). (default é None, o intervalo inteiro)
+
+    Returns
+    -------
+    DataFrame
+        A IRR anual de cada sub-período (linhas) e coluna. Sem 'freq', uma única linha com a última data do intervalo.
+        Períodos sem capital ou sem troca de sinal nos fluxos são NaN.
+    """
+    mask, labels = get_periods(values.index, start, end, freq)
+    if not mask.any():
+        return pd.DataFrame(columns=values.columns, dtype=float)
+    all_values = values.to_numpy(dtype=float)
+    all_flows = cash_flows.to_numpy(dtype=float)
+    positions = np.flatnonzero(mask)
+    periods = pd.unique(labels)
+    n_columns = all_values.shape[1]
+
+    #monta as séries de fluxos de cada (período, coluna), completando com zeros até o maior período
+    bounds = [positions[labels == period] for period in periods]
+    width = max(len(rows) for rows in bounds)
+    amounts = np.zeros((len(periods), n_columns, width))
+    times = np.zeros((len(periods), n_columns, width))
+    for p, rows in enumerate(bounds):
+        begin_value = all_values[rows[0] - 1] if rows[0] > 0 else np.zeros(n_columns)
+        period_amounts = -all_flows[rows].T.copy()
+        period_amounts[:, 0] -= begin_value
+        period_amounts[:, -1] += all_values[rows[-1]]
+        amounts[p, :, :len(rows)] = period_amounts
+        days = (values.index[rows] - values.index[rows[0]]).days.to_numpy()
+        times[p, :, :len(rows)] = days / DAYS_PER_YEAR
+
+    rates = solve_irr(amounts.reshape(-1, width), times.reshape(-1, width))
+    return pd.DataFrame(rates.reshape(len(periods), n_columns), index=periods, columns=values.columns)
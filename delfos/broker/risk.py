@@ -0,0 +1,227 @@
+"""
+Métricas de risco do portfolio, calculadas em uma única passada vetorizada (numpy) sobre os retornos diários do portfolio ('Portfolio.get_daily_returns').
+
+Métricas (retornos diários das posições alinhadas, que descontam o fluxo de caixa, anualizadas por SESSION_FREQ_PER_YEAR pregões):
+    - annual_return: retorno geométrico anualizado
+    - annual_volatility: volatilidade anualizada
+    - sharpe: média do excesso sobre a taxa livre de risco dividida pela volatilidade, anualizada
+    - sortino: média do excesso dividida pelo desvio negativo (downside deviation) do excesso, anualizada
+    - max_drawdown: maior queda do retorno acumulado a partir de um pico (negativa)
+    - var / cvar: Value at Risk e Conditional VaR históricos de um dia, no nível de confiança (perdas positivas)
+    - beta: beta dos retornos em relação ao índice de mercado do pregão
+    - risk_free_return / excess_return: retorno acumulado da taxa livre de risco (SELIC) nas datas do histórico e o retorno acumulado do portfolio acima dela
+
+As janelas móveis usam somas acumuladas (cumsum) das séries e dos seus produtos, então cada janela custa O(1) e a série inteira O(n), sem reconstruir as janelas.
+"""
+from delfos.common.configs import Configs
+import pandas as pd
+import numpy as np
+
+
+CONFIGS = Configs()
+
+SESSION_FREQ_PER_YEAR = CONFIGS.DEFAULTS["SESSION_FREQ_PER_YEAR"] #número de dias no ano em que o mercado funciona
+
+
+
+def get_risk_series(portfolio):
+    """
+    Extrai do portfolio as séries diárias alinhadas usadas nas métricas de risco: retornos do portfolio, do índice de mercado e da taxa livre de risco.
+    Os retornos do portfolio vêm das tabelas alinhadas das posições (ver 'Portfolio.get_daily_returns'), e não da soma do histórico. Só entram as datas com retorno válido (finito).
+
+    Parameters
+    ----------
+    portfolio : Portfolio
+        O portfolio.
+
+    Returns
+    -------
+    DataFrame
+        As séries (colunas 'Return', 'Market Return' e 'Risk Free Return'), com as datas dos retornos do portfolio no index.
+        'Market Return' é NaN onde o índice de mercado não tiver preço.
+    """
+    if len(portfolio.positions) == 0:
+        return pd.DataFrame(columns=["Return", "Market Return", "Risk Free Return"], dtype=float)
+    returns = portfolio.get_daily_returns()["Portfolio"].astype(float).replace([np.inf, -np.inf], np.nan).dropna()
+    session = portfolio.session
+
+    market_returns = pd.Series(np.nan, index=returns.index)
+    if session.market_index is not None and not session.market_index.history.empty:
+        market_returns = session.market_index.history["Close"].astype(float).pct_change().reindex(returns.index)
+
+    #taxa livre de risco diária: a série da SELIC (taxa diária) nas datas do histórico, ou a taxa anual do pregão convertida para um dia
+    daily_rate = (1 + float(session.risk_free_rate)) ** (1 / SESSION_FREQ_PER_YEAR) - 1
+    risk_free_series = session.risk_free_rate_series
+    if isinstance(risk_free_series, pd.DataFrame) and not risk_free_series.empty:
+        risk_free_returns = risk_free_series["valor"].astype(float).reindex(returns.index, method="ffill").fillna(daily_rate)
+    else:
+        risk_free_returns = pd.Series(daily_rate, index=returns.index)
+
+    return pd.DataFrame({"Return": returns, "Market Return": market_returns, "Risk Free Return": risk_free_returns})
+
+
+
+def get_risk_metrics(returns, market_returns=None, risk_free_returns=None, confidence=0.95):
+    """
+    Calcula todas as métricas de risco em uma única passada sobre as séries diárias.
+
+    Parameters
+    ----------
+    returns : array, Series ou list
+        Os retornos diários do portfolio.
+    market_returns : array, Series ou list
+        Os retornos diários do índice de mercado, alinhados com os retornos (NaNs são ignorados no beta). (default é None, sem beta)
+    risk_free_returns : array, Series, list ou float
+        A taxa livre de risco diária, alinhada com os retornos, ou uma taxa constante. (default é None, taxa zero)
+    confidence : float
+        O nível de confiança do VaR e do CVaR. (default é 0.95)
+
+    Raises
+    ------
+    ValueError
+        Se o nível de confiança não estiver entre 0 e 1 ou se as séries não tiverem o mesmo tamanho.
+
+    Returns
+    -------
+    dict
+        As métricas: observations, annual_return, annual_volatility, sharpe, sortino, max_drawdown, var, cvar, beta, risk_free_return e excess_return.
+        Métricas sem dados suficientes são NaN.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("Argument 'confidence' must be a float between 0 and 1.")
+    returns = np.asarray(returns, dtype=float)
+    n = len(returns)
+    risk_free = np.broadcast_to(np.asarray(risk_free_returns if risk_free_returns is not None else 0.0, dtype=float), returns.shape)
+    metrics = {
+        "observations": n, "annual_return": np.nan, "annual_volatility": np.nan, "sharpe": np.nan, "sortino": np.nan, "max_drawdown": np.nan,
+        "var": np.nan, "cvar": np.nan, "beta": np.nan, "risk_free_return": np.nan, "excess_return": np.nan
+    }
+    if market_returns is not None and len(market_returns) != n:
+        raise ValueError("Arguments 'returns' and 'market_returns' must have the same length.")
+    if n == 0:
+        return metrics
+
+    excess = returns - risk_free
+    wealth = np.cumprod(1 + returns) #retorno acumulado (1 + r)
+    total_return = wealth[-1] - 1
+    risk_free_return = np.prod(1 + risk_free) - 1
+    metrics["annual_return"] = float((1 + total_return) ** (SESSION_FREQ_PER_YEAR / n) - 1) if total_return > -1 else -1.0
+    metrics["max_drawdown"] = float(min(np.min(wealth / np.maximum.accumulate(np.maximum(wealth, 1)) - 1), 0)) #o pico inicial é o valor investido (1)
+    metrics["risk_free_return"] = float(risk_free_return)
+    metrics["excess_return"] = float(total_return - risk_free_return)
+
+    sorted_returns = np.sort(returns)
+    cut = max(int(np.floor(n * (1 - confidence))), 1) #número de pregões na cauda de perdas
+    metrics["var"] = float(-np.quantile(sorted_returns, 1 - confidence))
+    metrics["cvar"] = float(-np.mean(sorted_returns[:cut]))
+
+    if n > 1:
+        volatility = np.std(returns, ddof=1)
+        excess_deviation = np.std(excess, ddof=1)
+        downside_deviation = np.sqrt(np.mean(np.minimum(excess, 0) ** 2))
+        metrics["annual_volatility"] = float(volatility * np.sqrt(SESSION_FREQ_PER_YEAR))
+        metrics["sharpe"] = float(np.mean(excess) / excess_deviation * np.sqrt(SESSION_FREQ_PER_YEAR)) if excess_deviation > 0 else np.nan
+        metrics["sortino"] = float(np.mean(excess) / downside_deviation * np.sqrt(SESSION_FREQ_PER_YEAR)) if downside_deviation > 0 else np.nan
+
+    if market_returns is not None:
+        market_returns = np.asarray(market_returns, dtype=float)
+        valid = ~np.isnan(market_returns)
+        if np.sum(valid) > 1:
+            market_variance = np.var(market_returns[valid], ddof=1)
+            if market_variance > 0:
+                metrics["beta"] = float(np.cov(returns[valid], market_returns[valid], ddof=1)[0, 1] / market_variance)
+    return metrics
+
+
+
+def get_window_sums(values, window):
+    """
+    Soma de cada janela móvel de 'window' observações (terminando em cada posição), por diferença de somas acumuladas. As primeiras 'window - 1' posições são NaN.
+    Em tabelas (2D), as janelas correm nas linhas, para todas as colunas de uma vez.
+    """
+    values = np.asarray(values, dtype=float)
+    cumsum = np.concatenate((np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)))
+    sums = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        sums[window - 1:] = cumsum[window:] - cumsum[:-window]
+    return sums
+
+
+
+def get_rolling_risk_metrics(returns, window, market_returns=None, risk_free_returns=None):
+    """
+    Calcula as métricas de risco em janelas móveis, em O(n): cada métrica vem de somas das janelas obtidas por diferença de somas acumuladas.
+
+    OBS: O drawdown é o do histórico inteiro (a partir do pico anterior), que já é O(n); VaR e CVaR dependem de quantis e não têm versão móvel.
+
+    Parameters
+    ----------
+    returns : array, Series ou list
+        Os retornos diários do portfolio. Se for uma Series, o seu index é o index do resultado.
+    window : int
+        O número de pregões de cada janela.
+    market_returns : array, Series ou list
+        Os retornos diários do índice de mercado, alinhados com os retornos. (default é None, sem beta)
+    risk_free_returns : array, Series, list ou float
+        A taxa livre de risco diária, alinhada com os retornos, ou uma taxa constante. (default é None, taxa zero)
+
+    Raises
+    ------
+    TypeError
+        Se a janela não for um inteiro.
+    ValueError
+        Se a janela for menor que 2.
+
+    Returns
+    -------
+    DataFrame
+        As métricas de cada data (colunas 'Annual Return', 'Annual Volatility', 'Sharpe', 'Sortino', 'Beta', 'Excess Return' e 'Drawdown').
+        As primeiras 'window - 1' datas são NaN, exceto o drawdown.
+    """
+    if not isinstance(window, int):
+        raise TypeError("Argument 'window' must be an integer.")
+    if window < 2:
+        raise ValueError("Argument 'window' must be greater than 1.")
+    index = returns.index if isinstance(returns, pd.Series) else None
+    returns = np.asarray(returns, dtype=float)
+    risk_free = np.broadcast_to(np.asarray(risk_free_returns if risk_free_returns is not None else 0.0, dtype=float), returns.shape)
+    excess = returns - risk_free
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        #média e variância amostral pelas somas de x e x² da janela
+        mean = get_window_sums(returns, window) / window
+        variance = np.maximum((get_window_sums(returns ** 2, window) - window * mean ** 2) / (window - 1), 0) #o máximo corta erros de arredondamento negativos
+        excess_mean = get_window_sums(excess, window) / window
+        excess_variance = np.maximum((get_window_sums(excess ** 2, window) - window * excess_mean ** 2) / (window - 1), 0)
+        downside_deviation = np.sqrt(get_window_sums(np.minimum(excess, 0) ** 2, window) / window)
+
+        #retorno geométrico pela soma dos retornos log (retornos de -100% zeram a janela)
+        log_returns = np.log(np.maximum(1 + returns, 1e-300))
+        annual_return = np.exp(get_window_sums(log_returns, window) * SESSION_FREQ_PER_YEAR / window) - 1
+        excess_return = np.exp(get_window_sums(log_returns, window)) - np.exp(get_window_sums(np.log1p(risk_free), window))
+
+        beta = np.full(len(returns), np.nan)
+        if market_returns is not None:
+            market_returns = np.asarray(market_returns, dtype=float)
+            valid = ~np.isnan(market_returns)
+            x = np.where(valid, market_returns, 0)
+            y = np.where(valid, returns, 0)
+            count = get_window_sums(valid.astype(float), window)
+            sum_x, sum_y = get_window_sums(x, window), get_window_sums(y, window)
+            covariance = get_window_sums(x * y, window) - sum_x * sum_y / count
+            market_variance = get_window_sums(x ** 2, window) - sum_x ** 2 / count
+            beta = np.where((count > 1) & (market_variance > 0), covariance / market_variance, np.nan)
+
+        volatility = np.sqrt(variance)
+        excess_deviation = np.sqrt(excess_variance)
+        wealth = np.cumprod(1 + returns)
+        rolling = {
+            "Annual Return": annual_return,
+            "Annual Volatility": volatility * np.sqrt(SESSION_FREQ_PER_YEAR),
+            "Sharpe": np.where(excess_deviation > 0, excess_mean / excess_deviation, np.nan) * np.sqrt(SESSION_FREQ_PER_YEAR),
+            "Sortino": np.where(downside_deviation > 0, excess_mean / downside_deviation, np.nan) * np.sqrt(SESSION_FREQ_PER_YEAR),
+            "Beta": beta,
+            "Excess Return": excess_return,
+            "Drawdown": np.minimum(wealth / np.maximum.accumulate(np.maximum(wealth, 1)) - 1, 0)
+        }
+    return pd.DataFrame(rolling, index=index)
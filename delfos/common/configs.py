@@ -1,17 +1,37 @@
 from pathlib import Path
+import threading
 import json
 import os
 
 
+PACKAGE_PATH = Path(__file__).resolve().parent.parent #pasta do package delfos (os caminhos não dependem mais da pasta em que o script é rodado)
+DATA_PATH = Path(os.environ.get("DELFOS_DATA_PATH", PACKAGE_PATH / "data")) #pasta com os dados do package (pode ser trocada pela variável de ambiente)
+
+
 
 class Configs():
+    """
+    Classe com as configurações do package. Os arquivos de dados (tickers.json e cash.json) só são lidos no primeiro acesso e uma única vez por processo.
+
+    Variáveis de ambiente:
+        - DELFOS_DATA_PATH: pasta com os dados do package (default é a pasta 'data' do package)
+        - DELFOS_TICKERS_PATH: arquivo com as infos dos tickers (default é '<DELFOS_DATA_PATH>/market/tickers.json')
+        - DELFOS_CASH_PATH: arquivo com o patrimônio líquido ao longo do tempo (default é '<DELFOS_DATA_PATH>/broker/cash.json')
+        - DELFOS_MOVEMENTS_PATH: pasta com os arquivos de movimentação da B3 (default é '<DELFOS_DATA_PATH>/broker/movements/')
+        - DELFOS_TELEMETRY_PATH: arquivo json em que a telemetria de rede é gravada no fim do processo (default é não gravar, ver 'delfos.common.telemetry')
+    """
+
+    __loaded_files = {} #cache dos arquivos json já lidos {caminho: conteúdo}, compartilhado por todas as instâncias
+    __lock = threading.Lock()
 
-    with open(Path("./delfos/data/market/tickers.json"), "r", encoding="utf8") as tickers_file:
-        TICKERS_DICT = json.load(tickers_file) #dicionário com todas as informações fixas das ações listadas na B3
 
+    @property
+    def TICKERS_DICT(self):
+        return self.__load_json(self.PATHS["tickers"]) #dicionário com todas as informações fixas das ações listadas na B3
 
-    with open(Path("./delfos/data/broker/cash.json"), "r+", encoding="utf8") as cash_file:
-        CASH = json.load(cash_file) #lista de dicionários com o patrimonio liquido ao longo do tempo
+    @property
+    def CASH(self):
+        return self.__load_json(self.PATHS["cash"]) #lista de dicionários com o patrimonio liquido ao longo do tempo
 
 
     REQUESTS_HEADER = {
@@ -20,7 +40,38 @@ class Configs():
 
     DEFAULTS = {
         "SESSION_FREQ_PER_YEAR": 248,
-        "N_THREADS": 12
+        "N_THREADS": 12,
+        "ALLOCATION_PRICE_THRESHOLD": 0.01, #movimento agregado dos preços (1%) que dispara o refresh intradiário do modelo de alocação
+        "ALLOCATION_DRIFT_THRESHOLD": 0.005, #drift dos pesos por market cap (0,5%) que dispara o refresh intradiário do modelo de alocação
+        "ALLOCATION_MIN_INTERVAL": 300, #intervalo mínimo em segundos entre dois refresh intradiários do modelo de alocação
+        "ALLOCATION_CHECK_INTERVAL": 5, #intervalo em segundos entre as checagens do scheduler do modelo de alocação
+        "EVENTS_BATCH_INTERVAL": 0.25, #intervalo em segundos entre os despachos dos lotes de eventos ao vivo (preços e barras)
+        "REQUESTS_TIMEOUT": 10, #timeout em segundos das requisições HTTP aos upstreams (Yahoo Finance, Fundamentus e BACEN)
+        "AVG_VOLUME_WINDOW": 21, #número de pregões da média de volume usada na seleção das ações
+        "SCREENING": { #triagem do universo de ações antes do download dos dados fundamentalistas (com estes valores, nenhuma ação é excluída)
+            "window": 21, #número de pregões da janela de liquidez e atividade
+            "min_avg_volume": 0, #volume médio mínimo na janela
+            "min_avg_traded_value": 0, #volume financeiro médio mínimo na janela (R$)
+            "min_active_ratio": 0, #fração mínima de pregões da janela com negócios
+            "max_inactive_days": None, #número máximo de dias corridos sem negócios até a data de análise
+            "min_listing_days": 0 #número mínimo de dias corridos desde a primeira data do histórico
+        },
+        "SIGNALS": { #sinais do oracle, que geram as views do modelo de alocação (ver 'delfos.oracle')
+            "momentum_lookback": 252, #número de pregões da janela do momentum
+            "momentum_skip": 21, #número de pregões mais recentes ignorados pelo momentum (evita a reversão de curto prazo)
+            "reversion_lookback": 21, #número de pregões da janela da reversão à média
+            "volatility_lookback": 63, #número de pregões da janela da volatilidade
+            "weights": {"momentum": 1.0, "mean_reversion": 1.0, "volatility_scaled_momentum": 1.0}, #pesos dos fatores no sinal composto
+            "information_coefficient": 0.05, #correlação esperada entre o sinal composto e os retornos futuros (escala das views)
+            "max_confidence": 0.5, #confiança máxima de uma view (método de Idzorek, entre 0 e 1)
+            "max_zscore": 3.0 #limite dos z-scores dos fatores (winsorização)
+        },
+        "REBALANCE": { #rebalanceamento das posições para os pesos de compra (ver 'delfos.broker.rebalance')
+            "fractional": True, #se as sobras de lote são negociadas no mercado fracionário (se não, só lotes padrão)
+            "min_trade_value": 0, #valor mínimo de cada ordem (R$)
+            "max_turnover": None, #giro máximo (soma das ordens sobre o valor líquido do portfolio); None é sem limite
+            "cash_reserve": 0 #fração do valor líquido mantida em dinheiro
+        }
     }
 
     URLS = {
@@ -34,10 +85,36 @@ class Configs():
         "BACEN_SELIC_CODE": "432",
         "BACEN_SELIC_CUM_CODE": "11",
         "MARKET_OPEN_HOUR": 10,
-        "MARKET_CLOSE_HOUR": 19
+        "MARKET_CLOSE_HOUR": 19,
+        "B3_ROUND_LOT": 100 #lote padrão da B3 (quantidades menores são negociadas no mercado fracionário, ticker com sufixo 'F')
     }
 
     PATHS = {
-        "movements_folder": Path("./delfos/data/broker/movements/"),
-        "cash": Path("./delfos/data/broker/cash.json")
+        "tickers": Path(os.environ.get("DELFOS_TICKERS_PATH", DATA_PATH / "market" / "tickers.json")),
+        "movements_folder": Path(os.environ.get("DELFOS_MOVEMENTS_PATH", DATA_PATH / "broker" / "movements")),
+        "cash": Path(os.environ.get("DELFOS_CASH_PATH", DATA_PATH / "broker" / "cash.json"))
     }
+
+
+    def __load_json(self, path):
+        """
+        Lê um arquivo json, apenas no primeiro acesso. Os acessos seguintes retornam o conteúdo já lido.
+
+        Parameters
+        ----------
+        path : Path
+            O caminho para o arquivo json.
+
+        Returns
+        -------
+        dict ou list
+            O conteúdo do arquivo.
+        """
+        try:
+            return Configs.__loaded_files[path]
+        except KeyError:
+            with Configs.__lock:
+                if path not in Configs.__loaded_files:
+                    with open(path, "r", encoding="utf8") as json_file:
+                        Configs.__loaded_files[path] = json.load(json_file)
+            return Configs.__loaded_files[path]
@@ -0,0 +1,323 @@
+from delfos.common.configs import Configs
+import threading
+import asyncio
+import weakref
+
+
+CONFIGS = Configs()
+
+EVENTS_BATCH_INTERVAL = CONFIGS.DEFAULTS["EVENTS_BATCH_INTERVAL"] #intervalo em segundos entre os despachos dos lotes de eventos ao vivo
+
+
+
+class EventHub():
+    """
+    Classe que representa um ponto de inscrição em eventos (ex: novos preços de uma ação, refresh da alocação de um pregão).
+    Os eventos são sempre publicados em lotes (lista de payloads). Os inscritos podem ser callbacks síncronos ou streams do asyncio.
+    """
+
+    def __init__(self, events):
+        """
+        Parameters
+        ----------
+        events : tuple
+            Os nomes dos eventos aceitos pelo hub.
+        """
+        self.__events = tuple(events)
+        self.__subscribers = {event: [] for event in self.__events} #dicionário {evento: [callbacks]}
+        self.__lock = threading.Lock()
+
+
+
+    def __getstate__(self):
+        #as inscrições só existem em tempo de execução, portanto não são serializadas
+        return {"events": self.__events}
+
+
+
+    def __setstate__(self, state):
+        self.__init__(state["events"])
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def events(self):
+        return self.__events #nomes dos eventos aceitos pelo hub
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def __check_event(self, event):
+        """
+        Checa se o evento é aceito pelo hub.
+
+        Raises
+        ------
+        ValueError
+            Se o evento não for aceito pelo hub.
+        """
+        if event not in self.__subscribers:
+            raise ValueError("Argument 'event' must be one of: {}.".format(", ".join(self.__events)))
+
+
+
+    def subscribe(self, event, callback, weak=False):
+        """
+        Inscreve um callback em um evento. O callback é chamado com a lista de payloads de cada lote publicado.
+
+        Parameters
+        ----------
+        event : str
+            O nome do evento.
+        callback : function
+            A função chamada a cada lote do evento, no formato callback(batch).
+        weak : bool
+            Se verdadeiro, guarda apenas uma referência fraca para o callback (que deve ser um método), que é removido quando o objeto deixar de existir. (default é False)
+
+        Raises
+        ------
+        TypeError
+            Se o callback não for uma função.
+        ValueError
+            Se o evento não for aceito pelo hub.
+
+        Returns
+        -------
+        function
+            O callback inscrito, que deve ser usado para cancelar a inscrição.
+        """
+        if not callable(callback):
+            raise TypeError("Argument 'callback' must be callable.")
+        self.__check_event(event)
+
+        reference = weakref.WeakMethod(callback) if weak else callback
+        with self.__lock:
+            self.__subscribers[event] = self.__subscribers[event] + [(callback if not weak else None, reference)] #copy on write (publicações não precisam do lock)
+        return callback
+
+
+
+    def unsubscribe(self, event, callback):
+        """
+        Cancela a inscrição de um callback em um evento. Se o callback não estiver inscrito, não faz nada.
+
+        Parameters
+        ----------
+        event : str
+            O nome do evento.
+        callback : function
+            O callback inscrito.
+        """
+        self.__check_event(event)
+        with self.__lock:
+            self.__subscribers[event] = [(strong, reference) for strong, reference in self.__subscribers[event] if self.__resolve(strong, reference) not in (callback, None)]
+
+
+
+    def __resolve(self, strong, reference):
+        """
+        Retorna o callback de uma inscrição (None se a referência fraca tiver morrido).
+        """
+        if strong is not None:
+            return strong
+        return reference()
+
+
+
+    def has_subscribers(self, event):
+        """
+        Checa se o evento tem algum inscrito. Usado para não montar payloads que ninguém vai receber.
+
+        Returns
+        -------
+        bool
+            Verdadeiro se o evento tem pelo menos um inscrito.
+        """
+        return len(self.__subscribers.get(event, ())) > 0
+
+
+
+    def get_subscribers_num(self, event):
+        """
+        Retorna o número de inscritos no evento (referências fracas já coletadas ainda contam, até a próxima publicação).
+        """
+        return len(self.__subscribers.get(event, ()))
+
+
+
+    def publish(self, event, batch):
+        """
+        Publica um lote de payloads de um evento, chamando todos os inscritos de forma síncrona (na thread que chamou o método).
+        Erros nos callbacks não interrompem a publicação para os demais inscritos.
+
+        Parameters
+        ----------
+        event : str
+            O nome do evento.
+        batch : list
+            A lista de payloads do lote.
+        """
+        dead = False
+        for strong, reference in self.__subscribers.get(event, ()):
+            callback = self.__resolve(strong, reference)
+            if callback is None:
+                dead = True
+                continue
+            try:
+                callback(batch)
+            except Exception as e:
+                print("error from event callback {}: {}".format(callback, e))
+
+        #remove as inscrições com referências fracas que morreram
+        if dead:
+            with self.__lock:
+                self.__subscribers[event] = [(strong, reference) for strong, reference in self.__subscribers[event] if self.__resolve(strong, reference) is not None]
+
+
+
+    async def stream(self, event, maxsize=0):
+        """
+        Stream assíncrono (asyncio) dos lotes de um evento. Deve ser usado com 'async for'.
+        A inscrição é cancelada quando o stream é encerrado.
+
+        Parameters
+        ----------
+        event : str
+            O nome do evento.
+        maxsize : int
+            O número máximo de lotes na fila do stream (lotes excedentes são descartados). (default é 0, sem limite)
+
+        Yields
+        ------
+        list
+            A lista de payloads de cada lote.
+        """
+        self.__check_event(event)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize)
+
+        def put(batch):
+            if not queue.full():
+                queue.put_nowait(batch)
+
+        def callback(batch):
+            loop.call_soon_threadsafe(put, batch) #os lotes são publicados fora do event loop
+
+        self.subscribe(event, callback)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.unsubscribe(event, callback)
+
+
+
+class EventBatcher():
+    """
+    Classe que agrupa eventos ao vivo em lotes. Cada evento empurrado tem uma chave (ex: o ticker); dentro de um mesmo lote, só o último payload de cada chave é mantido.
+    Em uma thread separada, os lotes pendentes são publicados nos seus hubs a cada intervalo. Se nada mudou, nada é publicado.
+    A thread é criada no primeiro evento e pode ser parada com 'stop' (e esperada com 'join'); o próximo evento empurrado cria uma nova thread.
+    """
+
+    def __init__(self, interval=EVENTS_BATCH_INTERVAL):
+        """
+        Parameters
+        ----------
+        interval : int ou float
+            O intervalo em segundos entre os despachos dos lotes. (default é 0,25 segundos)
+        """
+        self.__interval = interval
+        self.__pending = {} #dicionário {(id do hub, evento): (hub, {chave: payload})}
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__stop_event = threading.Event() #sinaliza o fim da thread de despacho
+
+
+
+    def push(self, hub, event, key, payload):
+        """
+        Empurra um evento para o próximo lote do hub. Se o hub não tiver inscritos no evento, o evento é descartado.
+
+        Parameters
+        ----------
+        hub : EventHub
+            O hub em que o evento deve ser publicado.
+        event : str
+            O nome do evento.
+        key : str
+            A chave do evento (só o último payload de cada chave é mantido no lote).
+        payload : dict
+            O payload do evento.
+        """
+        if not hub.has_subscribers(event):
+            return
+        with self.__lock:
+            pending = self.__pending.get((id(hub), event))
+            if pending is None:
+                pending = (hub, {})
+                self.__pending[(id(hub), event)] = pending
+            pending[1][key] = payload
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__stop_event = threading.Event()
+                self.__thread = threading.Thread(target=self.__run, args=(self.__stop_event,), daemon=True) #a thread de despacho só é criada no primeiro evento (ou depois de parada)
+                self.__thread.start()
+
+
+
+    def flush(self):
+        """
+        Publica imediatamente todos os lotes pendentes.
+        """
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = {}
+        for (hub_id, event), (hub, payloads) in pending.items():
+            hub.publish(event, list(payloads.values()))
+
+
+
+    def stop(self):
+        """
+        Para a thread de despacho. Os lotes pendentes são publicados antes de a thread terminar.
+        """
+        with self.__lock:
+            self.__stop_event.set()
+
+
+
+    def join(self, timeout=None):
+        """
+        Espera a thread de despacho terminar (ver 'stop').
+
+        Parameters
+        ----------
+        timeout : int ou float
+            O tempo máximo de espera em segundos. (default é None, sem limite)
+
+        Returns
+        -------
+        bool
+            Verdadeiro se a thread terminou (ou se não havia thread).
+        """
+        thread = self.__thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+
+
+    def __run(self, stop_event):
+        """
+        Loop da thread de despacho dos lotes, até o evento de parada.
+        """
+        while not stop_event.wait(self.__interval):
+            self.flush()
+        self.flush()
+
+
+
+BATCHER = EventBatcher() #agrupador usado pelo caminho ao vivo dos preços
@@ -0,0 +1,269 @@
+from contextlib import nullcontext
+from pathlib import Path
+import threading
+import json
+import time
+
+
+
+class Timer():
+    """
+    Context manager que mede o tempo de um bloco e o registra em um objeto Metrics. (ver 'Metrics.timer')
+    """
+
+    __slots__ = ("__metrics", "__stage", "__ticker", "__start")
+
+    def __init__(self, metrics, stage, ticker=None):
+        self.__metrics = metrics
+        self.__stage = stage
+        self.__ticker = ticker
+
+
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__metrics.add_time(self.__stage, time.perf_counter() - self.__start, self.__ticker)
+        return False
+
+
+
+class Metrics():
+    """
+    Classe que guarda métricas de execução: tempos por etapa (agregados e por ticker) e contadores (ex: fallbacks para o scraper, retentativas, tickers inválidos).
+    É thread safe, então pode ser compartilhada pelas threads que montam as ações de um pregão.
+
+    Ex:
+        with metrics.timer("history.download", ticker):
+            ...
+        metrics.increment("fundamentals.retries", ticker=ticker)
+    """
+
+    def __init__(self, path=None):
+        """
+        Parameters
+        ----------
+        path : str ou Path
+            Arquivo json em que as métricas são gravadas a cada 'flush'. (default é None, as métricas só ficam em memória)
+        """
+        self.__path = Path(path) if path is not None else None
+        self.__lock = threading.Lock()
+        self.reset()
+
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_Metrics__lock") #locks não são serializáveis
+        return state
+
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def enabled(self):
+        return True #se as métricas estão sendo registradas
+
+    @property
+    def path(self):
+        return self.__path #arquivo json das métricas
+
+    @property
+    def summary(self):
+        return self.get_summary() #resumo das métricas
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def reset(self):
+        """
+        Apaga todas as métricas registradas.
+        """
+        with self.__lock:
+            self.__stages = {} #dicionário {etapa: [número de medições, tempo total, tempo máximo]}
+            self.__counters = {} #dicionário {contador: valor}
+            self.__tickers = {} #dicionário {ticker: {etapa ou contador: valor}}
+
+
+
+    def timer(self, stage, ticker=None):
+        """
+        Cria um context manager que mede o tempo do bloco e o registra na etapa (e no ticker, se passado).
+
+        Parameters
+        ----------
+        stage : str
+            O nome da etapa.
+        ticker : str
+            O ticker da medição. (default é None, só o agregado da etapa)
+
+        Returns
+        -------
+        Timer
+            O context manager.
+        """
+        return Timer(self, stage, ticker)
+
+
+
+    def add_time(self, stage, seconds, ticker=None):
+        """
+        Registra uma medição de tempo em uma etapa.
+
+        Parameters
+        ----------
+        stage : str
+            O nome da etapa.
+        seconds : float
+            O tempo em segundos.
+        ticker : str
+            O ticker da medição. (default é None, só o agregado da etapa)
+        """
+        with self.__lock:
+            aggregated = self.__stages.get(stage)
+            if aggregated is None:
+                self.__stages[stage] = [1, seconds, seconds]
+            else:
+                aggregated[0] += 1
+                aggregated[1] += seconds
+                aggregated[2] = max(aggregated[2], seconds)
+            if ticker is not None:
+                ticker_metrics = self.__tickers.setdefault(ticker, {})
+                ticker_metrics[stage] = ticker_metrics.get(stage, 0) + seconds
+
+
+
+    def increment(self, counter, value=1, ticker=None):
+        """
+        Incrementa um contador.
+
+        Parameters
+        ----------
+        counter : str
+            O nome do contador.
+        value : int ou float
+            O incremento. (default é 1)
+        ticker : str
+            O ticker do incremento. (default é None, só o agregado do contador)
+        """
+        with self.__lock:
+            self.__counters[counter] = self.__counters.get(counter, 0) + value
+            if ticker is not None:
+                ticker_metrics = self.__tickers.setdefault(ticker, {})
+                ticker_metrics[counter] = ticker_metrics.get(counter, 0) + value
+
+
+
+    def get_summary(self):
+        """
+        Cria um resumo estruturado das métricas registradas.
+
+        Returns
+        -------
+        dict
+            Dicionário com:
+                - stages: {etapa: {'count', 'total_s', 'mean_s', 'max_s'}}
+                - counters: {contador: valor}
+                - tickers: {ticker: {etapa (segundos) ou contador: valor}}
+        """
+        with self.__lock:
+            return {
+                "stages": {stage: {"count": count, "total_s": total, "mean_s": total / count, "max_s": maximum} for stage, (count, total, maximum) in self.__stages.items()},
+                "counters": dict(self.__counters),
+                "tickers": {ticker: dict(ticker_metrics) for ticker, ticker_metrics in self.__tickers.items()}
+            }
+
+
+
+    def dump(self, path):
+        """
+        Grava o resumo das métricas em um arquivo json.
+
+        Parameters
+        ----------
+        path : str ou Path
+            O caminho do arquivo.
+        """
+        with open(path, "w", encoding="utf8") as metrics_file:
+            json.dump(self.get_summary(), metrics_file, indent=4)
+
+
+
+    def flush(self):
+        """
+        Grava as métricas no arquivo passado na criação do objeto. Se nenhum arquivo foi passado, não faz nada.
+        """
+        if self.__path is not None:
+            self.dump(self.__path)
+
+
+
+class NullMetrics(Metrics):
+    """
+    Métricas desligadas: todos os métodos de registro são no-ops (custo de uma chamada de método), usadas quando as métricas não foram pedidas.
+    """
+
+    __null_timer = nullcontext()
+
+    @property
+    def enabled(self):
+        return False
+
+    def timer(self, stage, ticker=None):
+        return NullMetrics.__null_timer
+
+    def add_time(self, stage, seconds, ticker=None):
+        pass
+
+    def increment(self, counter, value=1, ticker=None):
+        pass
+
+    def flush(self):
+        pass
+
+
+
+NULL_METRICS = NullMetrics() #métricas desligadas, compartilhadas
+
+
+
+def get_metrics(metrics):
+    """
+    Resolve o parâmetro 'metrics' aceito pelas classes do package.
+
+    Parameters
+    ----------
+    metrics : Metrics, bool, str, Path ou None
+        Um objeto Metrics (usado como está), True (novas métricas em memória), um caminho (novas métricas gravadas no arquivo) ou None/False (métricas desligadas).
+
+    Raises
+    ------
+    TypeError
+        Se o parâmetro não for de um dos tipos aceitos.
+
+    Returns
+    -------
+    Metrics
+        As métricas.
+    """
+    if metrics is None or metrics is False:
+        return NULL_METRICS
+    if metrics is True:
+        return Metrics()
+    if isinstance(metrics, Metrics):
+        return metrics
+    if isinstance(metrics, (str, Path)):
+        return Metrics(metrics)
+    raise TypeError("Argument 'metrics' must be a Metrics object, a boolean or a path.")
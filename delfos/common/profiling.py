@@ -0,0 +1,279 @@
+"""
+Escopos de profiling opcionais nos caminhos críticos do package (ex: 'stock.download_history', 'portfolio.parse_movements').
+
+Cada escopo ligado gera, no diretório da execução:
+    - <escopo>.prof: o profile de CPU (cProfile) de todas as chamadas do escopo, somadas (abrir com pstats ou snakeviz)
+    - <escopo>.txt: as 40 funções com maior tempo acumulado
+    - <escopo>.memory.txt: as maiores alocações (tracemalloc) feitas durante as primeiras chamadas do escopo, e o pico de memória alocada
+    - index.json: número de chamadas e tempo total de cada escopo
+
+Ligando os escopos:
+    - variável de ambiente DELFOS_PROFILE: 'all' ou os nomes dos escopos separados por vírgula (ex: 'stock.download_history,session.set_stocks')
+    - variável de ambiente DELFOS_PROFILE_DIR: o diretório da execução (default é './delfos_profiles/<data e hora>')
+    - ou pela api: 'enable_profiling', 'write_profiles' e 'disable_profiling'
+
+Com os escopos desligados, o custo de uma função decorada com 'profiled' é o de uma checagem de flag por chamada.
+O tracemalloc só é ligado durante as chamadas com snapshot de alocações (o resto do processo roda sem o custo do tracing). Escopos chamados
+ao mesmo tempo em outras threads entram nas alocações uns dos outros.
+
+Chamadas aninhadas (ex: 'portfolio.history' dentro de 'portfolio.parse_movements') entram no profile de CPU do escopo externo, mas o número de chamadas
+e o tempo total também são contados no próprio escopo.
+"""
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+import tracemalloc
+import threading
+import cProfile
+import atexit
+import pstats
+import json
+import time
+import os
+
+
+PROFILES_FOLDER = "delfos_profiles" #pasta de default dos diretórios das execuções
+
+ENABLED = False #flag global checada a cada chamada dos escopos (a única coisa feita com o profiling desligado)
+SCOPES = None #escopos ligados (None são todos)
+PROFILING_PATH = None #diretório da execução
+MEMORY_CALLS = 1 #número de chamadas de cada escopo com snapshot de alocações
+PROFILES = {} #dicionário {escopo: pstats.Stats}, com os profiles de todas as chamadas do escopo já somados
+STATS = {} #dicionário {escopo: {'calls', 'total_s'}}
+MEMORY_SNAPSHOTS = {} #dicionário {escopo: [linhas das maiores alocações]}
+MEMORY_TRACING = 0 #número de chamadas medindo alocações agora (o tracemalloc só fica ligado enquanto houver alguma)
+MEMORY_OWNED = False #se o tracemalloc foi ligado por este módulo (se já estava ligado por fora, não é desligado)
+PROFILING_LOCK = threading.Lock()
+LOCAL = threading.local() #escopo sendo medido em cada thread (os escopos aninhados entram no profile do externo)
+
+
+
+def enable_profiling(scopes="all", path=None, memory_calls=1):
+    """
+    Liga os escopos de profiling.
+
+    Parameters
+    ----------
+    scopes : str ou list
+        'all' ou os nomes dos escopos ligados. (default é 'all')
+    path : str ou Path
+        O diretório da execução. (default é None, './delfos_profiles/<data e hora>')
+    memory_calls : int
+        O número de chamadas de cada escopo com snapshot de alocações (tracemalloc); 0 desliga os snapshots. (default é 1)
+
+    Raises
+    ------
+    TypeError
+        Se os parâmetros não baterem com seus respectivos tipos.
+
+    Returns
+    -------
+    Path
+        O diretório da execução.
+    """
+    global ENABLED, SCOPES, PROFILING_PATH, MEMORY_CALLS
+    if not isinstance(scopes, (str, list, tuple, set)):
+        raise TypeError("Argument 'scopes' must be a string or a list.")
+    if not isinstance(memory_calls, int):
+        raise TypeError("Argument 'memory_calls' must be an integer.")
+
+    if isinstance(scopes, str):
+        scopes = None if scopes == "all" else {scope.strip() for scope in scopes.split(",") if scope.strip()}
+    else:
+        scopes = set(scopes)
+    if path is None:
+        path = Path(PROFILES_FOLDER) / datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    with PROFILING_LOCK:
+        SCOPES = scopes
+        PROFILING_PATH = Path(path)
+        MEMORY_CALLS = memory_calls
+        PROFILING_PATH.mkdir(parents=True, exist_ok=True)
+        ENABLED = True
+    return PROFILING_PATH
+
+
+
+def disable_profiling(write=True):
+    """
+    Desliga os escopos de profiling.
+
+    Parameters
+    ----------
+    write : bool
+        Se verdadeiro, grava os profiles coletados antes de desligar. (default é True)
+    """
+    global ENABLED
+    if write:
+        write_profiles()
+    with PROFILING_LOCK:
+        ENABLED = False
+        PROFILES.clear()
+        STATS.clear()
+        MEMORY_SNAPSHOTS.clear()
+
+
+
+def is_profiling(scope=None):
+    """
+    Checa se o profiling está ligado (para um escopo, se passado).
+    """
+    return ENABLED and (scope is None or SCOPES is None or scope in SCOPES)
+
+
+
+def get_profiling_path():
+    """
+    Retorna o diretório da execução (None, se o profiling nunca foi ligado).
+    """
+    return PROFILING_PATH
+
+
+
+def profiled(scope):
+    """
+    Decorator que marca uma função como um escopo de profiling.
+
+    Parameters
+    ----------
+    scope : str
+        O nome do escopo (ex: 'stock.download_history').
+
+    Returns
+    -------
+    function
+        O decorator.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            return run_profiled(scope, function, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+
+def run_profiled(scope, function, *args, **kwargs):
+    """
+    Roda uma função dentro de um escopo de profiling. Se o escopo estiver desligado, só roda a função.
+    Se a thread já estiver dentro de outro escopo, só conta a chamada e o tempo (o cProfile só admite um profile ativo por thread).
+    """
+    if not is_profiling(scope):
+        return function(*args, **kwargs)
+    if getattr(LOCAL, "scope", None) is not None:
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            add_call(scope, time.perf_counter() - start)
+
+    memory = start_memory_tracing(scope)
+    before = tracemalloc.take_snapshot() if memory and not MEMORY_OWNED else None #tracemalloc ligado por fora: só a diferença conta
+
+    profile = cProfile.Profile()
+    LOCAL.scope = scope
+    start = time.perf_counter()
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        LOCAL.scope = None
+        if memory:
+            stop_memory_tracing(scope, before)
+        with PROFILING_LOCK:
+            #o profile da chamada é somado ao do escopo e descartado: a memória fica constante, independente do número de chamadas
+            if scope in PROFILES:
+                PROFILES[scope].add(profile)
+            else:
+                PROFILES[scope] = pstats.Stats(profile)
+        add_call(scope, elapsed)
+
+
+
+def add_call(scope, elapsed):
+    """
+    Conta uma chamada do escopo e o seu tempo.
+    """
+    with PROFILING_LOCK:
+        stats = STATS.setdefault(scope, {"calls": 0, "total_s": 0.0})
+        stats["calls"] += 1
+        stats["total_s"] += elapsed
+
+
+
+def start_memory_tracing(scope):
+    """
+    Liga o tracemalloc para uma chamada do escopo, se o escopo ainda não tiver todos os seus snapshots de alocações.
+
+    Returns
+    -------
+    bool
+        Se a chamada deve medir as alocações.
+    """
+    global MEMORY_TRACING, MEMORY_OWNED
+    with PROFILING_LOCK:
+        if len(MEMORY_SNAPSHOTS.get(scope, [])) >= MEMORY_CALLS:
+            return False
+        MEMORY_SNAPSHOTS.setdefault(scope, []).append(None) #reserva a vaga do snapshot
+        if MEMORY_TRACING == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start() #1 frame por alocação: as alocações são agrupadas por linha
+            MEMORY_OWNED = True
+        MEMORY_TRACING += 1
+        return True
+
+
+
+def stop_memory_tracing(scope, before=None):
+    """
+    Guarda as maiores alocações da chamada do escopo e desliga o tracemalloc, se nenhuma outra chamada estiver medindo alocações.
+    """
+    global MEMORY_TRACING, MEMORY_OWNED
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    statistics = snapshot.compare_to(before, "lineno") if before is not None else snapshot.statistics("lineno")
+    top = ["peak={} B".format(tracemalloc.get_traced_memory()[1])] + [str(statistic) for statistic in statistics[:25]]
+    with PROFILING_LOCK:
+        snapshots = MEMORY_SNAPSHOTS.setdefault(scope, [])
+        if None in snapshots:
+            snapshots[snapshots.index(None)] = top #ocupa a vaga reservada
+        else:
+            snapshots.append(top)
+        MEMORY_TRACING -= 1
+        if MEMORY_TRACING == 0 and MEMORY_OWNED:
+            tracemalloc.stop()
+            MEMORY_OWNED = False
+
+
+
+def write_profiles():
+    """
+    Grava os profiles coletados até agora no diretório da execução (ver a documentação do módulo). Pode ser chamado várias vezes; os arquivos são sobrescritos.
+
+    Returns
+    -------
+    Path ou None
+        O diretório da execução. (None, se o profiling nunca foi ligado)
+    """
+    with PROFILING_LOCK:
+        if PROFILING_PATH is None:
+            return None
+        for scope, stats in PROFILES.items():
+            stats.dump_stats(PROFILING_PATH / "{}.prof".format(scope))
+            with open(PROFILING_PATH / "{}.txt".format(scope), "w", encoding="utf8") as text_file:
+                pstats.Stats(str(PROFILING_PATH / "{}.prof".format(scope)), stream=text_file).sort_stats("cumulative").print_stats(40)
+        for scope, snapshots in MEMORY_SNAPSHOTS.items():
+            with open(PROFILING_PATH / "{}.memory.txt".format(scope), "w", encoding="utf8") as text_file:
+                for i, top in enumerate(snapshot for snapshot in snapshots if snapshot is not None):
+                    text_file.write("#--- chamada {} ---#\n".format(i + 1))
+                    text_file.write("\n".join(top) + "\n")
+        with open(PROFILING_PATH / "index.json", "w", encoding="utf8") as index_file:
+            json.dump(STATS, index_file, indent=4)
+        return PROFILING_PATH
+
+
+
+#liga o profiling pelas variáveis de ambiente e grava os profiles no fim do processo
+if os.environ.get("DELFOS_PROFILE"):
+    enable_profiling(os.environ["DELFOS_PROFILE"], os.environ.get("DELFOS_PROFILE_DIR"))
+    atexit.register(write_profiles)
@@ -0,0 +1,269 @@
+from delfos.common.configs import Configs
+from contextlib import contextmanager
+import threading
+import atexit
+import json
+import time
+import os
+
+
+CONFIGS = Configs()
+
+REQUESTS_TIMEOUT = CONFIGS.DEFAULTS["REQUESTS_TIMEOUT"] #timeout em segundos das requisições HTTP
+REQUESTS_HEADER = CONFIGS.REQUESTS_HEADER #header para requisições HTTP, usado para web scrapping
+
+ENDPOINTS = ("yfinance_api", "yahoo_html", "fundamentus", "bacen") #upstreams do package
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")) #limites superiores (segundos) das faixas do histograma de latência
+
+
+
+class Telemetry():
+    """
+    Classe que guarda a telemetria das requisições de rede, por upstream (endpoint): número de requisições, bytes recebidos, histograma de latência,
+    status HTTP, retentativas, timeouts, erros e o máximo de requisições simultâneas (útil para dimensionar a concorrência por host).
+
+    É thread safe. O package usa a instância global 'TELEMETRY'; se a variável de ambiente DELFOS_TELEMETRY_PATH estiver setada, a telemetria é gravada nesse arquivo json no fim do processo.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.reset()
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def endpoints(self):
+        return list(self.__endpoints.keys()) #upstreams com alguma requisição registrada
+
+    @property
+    def summary(self):
+        return self.get_stats() #telemetria de todos os upstreams
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def reset(self):
+        """
+        Apaga toda a telemetria registrada.
+        """
+        with self.__lock:
+            self.__endpoints = {} #dicionário {endpoint: estatísticas}
+
+
+
+    def __get_endpoint(self, endpoint):
+        """
+        Retorna as estatísticas do endpoint, criando-as se ainda não existirem. Deve ser chamado com o lock.
+        """
+        stats = self.__endpoints.get(endpoint)
+        if stats is None:
+            stats = {
+                "requests": 0,
+                "bytes": 0,
+                "latency_total_s": 0.0,
+                "latency_max_s": 0.0,
+                "latency_histogram": [0] * len(LATENCY_BUCKETS),
+                "status_codes": {},
+                "retries": 0,
+                "timeouts": 0,
+                "errors": 0,
+                "in_flight": 0,
+                "max_in_flight": 0
+            }
+            self.__endpoints[endpoint] = stats
+        return stats
+
+
+
+    def start(self, endpoint):
+        """
+        Registra o início de uma requisição (para o número de requisições simultâneas). Deve ser seguido de 'record'.
+
+        Parameters
+        ----------
+        endpoint : str
+            O upstream da requisição.
+        """
+        with self.__lock:
+            stats = self.__get_endpoint(endpoint)
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+
+
+
+    def record(self, endpoint, latency, nbytes=0, status=None, timeout=False, error=False, started=True):
+        """
+        Registra uma requisição terminada.
+
+        Parameters
+        ----------
+        endpoint : str
+            O upstream da requisição.
+        latency : float
+            A latência em segundos.
+        nbytes : int
+            O número de bytes recebidos. (default é 0)
+        status : int
+            O status HTTP da resposta. (default é None, sem resposta)
+        timeout : bool
+            Se a requisição estourou o timeout. (default é False)
+        error : bool
+            Se a requisição falhou por outro motivo (ex: conexão). (default é False)
+        started : bool
+            Se o início da requisição foi registrado com 'start'. (default é True)
+        """
+        with self.__lock:
+            stats = self.__get_endpoint(endpoint)
+            if started:
+                stats["in_flight"] -= 1
+            stats["requests"] += 1
+            stats["bytes"] += nbytes
+            stats["latency_total_s"] += latency
+            stats["latency_max_s"] = max(stats["latency_max_s"], latency)
+            for i, bucket in enumerate(LATENCY_BUCKETS):
+                if latency <= bucket:
+                    stats["latency_histogram"][i] += 1
+                    break
+            if status is not None:
+                stats["status_codes"][status] = stats["status_codes"].get(status, 0) + 1
+            if timeout:
+                stats["timeouts"] += 1
+            if error:
+                stats["errors"] += 1
+
+
+
+    def record_retry(self, endpoint):
+        """
+        Registra uma retentativa de requisição ao upstream.
+        """
+        with self.__lock:
+            self.__get_endpoint(endpoint)["retries"] += 1
+
+
+
+    @contextmanager
+    def track(self, endpoint):
+        """
+        Context manager que registra uma chamada de rede feita por código de terceiros (ex: a api do yfinance), sem acesso à resposta:
+        só a latência, timeouts e erros são registrados.
+
+        Parameters
+        ----------
+        endpoint : str
+            O upstream da chamada.
+        """
+        import requests
+
+        self.start(endpoint)
+        start = time.perf_counter()
+        try:
+            yield
+        except requests.Timeout:
+            self.record(endpoint, time.perf_counter() - start, timeout=True)
+            raise
+        except Exception:
+            self.record(endpoint, time.perf_counter() - start, error=True)
+            raise
+        else:
+            self.record(endpoint, time.perf_counter() - start)
+
+
+
+    def get(self, endpoint, url, timeout=REQUESTS_TIMEOUT, headers=REQUESTS_HEADER, **kwargs):
+        """
+        Faz uma requisição GET (requests.get) registrando a sua telemetria no endpoint.
+
+        Parameters
+        ----------
+        endpoint : str
+            O upstream da requisição. (ver ENDPOINTS)
+        url : str
+            A url.
+        timeout : int ou float
+            O timeout em segundos. (default é o das configurações, ver 'REQUESTS_TIMEOUT')
+        headers : dict
+            O header da requisição. (default é o header das configurações)
+        **kwargs
+            Outros parâmetros do requests.get.
+
+        Raises
+        ------
+        requests.RequestException
+            Se a requisição falhar (timeout, conexão, etc). A falha é registrada antes.
+
+        Returns
+        -------
+        Response
+            A resposta da requisição (qualquer status).
+        """
+        import requests #package para fazer requests HTTP (import feito só no primeiro uso)
+
+        self.start(endpoint)
+        start = time.perf_counter()
+        try:
+            response = requests.get(url, timeout=timeout, headers=headers, **kwargs)
+        except requests.Timeout:
+            self.record(endpoint, time.perf_counter() - start, timeout=True)
+            raise
+        except Exception:
+            self.record(endpoint, time.perf_counter() - start, error=True)
+            raise
+        self.record(endpoint, time.perf_counter() - start, len(response.content), response.status_code)
+        return response
+
+
+
+    def get_stats(self, endpoint=None):
+        """
+        Cria um resumo da telemetria de um upstream ou de todos.
+
+        Parameters
+        ----------
+        endpoint : str
+            O upstream. (default é None, todos os upstreams)
+
+        Returns
+        -------
+        dict
+            As estatísticas do upstream ('requests', 'bytes', 'latency_mean_s', 'latency_max_s', 'latency_histogram' {limite da faixa: contagem},
+            'status_codes', 'retries', 'timeouts', 'errors' e 'max_in_flight') ou um dicionário {endpoint: estatísticas}.
+            Um upstream sem requisições tem todas as estatísticas zeradas.
+        """
+        with self.__lock:
+            if endpoint is not None:
+                return self.__get_summary(self.__get_endpoint(endpoint))
+            return {name: self.__get_summary(stats) for name, stats in self.__endpoints.items()}
+
+
+
+    def __get_summary(self, stats):
+        summary = {key: value for key, value in stats.items() if key not in ("latency_total_s", "latency_histogram", "in_flight", "status_codes")}
+        summary["latency_mean_s"] = stats["latency_total_s"] / stats["requests"] if stats["requests"] > 0 else 0.0
+        summary["latency_histogram"] = {str(bucket): count for bucket, count in zip(LATENCY_BUCKETS, stats["latency_histogram"])}
+        summary["status_codes"] = {str(status): count for status, count in stats["status_codes"].items()}
+        return summary
+
+
+
+    def dump(self, path):
+        """
+        Grava o resumo da telemetria de todos os upstreams em um arquivo json.
+
+        Parameters
+        ----------
+        path : str ou Path
+            O caminho do arquivo.
+        """
+        with open(path, "w", encoding="utf8") as telemetry_file:
+            json.dump(self.get_stats(), telemetry_file, indent=4)
+
+
+
+TELEMETRY = Telemetry() #telemetria de rede do processo
+
+if os.environ.get("DELFOS_TELEMETRY_PATH"):
+    atexit.register(TELEMETRY.dump, os.environ["DELFOS_TELEMETRY_PATH"]) #grava a telemetria do processo no fim da execução
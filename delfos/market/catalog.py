@@ -0,0 +1,308 @@
+from delfos.common.configs import Configs
+import pandas as pd
+import threading
+import sys
+
+
+CONFIGS = Configs()
+
+INDEXED_FIELDS = ("sector", "sub_sector", "segment", "cnpj", "type") #campos do catálogo com índice {valor: tickers}
+CATEGORICAL_FIELDS = ("sector", "sub_sector", "segment", "type") #campos do catálogo guardados como categorias (poucos valores repetidos)
+JSON_FIELDS = {"exchange_name": "Nome de pregão", "cnpj": "CNPJ", "company": "Nome", "sector": "Setor", "sub_sector": "Sub Setor", "segment": "Segmento"} #campo do catálogo: chave no tickers.json
+
+
+
+def get_b3_type(ticker, sub_sector="undefined", segment="undefined"):
+    """
+    Determina o tipo da ação de acordo com os números no final do ticker e a codificação estabelecida pela B3.
+
+    OBS: LIMITA O USO DO CÓDIGO PARA AÇÕES BRASILEIRAS.
+
+    Parameters
+    ----------
+    ticker : str
+        O ticker (símbolo) da ação.
+    sub_sector : str
+        O sub setor de atuação da empresa, usado para diferenciar FIIs e ETFs das Units. (default é 'undefined')
+    segment : str
+        O segmento de atuação da empresa, usado para diferenciar FIIs de ETFs. (default é 'undefined')
+
+    Returns
+    -------
+    str
+        O tipo da ação: INDEX, ON, PN, PNA, PNB, BDR, FII, ETF, UNT ou undefined.
+    """
+    if ticker[0] == "^":
+        b3_type = "INDEX"
+    elif ticker[-1] == "3":
+        b3_type = "ON" #ação ordinária
+    elif ticker[-1] == "4":
+        b3_type = "PN" #ação preferencial
+    elif ticker[-1] == "5":
+        b3_type = "PNA" #ação preferencial classe A
+    elif ticker[-1] == "6":
+        b3_type = "PNB" #ação preferencial classe B
+    else:
+        b3_type = "undefined" #ações preferenciais de outras classes
+
+    if ticker[-2:] == "34" or ticker[-2:] == "33":
+        b3_type = "BDR" #ações de fora do brasil negociadas na B3
+
+    elif ticker[-2:] == "11":
+        if sub_sector == "Fundos":
+            if segment == "Fundos Imobiliários":
+                b3_type = "FII"
+            else:
+                b3_type = "ETF"
+        else:
+            b3_type = "UNT"
+
+    return b3_type
+
+
+
+class TickerCatalog():
+    """
+    Classe que representa o catálogo das informações fixas dos tickers (nome, CNPJ, setor, sub setor, segmento e tipo da B3).
+    Os campos repetitivos são guardados como categorias e as strings são internadas, então cada setor/segmento existe uma única vez na memória.
+    Possui índices prontos de cada valor de setor, sub setor, segmento, CNPJ e tipo para os seus tickers, então montar sub universos é uma busca no índice.
+    """
+
+    def __init__(self, tickers_dict):
+        """
+        Parameters
+        ----------
+        tickers_dict : dict
+            Dicionário com as infos dos tickers, no mesmo formato do arquivo tickers.json:
+                {
+                    '<ticker>': {
+                        'Nome de pregão': '<exchange_company_name>',
+                        'CNPJ': '<company_registered_number>',
+                        'Nome': '<company_name>',
+                        'Setor': '<company_sector>',
+                        'Sub Setor': '<company_sub_sector>',
+                        'Segmento': '<company_segment>'
+                    },
+                    ...
+                }
+            Infos ausentes ficam como 'undefined'.
+
+        Raises
+        ------
+        TypeError
+            Se o parâmetro 'tickers_dict' não for um dicionário.
+        """
+        if not isinstance(tickers_dict, dict):
+            raise TypeError("Argument 'tickers_dict' must be a dictionary.")
+
+        self.__tickers = tuple(sys.intern(ticker) for ticker in tickers_dict)
+        self.__positions = {ticker: i for i, ticker in enumerate(self.__tickers)} #posição de cada ticker nas colunas do catálogo
+
+        columns = {field: [] for field in JSON_FIELDS}
+        columns["type"] = []
+        for ticker in self.__tickers:
+            info = tickers_dict[ticker]
+            for field, json_key in JSON_FIELDS.items():
+                value = info.get(json_key, "undefined") if isinstance(info, dict) else "undefined"
+                columns[field].append(sys.intern(value) if isinstance(value, str) else "undefined")
+            columns["type"].append(get_b3_type(ticker, columns["sub_sector"][-1], columns["segment"][-1]))
+
+        #campos repetitivos viram categorias (códigos inteiros + uma única cópia de cada valor)
+        self.__columns = {}
+        for field, values in columns.items():
+            self.__columns[field] = pd.Categorical(values) if field in CATEGORICAL_FIELDS else values
+
+        #índices {campo: {valor: frozenset de tickers}}
+        self.__indexes = {}
+        for field in INDEXED_FIELDS:
+            index = {}
+            for ticker, value in zip(self.__tickers, columns[field]):
+                index.setdefault(value, []).append(ticker)
+            self.__indexes[field] = {value: frozenset(tickers) for value, tickers in index.items()}
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def tickers(self):
+        return list(self.__tickers) #tickers do catálogo
+
+    @property
+    def size(self):
+        return len(self.__tickers) #número de tickers do catálogo
+
+    @property
+    def table(self):
+        return self.get_table() #dataframe com as infos de todos os tickers (campos repetitivos como categorias)
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def __len__(self):
+        return len(self.__tickers)
+
+
+
+    def __contains__(self, ticker):
+        return ticker in self.__positions
+
+
+
+    def get(self, ticker):
+        """
+        Retorna as infos de um ticker do catálogo.
+
+        Parameters
+        ----------
+        ticker : str
+            O ticker.
+
+        Returns
+        -------
+        dict ou None
+            Dicionário com exchange_name, cnpj, company, sector, sub_sector, segment e type. (None, se o ticker não estiver no catálogo)
+        """
+        position = self.__positions.get(ticker)
+        if position is None:
+            return None
+        return {field: column[position] for field, column in self.__columns.items()}
+
+
+
+    def get_values(self, field):
+        """
+        Retorna os valores distintos de um campo indexado do catálogo.
+
+        Parameters
+        ----------
+        field : str
+            O campo: 'sector', 'sub_sector', 'segment', 'cnpj' ou 'type'.
+
+        Raises
+        ------
+        ValueError
+            Se o campo não for indexado.
+
+        Returns
+        -------
+        list
+            Os valores distintos do campo, em ordem alfabética.
+        """
+        if field not in self.__indexes:
+            raise ValueError("Argument 'field' must be one of: {}.".format(", ".join(INDEXED_FIELDS)))
+        return sorted(self.__indexes[field])
+
+
+
+    def lookup(self, field, values):
+        """
+        Busca no índice de um campo os tickers com algum dos valores passados.
+
+        Parameters
+        ----------
+        field : str
+            O campo: 'sector', 'sub_sector', 'segment', 'cnpj' ou 'type'.
+        values : str ou list
+            O valor ou a lista de valores aceitos.
+
+        Raises
+        ------
+        ValueError
+            Se o campo não for indexado.
+
+        Returns
+        -------
+        frozenset
+            Os tickers com algum dos valores passados.
+        """
+        if field not in self.__indexes:
+            raise ValueError("Argument 'field' must be one of: {}.".format(", ".join(INDEXED_FIELDS)))
+        index = self.__indexes[field]
+        if isinstance(values, str):
+            return index.get(values, frozenset())
+        return frozenset().union(*[index.get(value, frozenset()) for value in values])
+
+
+
+    def select(self, sector=None, sub_sector=None, segment=None, cnpj=None, type=None):
+        """
+        Seleciona os tickers que atendem a todos os critérios passados (intersecção entre os campos; dentro de um campo, qualquer um dos valores de uma lista).
+        Ex: select(sub_sector="Energia elétrica", type="ON") -> todas as ações ordinárias de energia elétrica.
+
+        Parameters
+        ----------
+        sector, sub_sector, segment, cnpj, type : str ou list
+            Os valores aceitos para cada campo. (default é None, o campo não é filtrado)
+
+        Returns
+        -------
+        list
+            Os tickers selecionados, na ordem do catálogo.
+        """
+        criteria = {"sector": sector, "sub_sector": sub_sector, "segment": segment, "cnpj": cnpj, "type": type}
+        selected = None
+        for field, values in criteria.items():
+            if values is None:
+                continue
+            found = self.lookup(field, values)
+            selected = found if selected is None else selected & found
+            if len(selected) == 0:
+                return []
+        if selected is None:
+            return list(self.__tickers)
+        return sorted(selected, key=self.__positions.__getitem__)
+
+
+
+    def get_table(self):
+        """
+        Cria um dataframe com as infos de todos os tickers do catálogo. Index = ticker. Os campos repetitivos são colunas categóricas.
+
+        Returns
+        -------
+        DataFrame
+            O dataframe com as infos dos tickers.
+        """
+        return pd.DataFrame(self.__columns, index=pd.Index(self.__tickers, name="ticker"))
+
+
+
+    def to_dict(self):
+        """
+        Converte o catálogo para o formato do arquivo tickers.json.
+
+        Returns
+        -------
+        dict
+            Dicionário com as infos dos tickers.
+        """
+        tickers_dict = {}
+        for ticker in self.__tickers:
+            info = self.get(ticker)
+            tickers_dict[ticker] = {json_key: info[field] for field, json_key in JSON_FIELDS.items()}
+        return tickers_dict
+
+
+
+CATALOG = None #catálogo dos tickers da B3, criado só no primeiro uso (ver 'get_catalog')
+CATALOG_LOCK = threading.Lock()
+
+
+
+def get_catalog():
+    """
+    Retorna o catálogo dos tickers da B3 (arquivo tickers.json). O catálogo é criado no primeiro uso, uma única vez por processo.
+
+    Returns
+    -------
+    TickerCatalog
+        O catálogo dos tickers da B3.
+    """
+    global CATALOG
+    if CATALOG is None:
+        with CATALOG_LOCK:
+            if CATALOG is None:
+                CATALOG = TickerCatalog(CONFIGS.TICKERS_DICT)
+    return CATALOG
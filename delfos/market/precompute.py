@@ -0,0 +1,264 @@
+"""
+Pré-cálculo noturno do próximo pregão e o cache de dados de mercado.
+
+Depois do fechamento, tudo o que o pregão seguinte precisa já é conhecido, exceto os preços de abertura: os históricos, a tabela de preços de fechamento,
+a covariância Ledoit-Wolf e o preço de risco do mercado. 'precompute_next_session' grava esses artefatos em uma pasta,
+com a data do pregão a que se aplicam, e 'load_precomputed_session' monta, de manhã, o pregão dessa data sem nenhum download e sem recalcular a covariância.
+Os únicos dados novos (deltas) são os preços do dia, que chegam pelo caminho ao vivo das ações (ver 'Stock.stream_prices'). O prior do modelo Black Litterman
+não é gravado: ele depende dos market caps atuais e é recalculado pelo pregão, a partir da covariância e do preço de risco gravados, a cada ajuste do modelo
+(ver 'Session.refresh_allocation_prior' e o AllocationScheduler).
+
+Pasta dos artefatos (também é um cache de mercado, ver 'load_market_data'):
+    - histories.dhs: históricos das ações e do índice (HistoryStore)
+    - fundamentals.json: dados fundamentalistas das ações
+    - tickers.json: infos fixas dos tickers
+    - artifacts.pkl: tabelas, preço de risco e as datas (snapshot binário versionado)
+
+Agendamento: rodar depois do fechamento, em dias de semana (ex: cron '30 19 * * 1-5 python -m delfos precompute --precomputed-output precomputed/'),
+ou deixar o daemon do advisor fazer o pré-cálculo na virada do fechamento (ver 'delfos.server').
+"""
+from delfos.market.session import Session
+from delfos.market.store import HistoryStore, write_history_store
+from delfos.common.configs import Configs
+from datetime import datetime, timedelta
+from pathlib import Path
+import pickle
+import struct
+import os
+import json
+
+
+CONFIGS = Configs()
+
+SESSION_FREQ_PER_YEAR = CONFIGS.DEFAULTS["SESSION_FREQ_PER_YEAR"] #número de dias no ano em que o mercado funciona
+HISTORIES_FILE = "histories.dhs" #arquivo dos históricos no cache de mercado
+FUNDAMENTALS_FILE = "fundamentals.json" #arquivo dos dados fundamentalistas no cache de mercado
+TICKERS_FILE = "tickers.json" #arquivo das infos dos tickers no cache de mercado
+ARTIFACTS_FILE = "artifacts.pkl" #arquivo dos artefatos pré-calculados
+ARTIFACTS_MAGIC = b"DELFOSPC" #identificador dos arquivos de artefatos pré-calculados
+ARTIFACTS_VERSION = 2 #versão do formato dos artefatos (artefatos de outras versões não são carregados)
+
+
+
+def get_next_session_date(date):
+    """
+    Retorna a data do próximo pregão: o próximo dia de semana depois da data. (feriados não são considerados)
+
+    Parameters
+    ----------
+    date : datetime ou date
+        A data do pregão atual.
+
+    Returns
+    -------
+    date
+        A data do próximo pregão.
+    """
+    date = date.date() if isinstance(date, datetime) else date
+    date += timedelta(days=1)
+    while date.weekday() in (5, 6):
+        date += timedelta(days=1)
+    return date
+
+
+
+def write_market_cache(session, path, tickers_dict=None, metadata=None):
+    """
+    Grava o cache de dados de mercado de um pregão: históricos (HistoryStore), dados fundamentalistas e infos dos tickers.
+
+    Parameters
+    ----------
+    session : Session
+        O pregão.
+    path : str ou Path
+        A pasta do cache (criada se não existir).
+    tickers_dict : dict
+        As infos dos tickers, no formato do tickers.json. (default é None, o dicionário de ações da B3)
+    metadata : dict
+        Metadados extras gravados no HistoryStore. (default é None)
+
+    Returns
+    -------
+    Path
+        A pasta do cache.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    metadata = {
+        "date": session.date.isoformat(), "period": session.period, "index_ticker": session.market_index.ticker if session.market_index is not None else None,
+        "risk_free_rate": float(session.risk_free_rate), **(metadata if metadata is not None else {})
+    }
+    write_history_store(path / HISTORIES_FILE, session.get_histories(), metadata)
+
+    stocks = session.stocks
+    fundamentals = {ticker: {"shares_outstanding": int(stock.shares_outstanding), "equity": float(stock.equity), "earnings": float(stock.earnings)} for ticker, stock in stocks.items()}
+    with open(path / FUNDAMENTALS_FILE, "w", encoding="utf8") as fundamentals_file:
+        json.dump(fundamentals, fundamentals_file)
+    tickers_dict = tickers_dict if tickers_dict is not None else CONFIGS.TICKERS_DICT
+    with open(path / TICKERS_FILE, "w", encoding="utf8") as tickers_file:
+        json.dump({ticker: tickers_dict.get(ticker, {}) for ticker in stocks}, tickers_file, ensure_ascii=False)
+    return path
+
+
+
+def load_market_data(path):
+    """
+    Abre um cache de dados de mercado (gravado por 'write_market_cache', pelo pré-cálculo ou um dataset sintético, ver 'delfos.benchmarks.synthetic').
+
+    Parameters
+    ----------
+    path : str ou Path
+        A pasta do cache.
+
+    Returns
+    -------
+    dict
+        Dicionário com: histories (HistoryStore), fundamentals (dict) e tickers (dict, list ou None, se o cache não tiver o arquivo de tickers).
+    """
+    path = Path(path)
+    market_data = {"histories": HistoryStore(path / HISTORIES_FILE), "fundamentals": {}, "tickers": None}
+    if (path / FUNDAMENTALS_FILE).exists():
+        with open(path / FUNDAMENTALS_FILE, "r", encoding="utf8") as fundamentals_file:
+            market_data["fundamentals"] = json.load(fundamentals_file)
+    if (path / TICKERS_FILE).exists():
+        with open(path / TICKERS_FILE, "r", encoding="utf8") as tickers_file:
+            market_data["tickers"] = json.load(tickers_file)
+    return market_data
+
+
+
+def precompute_next_session(session, path, next_date=None, tickers_dict=None):
+    """
+    Pré-calcula os artefatos do próximo pregão a partir do pregão fechado e os grava na pasta, junto com o cache de dados de mercado.
+    Calcula a covariância Ledoit-Wolf do pregão (se ainda não calculada), então deve ser chamado depois do fechamento, fora do caminho crítico.
+    O modelo de alocação do pregão não é alterado. O arquivo dos artefatos é gravado em um arquivo temporário e depois renomeado, então um pregão
+    montado ao mesmo tempo nunca lê artefatos pela metade.
+
+    Parameters
+    ----------
+    session : Session
+        O pregão fechado (com os históricos até o fechamento).
+    path : str ou Path
+        A pasta dos artefatos (criada se não existir).
+    next_date : datetime ou date
+        A data do pregão a que os artefatos se aplicam. (default é None, o próximo dia de semana depois do pregão)
+    tickers_dict : dict
+        As infos dos tickers gravadas no cache. (default é None, o dicionário de ações da B3)
+
+    Raises
+    ------
+    TypeError
+        Se o parâmetro 'session' não for um objeto Session.
+    ValueError
+        Se o pregão não tiver o índice de mercado (necessário para o preço de risco).
+
+    Returns
+    -------
+    Path
+        O arquivo dos artefatos.
+    """
+    from pypfopt import black_litterman #package com os modelos estatísticos de otimização de portfolios (import pesado, feito só no primeiro uso)
+
+    if not isinstance(session, Session):
+        raise TypeError("Argument 'session' must be a Session object.")
+    if session.market_index is None:
+        raise ValueError("The session must have a market index to precompute the allocation model.")
+    next_date = get_next_session_date(session.date) if next_date is None else (next_date.date() if isinstance(next_date, datetime) else next_date)
+
+    path = Path(path)
+    write_market_cache(session, path, tickers_dict, {"next_date": next_date.isoformat()})
+
+    covariances_table = session.covariances_table
+    risk_aversion = float(black_litterman.market_implied_risk_aversion(session.market_index.history["Close"], frequency=SESSION_FREQ_PER_YEAR))
+
+    artifacts = {
+        "date": session.date,
+        "next_date": next_date,
+        "period": session.period,
+        "index_ticker": session.market_index.ticker,
+        "risk_free_rate": float(session.risk_free_rate),
+        "tickers": session.tickers,
+        "closing_prices_table": session.closing_prices_table,
+        "covariances_table": covariances_table,
+        "risk_aversion": risk_aversion,
+        "created": datetime.now()
+    }
+    temp_path = path / (ARTIFACTS_FILE + ".tmp")
+    with open(temp_path, "wb") as artifacts_file:
+        artifacts_file.write(ARTIFACTS_MAGIC + struct.pack("<I", ARTIFACTS_VERSION))
+        pickle.dump(artifacts, artifacts_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path / ARTIFACTS_FILE)
+    return path / ARTIFACTS_FILE
+
+
+
+def load_precomputed(path):
+    """
+    Carrega os artefatos pré-calculados de uma pasta (ou do próprio arquivo).
+
+    OBS: Os artefatos são um pickle, então só devem ser carregados artefatos de origem confiável.
+
+    Parameters
+    ----------
+    path : str ou Path
+        A pasta dos artefatos ou o arquivo 'artifacts.pkl'.
+
+    Raises
+    ------
+    ValueError
+        Se o arquivo não for de artefatos pré-calculados ou se a versão não for suportada.
+
+    Returns
+    -------
+    dict
+        Os artefatos: date, next_date, period, index_ticker, risk_free_rate, tickers, closing_prices_table, covariances_table, risk_aversion e created.
+    """
+    path = Path(path)
+    path = path / ARTIFACTS_FILE if path.is_dir() else path
+    with open(path, "rb") as artifacts_file:
+        if artifacts_file.read(len(ARTIFACTS_MAGIC)) != ARTIFACTS_MAGIC:
+            raise ValueError("File '{}' is not a precomputed artifacts file.".format(path))
+        version = struct.unpack("<I", artifacts_file.read(4))[0]
+        if version != ARTIFACTS_VERSION:
+            raise ValueError("Precomputed artifacts version {} is not supported (expected {}).".format(version, ARTIFACTS_VERSION))
+        return pickle.load(artifacts_file)
+
+
+
+def load_precomputed_session(path, date=None, tickers=None, metrics=None, threads=None):
+    """
+    Monta o pregão da data a partir dos artefatos pré-calculados, sem nenhum download: históricos mapeados em memória, dados fundamentalistas e taxa livre de risco gravados,
+    e a tabela de preços de fechamento, a covariância e o preço de risco já calculados. O primeiro update do modelo de alocação só ajusta o Black Litterman.
+
+    Parameters
+    ----------
+    path : str ou Path
+        A pasta dos artefatos.
+    date : datetime
+        A data do pregão. (default é None, agora)
+    tickers : list ou dict
+        Os tickers do pregão. (default é None, os tickers dos artefatos)
+    metrics : Metrics, bool ou str
+        Métricas do pregão. (ver 'Session') (default é None, métricas desligadas)
+    threads : int
+        O número de threads do pregão. (default é None, o número das configurações)
+
+    Raises
+    ------
+    ValueError
+        Se os artefatos não forem da data do pregão.
+
+    Returns
+    -------
+    Session
+        O pregão.
+    """
+    date = date if date is not None else datetime.now()
+    artifacts = load_precomputed(path)
+    market_data = load_market_data(path)
+    if tickers is None:
+        tickers = market_data["tickers"] if market_data["tickers"] is not None else artifacts["tickers"]
+    return Session(
+        date, artifacts["period"], tickers, artifacts["index_ticker"], artifacts["risk_free_rate"], histories=market_data["histories"],
+        fundamentals=market_data["fundamentals"], metrics=metrics, threads=threads, precomputed=artifacts
+    )
@@ -0,0 +1,167 @@
+from delfos.market.session import Session
+from delfos.common.configs import Configs
+import delfos.common.utils as utils
+from datetime import datetime
+import threading
+
+
+CONFIGS = Configs()
+
+PRICE_THRESHOLD = CONFIGS.DEFAULTS["ALLOCATION_PRICE_THRESHOLD"] #movimento agregado dos preços que dispara o refresh do modelo
+DRIFT_THRESHOLD = CONFIGS.DEFAULTS["ALLOCATION_DRIFT_THRESHOLD"] #drift dos pesos por market cap que dispara o refresh do modelo
+MIN_INTERVAL = CONFIGS.DEFAULTS["ALLOCATION_MIN_INTERVAL"] #intervalo mínimo (segundos) entre dois refresh do modelo
+CHECK_INTERVAL = CONFIGS.DEFAULTS["ALLOCATION_CHECK_INTERVAL"] #intervalo (segundos) entre as checagens do scheduler
+
+
+
+class AllocationScheduler():
+    """
+    Classe que mantém atualizado, durante o pregão, o modelo de alocação de uma sessão.
+    Em uma thread separada, checa periodicamente o quanto os preços e os pesos por market cap se moveram desde o último ajuste do modelo
+    e, se algum dos limites for ultrapassado (respeitando um intervalo mínimo), atualiza apenas o prior do mercado e o posterior do modelo.
+    A matriz de covariância (Ledoit-Wolf) não é recalculada.
+    """
+
+    def __init__(self, session, price_threshold=PRICE_THRESHOLD, drift_threshold=DRIFT_THRESHOLD, min_interval=MIN_INTERVAL, check_interval=CHECK_INTERVAL):
+        """
+        Parameters
+        ----------
+        session : Session
+            O objeto Session cujo modelo de alocação deve ser mantido atualizado.
+        price_threshold : float
+            O movimento agregado dos preços (ponderado por market cap) a partir do qual o modelo é atualizado. (default é 1%)
+        drift_threshold : float
+            O drift dos pesos por market cap a partir do qual o modelo é atualizado. (default é 0,5%)
+        min_interval : int ou float
+            O intervalo mínimo em segundos entre dois refresh do modelo. (default é 300 segundos)
+        check_interval : int ou float
+            O intervalo em segundos entre as checagens do scheduler. (default é 5 segundos)
+
+        Raises
+        ------
+        TypeError
+            Se os parâmetros não baterem com seus respectivos tipos.
+        ValueError
+            Se algum dos limites ou intervalos for menor que 0 ou se o intervalo de checagem for 0.
+        """
+        #checando se os tipos dos parâmetros estão corretos
+        if not isinstance(session, Session):
+            raise TypeError("Argument 'session' must be a Session object.")
+        if not isinstance(price_threshold, (int, float)):
+            raise TypeError("Argument 'price_threshold' must be an integer or a float.")
+        if not isinstance(drift_threshold, (int, float)):
+            raise TypeError("Argument 'drift_threshold' must be an integer or a float.")
+        if not isinstance(min_interval, (int, float)):
+            raise TypeError("Argument 'min_interval' must be an integer or a float.")
+        if not isinstance(check_interval, (int, float)):
+            raise TypeError("Argument 'check_interval' must be an integer or a float.")
+
+        if price_threshold < 0 or drift_threshold < 0:
+            raise ValueError("The allocation thresholds can't be lesser than 0.")
+        if min_interval < 0:
+            raise ValueError("Argument 'min_interval' can't be lesser than 0.")
+        if check_interval <= 0:
+            raise ValueError("Argument 'check_interval' must be greater than 0.")
+
+        self.__session = session
+        self.__price_threshold = price_threshold
+        self.__drift_threshold = drift_threshold
+        self.__min_interval = min_interval
+        self.__check_interval = check_interval
+        self.__refreshes_num = 0 #número de refresh realizados pelo scheduler
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def session(self):
+        return self.__session #sessão cujo modelo de alocação é mantido atualizado
+
+    @property
+    def price_threshold(self):
+        return self.__price_threshold #movimento agregado dos preços que dispara o refresh
+
+    @property
+    def drift_threshold(self):
+        return self.__drift_threshold #drift dos pesos por market cap que dispara o refresh
+
+    @property
+    def min_interval(self):
+        return self.__min_interval #intervalo mínimo entre dois refresh
+
+    @property
+    def refreshes_num(self):
+        return self.__refreshes_num #número de refresh realizados pelo scheduler
+
+    @property
+    def is_running(self):
+        return self.__thread is not None and self.__thread.is_alive() #se a thread do scheduler está rodando
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def check(self):
+        """
+        Faz uma checagem do scheduler: se for dia de semana, horário de pregão, já tiver passado o intervalo mínimo desde o último ajuste
+        e o movimento dos preços ou o drift dos pesos ultrapassar seu limite, atualiza o prior e o posterior do modelo de alocação da sessão.
+
+        Returns
+        -------
+        bool
+            Verdadeiro se o modelo de alocação foi atualizado.
+        """
+        now = datetime.now()
+        if now.weekday() in (5, 6) or not utils.is_market_hours():
+            return False
+
+        last_refresh = self.__session.allocation_time
+        if last_refresh is not None and (now - last_refresh).total_seconds() < self.__min_interval:
+            return False
+
+        price_move, weights_drift = self.__session.allocation_drift
+        #se o modelo ainda não foi criado, o drift é 0 e o refresh cria o modelo completo
+        if last_refresh is None or price_move >= self.__price_threshold or weights_drift >= self.__drift_threshold:
+            self.__session.refresh_allocation_prior()
+            self.__refreshes_num += 1
+            return True
+        return False
+
+
+
+    def __run(self):
+        """
+        Loop da thread do scheduler. Checa a sessão a cada 'check_interval' segundos, até que o scheduler seja parado.
+        """
+        while not self.__stop_event.wait(self.__check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(e) #um erro em um refresh não deve derrubar o scheduler
+
+
+
+    def start(self):
+        """
+        Começa as checagens do scheduler em uma thread separada (não trava o programa).
+        Se o scheduler já estiver rodando, não faz nada.
+        """
+        if self.is_running:
+            return
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+
+
+    def stop(self):
+        """
+        Para as checagens do scheduler e espera a thread terminar.
+        """
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
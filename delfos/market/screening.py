@@ -0,0 +1,140 @@
+from delfos.common.configs import Configs
+import pandas as pd
+import numpy as np
+
+
+CONFIGS = Configs()
+
+SCREENING = CONFIGS.DEFAULTS["SCREENING"] #critérios de default da triagem do universo de ações (todos desligados)
+
+
+
+def get_screening_criteria(screening=None):
+    """
+    Monta os critérios da triagem, completando os passados com os de default das configurações.
+
+    Parameters
+    ----------
+    screening : dict ou bool
+        Critérios que substituem os de default. Se False, desliga a triagem. (default é None, os critérios de default)
+
+    Raises
+    ------
+    TypeError
+        Se o parâmetro 'screening' não for um dicionário ou um bool.
+    ValueError
+        Se algum critério não existir.
+
+    Returns
+    -------
+    dict ou None
+        Os critérios da triagem. (None, se a triagem estiver desligada)
+    """
+    if screening is False:
+        return None
+    if screening is None or screening is True:
+        screening = {}
+    if not isinstance(screening, dict):
+        raise TypeError("Argument 'screening' must be a dictionary or a boolean.")
+    for key in screening:
+        if key not in SCREENING:
+            raise ValueError("Invalid screening criterion '{}'. Valid criteria: {}.".format(key, ", ".join(SCREENING)))
+    return {**SCREENING, **screening}
+
+
+
+def is_screening_enabled(criteria):
+    """
+    Checa se algum critério da triagem pode excluir ações (com os critérios de default, nenhuma ação é excluída).
+    """
+    return criteria is not None and (
+        criteria["min_avg_volume"] > 0 or criteria["min_avg_traded_value"] > 0 or criteria["min_active_ratio"] > 0 or
+        criteria["max_inactive_days"] is not None or criteria["min_listing_days"] > 0
+    )
+
+
+
+def get_naive_dates(index):
+    """
+    Retorna as datas do index sem fuso horário (datetime64[ns]).
+    """
+    return (index.tz_localize(None) if index.tz is not None else index).to_numpy(dtype="datetime64[ns]")
+
+
+
+def screen_stocks(stocks, date, criteria):
+    """
+    Triagem vetorizada de liquidez, atividade e tempo de listagem sobre o universo de ações, usando apenas os históricos (preço e volume).
+    Usada pela classe Session entre o download dos históricos e o dos dados fundamentalistas, para não baixar dados de ações que seriam descartadas.
+
+    Critérios (ver 'SCREENING' nas configurações):
+        - window: número de pregões da janela de liquidez e atividade
+        - min_avg_volume: volume médio mínimo na janela
+        - min_avg_traded_value: volume financeiro médio mínimo na janela (preço de fechamento x volume)
+        - min_active_ratio: fração mínima de pregões da janela com negócios (volume > 0)
+        - max_inactive_days: número máximo de dias corridos desde o último pregão com negócios até a data de análise (None não filtra)
+        - min_listing_days: número mínimo de dias corridos desde a primeira data do histórico até a data de análise
+
+    Parameters
+    ----------
+    stocks : list
+        Os objetos Stock, já com os históricos.
+    date : datetime
+        A data de análise.
+    criteria : dict
+        Os critérios da triagem. (ver 'get_screening_criteria')
+
+    Returns
+    -------
+    list
+        Os tickers das ações excluídas pela triagem.
+    """
+    if len(stocks) == 0 or not is_screening_enabled(criteria):
+        return []
+
+    window = criteria["window"]
+    histories = [stock.history for stock in stocks]
+    listed = np.array([i for i, history in enumerate(histories) if not history.empty], dtype=int)
+    closes = np.zeros((window, len(stocks)))
+    volumes = np.zeros((window, len(stocks)))
+    first_dates = np.full(len(stocks), np.datetime64("NaT"), dtype="datetime64[ns]")
+    last_traded_dates = np.full(len(stocks), np.datetime64("NaT"), dtype="datetime64[ns]")
+
+    if len(listed) > 0:
+        #as caudas ('window' últimas barras) de todas as ações são concatenadas em arrays únicos e espalhadas de uma vez nas matrizes (pregão x ação), alinhadas pelo fim
+        tails = [histories[i].iloc[-window:] for i in listed]
+        lengths = np.array([len(tail) for tail in tails])
+        tail_closes = np.nan_to_num(np.concatenate([tail["Close"].to_numpy(dtype=float) for tail in tails]))
+        tail_volumes = np.nan_to_num(np.concatenate([tail["Volume"].to_numpy(dtype=float) for tail in tails]))
+        tail_dates = np.concatenate([get_naive_dates(tail.index) for tail in tails])
+        columns = np.repeat(listed, lengths)
+        slots = np.arange(len(columns)) - np.repeat(np.cumsum(lengths) - window, lengths) #linha de cada barra na janela (as ações com menos barras têm o começo da janela zerado)
+        closes[slots, columns] = tail_closes
+        volumes[slots, columns] = tail_volumes
+
+        first_dates[listed] = [get_naive_dates(histories[i].index[:1])[0] for i in listed]
+        traded = np.flatnonzero(tail_volumes > 0)
+        last_traded = np.full(len(stocks), -1)
+        np.maximum.at(last_traded, columns[traded], traded) #última barra com negócios de cada ação na janela
+        has_traded = last_traded >= 0
+        last_traded_dates[has_traded] = tail_dates[last_traded[has_traded]]
+        for i in np.setdiff1d(listed, np.flatnonzero(has_traded)):
+            #sem negócios na janela: o último negócio é procurado no histórico inteiro (só para essas ações)
+            traded_rows = np.flatnonzero(np.nan_to_num(histories[i]["Volume"].to_numpy(dtype=float)) > 0)
+            if len(traded_rows) > 0:
+                last_traded_dates[i] = get_naive_dates(histories[i].index[traded_rows[-1:]])[0]
+
+    date = pd.Timestamp(date).normalize()
+    date = (date.tz_localize(None) if date.tz is not None else date).to_datetime64()
+    day = np.timedelta64(1, "D")
+
+    avg_volume = volumes.mean(axis=0)
+    avg_traded_value = (closes * volumes).mean(axis=0)
+    active_ratio = (volumes > 0).mean(axis=0)
+    inactive_days = np.where(np.isnat(last_traded_dates), np.inf, (date - last_traded_dates) / day)
+    listing_days = np.where(np.isnat(first_dates), 0, (date - first_dates) / day)
+
+    rejected = (avg_volume < criteria["min_avg_volume"]) | (avg_traded_value < criteria["min_avg_traded_value"]) | (active_ratio < criteria["min_active_ratio"]) | (listing_days < criteria["min_listing_days"])
+    if criteria["max_inactive_days"] is not None:
+        rejected |= inactive_days > criteria["max_inactive_days"]
+    return [stock.ticker for stock, reject in zip(stocks, rejected) if reject]
@@ -0,0 +1,266 @@
+from delfos.common.configs import Configs
+import numpy as np
+import threading
+
+
+CONFIGS = Configs()
+
+AVG_VOLUME_WINDOW = CONFIGS.DEFAULTS["AVG_VOLUME_WINDOW"] #número de pregões da média de volume usada na seleção das ações
+
+CATEGORICAL_FIELDS = ("sector", "sub_sector", "segment", "type") #campos categóricos aceitos como critério de seleção
+NUMERIC_FIELDS = ("price", "volume", "avg_volume", "shares_outstanding", "market_cap", "eps", "bvps", "roe", "price_to_earnings", "price_to_book") #campos numéricos aceitos como critério de seleção
+
+
+
+class StockIndex():
+    """
+    Classe que representa os índices de seleção das ações de um pregão.
+    Os campos categóricos (setor, sub setor, segmento, tipo e se está ativa) são conjuntos de tickers por valor e os campos numéricos são arrays (uma linha por ação),
+    então uma seleção com vários critérios é uma intersecção de conjuntos mais comparações vetorizadas, sem passar pelas propriedades de cada objeto Stock.
+
+    Os índices devem ser mantidos pelo dono (ver 'add', 'remove' e 'update_prices'); a classe Session faz isso ao adicionar/remover ações e a cada lote de novos preços.
+    """
+
+    def __init__(self, capacity=512):
+        """
+        Parameters
+        ----------
+        capacity : int
+            O número inicial de linhas dos arrays numéricos (cresce sob demanda). (default é 512)
+        """
+        self.__rows = {} #dicionário {ticker: linha nos arrays numéricos}
+        self.__free_rows = [] #linhas liberadas por ações removidas (reaproveitadas)
+        self.__tickers = np.empty(capacity, dtype=object) #ticker de cada linha (None para linhas livres)
+        self.__columns = {field: np.full(capacity, np.nan) for field in ("price", "volume", "avg_volume", "shares_outstanding", "eps", "bvps", "roe")}
+        self.__categories = {field: {} for field in CATEGORICAL_FIELDS} #dicionário {campo: {valor: set(tickers)}}
+        self.__active = set()
+        self.__lock = threading.Lock()
+
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_StockIndex__lock") #locks não são serializáveis
+        return state
+
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def tickers(self):
+        return list(self.__rows.keys()) #tickers indexados
+
+    @property
+    def size(self):
+        return len(self.__rows) #número de ações indexadas
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def __len__(self):
+        return len(self.__rows)
+
+
+
+    def __contains__(self, ticker):
+        return ticker in self.__rows
+
+
+
+    def __get_row(self, ticker):
+        """
+        Retorna a linha do ticker nos arrays numéricos, alocando uma nova (e crescendo os arrays, se preciso) se o ticker ainda não estiver indexado.
+        """
+        row = self.__rows.get(ticker)
+        if row is not None:
+            return row
+        if len(self.__free_rows) > 0:
+            row = self.__free_rows.pop()
+        else:
+            row = len(self.__rows)
+            if row >= len(self.__tickers):
+                capacity = 2 * len(self.__tickers)
+                self.__tickers = np.concatenate([self.__tickers, np.empty(capacity - len(self.__tickers), dtype=object)])
+                for field, column in self.__columns.items():
+                    self.__columns[field] = np.concatenate([column, np.full(capacity - len(column), np.nan)])
+        self.__rows[ticker] = row
+        self.__tickers[row] = ticker
+        return row
+
+
+
+    def add(self, stocks):
+        """
+        Indexa (ou reindexa) as ações passadas: campos categóricos, dados fundamentalistas, preço, volume e volume médio.
+
+        Parameters
+        ----------
+        stocks : list
+            Os objetos Stock.
+        """
+        with self.__lock:
+            for stock in stocks:
+                if stock.ticker in self.__rows:
+                    self.__remove(stock.ticker)
+                row = self.__get_row(stock.ticker)
+                for field in CATEGORICAL_FIELDS:
+                    self.__categories[field].setdefault(getattr(stock, field), set()).add(stock.ticker)
+                if stock.is_active:
+                    self.__active.add(stock.ticker)
+
+                history = stock.history
+                self.__columns["price"][row] = stock.current_price
+                self.__columns["volume"][row] = stock.current_volume
+                self.__columns["avg_volume"][row] = float(history["Volume"].iloc[-AVG_VOLUME_WINDOW:].mean()) if not history.empty else 0.0
+                self.__columns["shares_outstanding"][row] = stock.shares_outstanding
+                self.__columns["eps"][row] = stock.eps
+                self.__columns["bvps"][row] = stock.bvps
+                self.__columns["roe"][row] = stock.roe
+
+
+
+    def remove(self, tickers):
+        """
+        Remove as ações dos índices. Tickers que não estiverem indexados são ignorados.
+
+        Parameters
+        ----------
+        tickers : list
+            Os tickers das ações.
+        """
+        with self.__lock:
+            for ticker in tickers:
+                if ticker in self.__rows:
+                    self.__remove(ticker)
+
+
+
+    def __remove(self, ticker):
+        row = self.__rows.pop(ticker)
+        self.__tickers[row] = None
+        for column in self.__columns.values():
+            column[row] = np.nan
+        self.__free_rows.append(row)
+        for index in self.__categories.values():
+            for value, tickers in list(index.items()):
+                tickers.discard(ticker)
+                if len(tickers) == 0:
+                    index.pop(value)
+        self.__active.discard(ticker)
+
+
+
+    def update_prices(self, batch):
+        """
+        Atualiza o preço e o volume atuais das ações a partir de um lote do evento 'price' (ver 'Stock.subscribe').
+        Market cap, P/L e P/VP são derivados do preço na hora da seleção, então também ficam atualizados.
+
+        Parameters
+        ----------
+        batch : list
+            A lista de payloads do evento, cada um com 'ticker', 'price' e 'volume'.
+        """
+        with self.__lock:
+            for payload in batch:
+                row = self.__rows.get(payload["ticker"])
+                if row is not None:
+                    self.__columns["price"][row] = payload["price"]
+                    self.__columns["volume"][row] = payload["volume"]
+
+
+
+    def get_column(self, field):
+        """
+        Retorna um campo numérico de todas as linhas (NaN para linhas livres). Os campos derivados (market cap, P/L e P/VP) são calculados de forma vetorizada.
+
+        Parameters
+        ----------
+        field : str
+            O campo numérico (ver NUMERIC_FIELDS).
+
+        Raises
+        ------
+        ValueError
+            Se o campo não for um campo numérico.
+
+        Returns
+        -------
+        ndarray
+            O array com o campo de cada linha.
+        """
+        columns = self.__columns
+        if field in columns:
+            return columns[field]
+        if field == "market_cap":
+            return columns["price"] * columns["shares_outstanding"]
+        if field == "price_to_earnings":
+            return np.divide(columns["price"], columns["eps"], out=np.zeros_like(columns["price"]), where=columns["eps"] != 0) #0 se o LPA for 0 (mesma regra da classe Stock)
+        if field == "price_to_book":
+            return np.divide(columns["price"], columns["bvps"], out=np.zeros_like(columns["price"]), where=columns["bvps"] != 0)
+        raise ValueError("Argument 'field' must be one of: {}.".format(", ".join(NUMERIC_FIELDS)))
+
+
+
+    def select(self, **criteria):
+        """
+        Seleciona os tickers que atendem a todos os critérios passados.
+
+        Critérios:
+            - campos categóricos (sector, sub_sector, segment, type): um valor ou uma lista de valores aceitos
+            - is_active: bool
+            - campos numéricos (ver NUMERIC_FIELDS): tupla (mínimo, máximo), inclusiva, com None para um lado aberto
+
+        Ex: select(sector="Financeiro", type=["ON", "UNT"], avg_volume=(1e6, None), price_to_earnings=(0, 15))
+
+        Raises
+        ------
+        ValueError
+            Se algum critério não for válido.
+
+        Returns
+        -------
+        set
+            Os tickers selecionados.
+        """
+        with self.__lock:
+            selected = None
+
+            #campos categóricos: intersecção dos conjuntos de cada valor
+            for field, values in criteria.items():
+                if field in CATEGORICAL_FIELDS:
+                    values = [values] if isinstance(values, str) else values
+                    found = set().union(*[self.__categories[field].get(value, set()) for value in values])
+                elif field == "is_active":
+                    found = self.__active if values else set(self.__rows) - self.__active
+                else:
+                    continue
+                selected = set(found) if selected is None else selected & found
+
+            #campos numéricos: máscara vetorizada sobre as linhas ocupadas
+            numeric_criteria = {field: bounds for field, bounds in criteria.items() if field not in CATEGORICAL_FIELDS and field != "is_active"}
+            if len(numeric_criteria) > 0:
+                mask = self.__tickers != None
+                for field, bounds in numeric_criteria.items():
+                    if field not in NUMERIC_FIELDS:
+                        raise ValueError("Invalid selection criterion '{}'.".format(field))
+                    if not isinstance(bounds, tuple) or len(bounds) != 2:
+                        raise ValueError("Numeric criterion '{}' must be a (min, max) tuple.".format(field))
+                    column = self.get_column(field)
+                    if bounds[0] is not None:
+                        mask &= column >= bounds[0]
+                    if bounds[1] is not None:
+                        mask &= column <= bounds[1]
+                found = set(self.__tickers[mask])
+                selected = found if selected is None else selected & found
+
+            if selected is None:
+                return set(self.__rows)
+            return selected
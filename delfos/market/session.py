@@ -1,25 +1,35 @@
 from delfos.market.stock import Stock
+from delfos.market.catalog import TickerCatalog, get_catalog
+from delfos.market.store import HistoryStore
+from delfos.market.selection import StockIndex
+from delfos.market.screening import get_screening_criteria, screen_stocks
 from delfos.common.configs import Configs
+from delfos.common.events import EventHub
+from delfos.common.metrics import get_metrics
+from delfos.common.telemetry import TELEMETRY
+from delfos.common.profiling import profiled
+from delfos.oracle import get_views
 import delfos.common.utils as utils
 from multiprocessing.pool import ThreadPool #package para paralelizar as operações nas ações do pregão
-from pypfopt.black_litterman import BlackLittermanModel
-from pypfopt import risk_models, expected_returns
-from pypfopt import black_litterman #package com os modelos estatísticos de otimização de portfolios
 from functools import reduce, partial #package nativo do python com funções gerais úteis
 from datetime import datetime, timedelta
 from datetime import date as dt
 import pandas as pd
+import pickle
+import io
+import struct
 import time #testes
 
 
 CONFIGS = Configs()
 
-TICKERS_DICT = CONFIGS.TICKERS_DICT #dicionário com os símbolos das ações e suas respectivas infos
 SESSION_FREQ_PER_YEAR = CONFIGS.DEFAULTS["SESSION_FREQ_PER_YEAR"] #número de dias no ano em que o mercado funciona
 BACEN_URL = CONFIGS.URLS["BACEN"] #url para a api do bacen
 BACEN_SELIC_CODE = CONFIGS.CONSTANTS["BACEN_SELIC_CODE"] #código da Selic na api do bacen
 BACEN_SELIC_CUM_CODE = CONFIGS.CONSTANTS["BACEN_SELIC_CUM_CODE"] #código da Selic acumulada na api do bacen
 N_THREADS = CONFIGS.DEFAULTS["N_THREADS"] #número de threads para serem utilizadas
+SNAPSHOT_MAGIC = b"DELFOSSS" #identificador dos arquivos de snapshot do pregão
+SNAPSHOT_VERSION = 2 #versão do formato dos snapshots (snapshots de outras versões não são carregados)
 
 NOW = datetime.now()
 
@@ -29,7 +39,7 @@ class Session():
     Classe que representa um pregão. Possui ações, uma data e um período de análise em anos. A data é o id.
     """
 
-    def __init__(self, date=NOW, period=6, tickers=TICKERS_DICT, index_ticker="^BVSP", risk_free_rate="selic"):
+    def __init__(self, date=NOW, period=6, tickers=None, index_ticker="^BVSP", risk_free_rate="selic", histories=None, fundamentals=None, compact_histories=False, screening=None, metrics=None, threads=None, precomputed=None):
         """
         OBS: Permite que seja passado, ao invés de uma lista, um dicionário com as infos dos tickers, no formato:
                 {
@@ -51,32 +61,95 @@ class Session():
         period : int
             O período em anos para a análise das ações do pregão. (default é 6 anos)
         tickers : list ou dict
-            Os tickers das ações do pregão. (default é o dicionário de ações da B3)
+            Os tickers das ações do pregão. (default é None, o dicionário de ações da B3)
         index_ticker : str
             O ticker do índice de mercado, que deve ser igual a como está no yahoo finance. (default é o ibovespa)
         risk_free_rate : str ou float
             A taxa livre de risco do mercado (default é a selic)
+        histories : dict ou HistoryStore
+            Históricos já gravados das ações e do índice de mercado, no formato {ticker: DataFrame} ou um arquivo de históricos mapeado em memória. Se passado, nenhum histórico é baixado
+            e as ações que não estiverem nos históricos são removidas da sessão. Com um HistoryStore, os históricos das ações são views sobre o arquivo (sem cópia). (default é None, todos os históricos são baixados)
+        fundamentals : dict
+            Dados fundamentalistas já gravados das ações, no formato {ticker: {'shares_outstanding': int, 'equity': float, 'earnings': float}}.
+            Só é usado junto com 'histories'. As ações que não estiverem no dicionário ficam com os dados fundamentalistas zerados. (default é None)
+        compact_histories : bool
+            Se verdadeiro, guarda os históricos das ações de forma enxuta (preços em float32, volume inteiro e dividendos/desdobramentos esparsos). (default é False)
+        screening : dict ou bool
+            Critérios da triagem de liquidez, atividade e tempo de listagem, aplicada depois do download dos históricos e antes do download dos dados fundamentalistas.
+            As ações excluídas são removidas da sessão (ver 'screened_tickers'). Os critérios passados substituem os de default das configurações; False desliga a triagem.
+            (default é None, os critérios das configurações, que não excluem nenhuma ação)
+        metrics : Metrics, bool ou str
+            Métricas de tempo e contadores das etapas de criação do pregão (api do yfinance, scraper do Yahoo Finance, Fundamentus, correção dos splits, fila do pool de threads, triagem),
+            por ticker e agregadas. Pode ser um objeto Metrics (ex: compartilhado entre pregões), True (novas métricas em memória) ou o caminho de um arquivo json em que as métricas são gravadas
+            ao fim da criação do pregão e de cada update do modelo de alocação. (default é None, métricas desligadas)
+        threads : int
+            O número de threads que baixam ou setam os históricos e os dados fundamentalistas das ações. (default é None, o número das configurações)
+        precomputed : dict
+            Artefatos pré-calculados na noite anterior para a data do pregão (ver 'delfos.market.precompute'): a tabela de preços de fechamento, a covariância Ledoit-Wolf
+            e o preço de risco do mercado são usados sem recálculo, e as ações ativas são as que negociaram no último pregão fechado. Usado junto com 'histories'.
+            (default é None, tudo é calculado)
+
+        OBS: Para uma sessão totalmente offline, passe 'histories' e uma taxa livre de risco em float (a selic é baixada da api do bacen).
 
         Raises
         ------
         TypeError
             Se os parâmetros não baterem com seus respectivos tipos.
+        ValueError
+            Se o número de threads for menor que 1 ou se os artefatos pré-calculados não forem da data do pregão.
         """
         #checando se os tipos dos parâmetros estão corretos
         if not isinstance(date, datetime):
             raise TypeError("Argument 'date' must be a datetime object.")
         if not isinstance(period, int):
             raise TypeError("Argument 'period' must be an integer.")
+        if tickers is None:
+            tickers = CONFIGS.TICKERS_DICT #dicionário com os símbolos das ações e suas respectivas infos (lido só no primeiro uso)
         if not isinstance(tickers, (list, dict)):
             raise TypeError("Argument 'tickers' must be a dictionary or a list.")
-
+        if histories is not None and not isinstance(histories, (dict, HistoryStore)):
+            raise TypeError("Argument 'histories' must be a dictionary or a HistoryStore.")
+        if fundamentals is not None and not isinstance(fundamentals, dict):
+            raise TypeError("Argument 'fundamentals' must be a dictionary.")
+        if not isinstance(compact_histories, bool):
+            raise TypeError("Argument 'compact_histories' must be a boolean.")
+        if threads is not None and not isinstance(threads, int):
+            raise TypeError("Argument 'threads' must be an integer.")
+        if threads is not None and threads < 1:
+            raise ValueError("Argument 'threads' must be greater than 0.")
+        if precomputed is not None and not isinstance(precomputed, dict):
+            raise TypeError("Argument 'precomputed' must be a dictionary.")
+        if precomputed is not None and precomputed["next_date"] != date.date():
+            raise ValueError("Precomputed artifacts apply to {}, not to the session date {}.".format(precomputed["next_date"], date.date()))
+
+        self.__metrics = get_metrics(metrics) #métricas das etapas do pregão (no-ops, se desligadas)
         self.__date = date
         self.__period = period
-        self.set_market_index(index_ticker)
-        self.set_risk_free_rate(risk_free_rate)
-        self.__stocks = {} #dict com todas as ações do pregão
-        self.__active_stocks = {} #dict com as ações ativas durante o pregão (otimiza updates enquanto mantém as inativas para portfolios que as tenham)
-        self.__set_stocks(tickers) #popula os dicionários de ações com os tickers e os respectivos objtos Stock
+        self.__threads = threads if threads is not None else N_THREADS #número de threads do pool que seta as ações
+        self.__events = EventHub(("price", "bar", "allocation")) #hub dos eventos do pregão (ao vivo das ações e refresh da alocação)
+        self.__histories = histories #históricos gravados (None se os históricos devem ser baixados)
+        self.__fundamentals = fundamentals if fundamentals is not None else {} #dados fundamentalistas gravados
+        self.__compact_histories = compact_histories #se os históricos das ações são guardados de forma enxuta
+        self.__screening = get_screening_criteria(screening) #critérios da triagem do universo (None se desligada)
+        self.__screened_tickers = [] #tickers excluídos pela triagem
+        self.__active_date = precomputed["date"] if precomputed is not None else None #data do último pregão fechado, se o pregão foi montado de artefatos pré-calculados
+        self.__covariances_precomputed = False #se a covariância atual veio dos artefatos pré-calculados (não é recalculada)
+        self.__precomputed_risk_aversion = None #preço de risco do mercado pré-calculado
+        with self.__metrics.timer("session.build"):
+            with self.__metrics.timer("session.market_index"):
+                self.set_market_index(index_ticker)
+            with self.__metrics.timer("session.risk_free_rate"):
+                self.set_risk_free_rate(risk_free_rate)
+            self.__stocks = {} #dict com todas as ações do pregão
+            self.__active_stocks = {} #dict com as ações ativas durante o pregão (otimiza updates enquanto mantém as inativas para portfolios que as tenham)
+            self.__index = StockIndex() #índices de seleção das ações (ver 'select_tickers')
+            self.__set_stocks(tickers) #popula os dicionários de ações com os tickers e os respectivos objtos Stock
+            if precomputed is not None:
+                with self.__metrics.timer("session.precomputed"):
+                    self.__set_precomputed(precomputed)
+        self.__index_subscribed = False #se os índices de seleção estão inscritos nos preços ao vivo (só enquanto houver outros inscritos, ver 'subscribe')
+        self.__streams_num = 0 #número de streams abertos do pregão
+        self.__metrics.flush()
         #self.set_price_streamer()
 
 #--------------------------------------- GETTERS ---------------------------------------------------------#
@@ -105,6 +178,10 @@ class Session():
     def inactive_tickers(self):
         return list(set(self.__stocks.keys()) - set(self.__active_stocks.keys()))
 
+    @property
+    def screened_tickers(self):
+        return list(self.__screened_tickers) #tickers excluídos pela triagem de liquidez, atividade e tempo de listagem
+
     @property
     def stocks_num(self):
         return len(self.__stocks)
@@ -145,9 +222,98 @@ class Session():
     def market_implied_rets(self):
         return self.get_market_implied_rets()
 
+    @property
+    def allocation_drift(self):
+        return self.get_allocation_drift()
+
+    @property
+    def allocation_time(self):
+        return self.get_allocation_time()
+
+    @property
+    def memory_usage(self):
+        return self.get_memory_usage()
+
+    @property
+    def metrics(self):
+        return self.__metrics #métricas das etapas do pregão (ver 'Metrics.get_summary')
+
+    @property
+    def telemetry(self):
+        return TELEMETRY #telemetria de rede por upstream, compartilhada pelo processo (ver 'Telemetry.get_stats')
+
 #---------------------------------------------------------------------------------------------------------#
 
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        #a fonte dos históricos (dicionário ou HistoryStore) não faz parte do estado: os históricos das ações já estão nos objetos Stock
+        state["_Session__histories"] = None
+        return state
+
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__index_subscribed = False #as inscrições não são serializadas
+        self.__streams_num = 0
+
+
+
+    def save(self, path):
+        """
+        Grava o estado completo do pregão em um snapshot binário versionado: ações, históricos, dados fundamentalistas, ações ativas,
+        série da taxa livre de risco, índice de mercado e as tabelas e pesos já calculados. (ver 'load')
+
+        OBS: As inscrições em eventos e a fonte dos históricos passada na criação (dicionário ou HistoryStore) não são gravadas.
+
+        Parameters
+        ----------
+        path : str ou Path
+            O caminho do arquivo.
+        """
+        with open(path, "wb") as snapshot_file:
+            snapshot_file.write(SNAPSHOT_MAGIC + struct.pack("<I", SNAPSHOT_VERSION))
+            pickle.dump(self, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+
+    @classmethod
+    def load(cls, path):
+        """
+        Carrega um pregão de um snapshot gravado pelo método 'save'. Nenhum download é feito.
+
+        OBS: O snapshot é um pickle, então só devem ser carregados snapshots de origem confiável.
+
+        Parameters
+        ----------
+        path : str ou Path
+            O caminho do arquivo.
+
+        Raises
+        ------
+        ValueError
+            Se o arquivo não for um snapshot de pregão ou se a versão não for suportada.
+
+        Returns
+        -------
+        Session
+            O pregão carregado.
+        """
+        with open(path, "rb") as snapshot_file:
+            magic = snapshot_file.read(len(SNAPSHOT_MAGIC))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("File '{}' is not a session snapshot.".format(path))
+            version = struct.unpack("<I", snapshot_file.read(4))[0]
+            if version != SNAPSHOT_VERSION:
+                raise ValueError("Session snapshot version {} is not supported (expected {}).".format(version, SNAPSHOT_VERSION))
+            session = pickle.load(snapshot_file)
+        if not isinstance(session, cls):
+            raise ValueError("File '{}' is not a session snapshot.".format(path))
+        return session
+
+
+
     def set_market_index(self, index_ticker):
         """
         Guarda a ação do ticker passado por parâmetro como o índice do mercado.
@@ -169,9 +335,14 @@ class Session():
 
         self.__market_index = Stock(index_ticker, analysis_date=self.__date) #seta a ação como índice do mercado
         try:
-            success = self.__market_index.download_history(self.__period)
+            if self.__histories is not None:
+                success = self.__market_index.set_history(self.__histories[index_ticker], self.__period, copy=not isinstance(self.__histories, HistoryStore), active_date=self.__active_date) if index_ticker in self.__histories else False #usa o histórico gravado
+            else:
+                success = self.__market_index.download_history(self.__period, self.__metrics)
             if success == False:
                 self.__market_index = None
+            elif self.__compact_histories:
+                self.__market_index.compact_history()
         except:
             raise ValueError("Invalid index ticker.")
 
@@ -198,8 +369,8 @@ class Session():
         if isinstance(risk_free_rate, str):
             if risk_free_rate == "selic":
                 try:
-                    selic_time_series = pd.read_json(BACEN_URL.format(BACEN_SELIC_CUM_CODE)) #faz o download da série temporal da selic pela api do bacen (1986 - hoje)
-                    current_selic = pd.read_json(BACEN_URL.format(BACEN_SELIC_CODE))
+                    selic_time_series = pd.read_json(io.StringIO(TELEMETRY.get("bacen", BACEN_URL.format(BACEN_SELIC_CUM_CODE)).text)) #faz o download da série temporal da selic pela api do bacen (1986 - hoje)
+                    current_selic = pd.read_json(io.StringIO(TELEMETRY.get("bacen", BACEN_URL.format(BACEN_SELIC_CODE)).text))
 
                     selic_time_series.index = selic_time_series["data"] #transforma a coluna com a data no index do dataframe
                     selic_time_series.index = pd.to_datetime(selic_time_series.index) #converte o index para datetime
@@ -230,33 +401,74 @@ class Session():
 
 
 
-    def __set_stocks_aux(self, stock):
+    def __set_history_aux(self, stock, submitted=None):
         """
-        Método auxiliar para paralelizar o método 'set_stocks'.
-        Atualiza os dicts com as ações do pregão (atributos 'stocks' e 'active_stocks'). (formato é {ticker: Stock})
+        Método auxiliar para paralelizar a primeira fase do método 'set_stocks': seta o histórico da ação (gravado ou baixado).
 
         Parameters
         ----------
         stock : Stock
-            O objeto Stock cujo o histórico e os dados fundamentalistas devem ser setados.
+            O objeto Stock cujo o histórico deve ser setado.
+        submitted : float
+            O instante (time.perf_counter) em que a tarefa foi enviada ao pool de threads, para medir o tempo na fila. (default é None, não mede)
 
         Returns
         -------
         str ou None
-            O ticker da ação, se esta não estiver ativa no pregão ou None, caso esteja.
+            O ticker da ação, se o histórico falhou ou None, caso contrário.
         """
-        success = stock.download_history(self.__period)
+        metrics = self.__metrics
+        if submitted is not None and metrics.enabled:
+            metrics.add_time("history.queue_wait", time.perf_counter() - submitted, stock.ticker)
+
+        with metrics.timer("history.total", stock.ticker):
+            if self.__histories is not None:
+                #usa os dados gravados ao invés de baixá-los
+                with metrics.timer("history.recorded", stock.ticker):
+                    success = stock.ticker in self.__histories and stock.set_history(self.__histories[stock.ticker], self.__period, copy=not isinstance(self.__histories, HistoryStore), active_date=self.__active_date)
+            else:
+                success = stock.download_history(self.__period, metrics)
 
-        if success == True:
-            stock.download_fundamental_data() #tenta baixar os dados fundamentalistas
-            if stock.is_active:
-                self.__active_stocks[stock.ticker] = stock #atualiza o dicionário de ações ativas do pregão
-            self.__stocks[stock.ticker] = stock #atualiza o dicionário de ações do pregão
-        else:
-            return stock.ticker #retorna o ticker como inválido
+            if success == True:
+                if self.__compact_histories:
+                    with metrics.timer("history.compact", stock.ticker):
+                        stock.compact_history()
+            else:
+                metrics.increment("tickers.invalid", ticker=stock.ticker)
+                return stock.ticker #retorna o ticker como inválido
+
+
+
+    def __set_stocks_aux(self, stock, submitted=None):
+        """
+        Método auxiliar para paralelizar a segunda fase do método 'set_stocks', só para as ações que passaram pela triagem: seta os dados fundamentalistas (gravados ou baixados).
+        Atualiza os dicts com as ações do pregão (atributos 'stocks' e 'active_stocks'). (formato é {ticker: Stock})
 
+        Parameters
+        ----------
+        stock : Stock
+            O objeto Stock, já com o histórico, cujo os dados fundamentalistas devem ser setados.
+        submitted : float
+            O instante (time.perf_counter) em que a tarefa foi enviada ao pool de threads, para medir o tempo na fila. (default é None, não mede)
+        """
+        metrics = self.__metrics
+        if submitted is not None and metrics.enabled:
+            metrics.add_time("fundamentals.queue_wait", time.perf_counter() - submitted, stock.ticker)
+
+        with metrics.timer("fundamentals.total", stock.ticker):
+            if self.__histories is not None:
+                stock.set_fundamental_data(**self.__fundamentals.get(stock.ticker, {}))
+            else:
+                stock.download_fundamental_data(metrics=metrics) #tenta baixar os dados fundamentalistas
+
+        stock.attach_event_hub(self.__events) #os eventos ao vivo da ação também são publicados no hub do pregão
+        if stock.is_active:
+            self.__active_stocks[stock.ticker] = stock #atualiza o dicionário de ações ativas do pregão
+        self.__stocks[stock.ticker] = stock #atualiza o dicionário de ações do pregão
 
 
+
+    @profiled("session.set_stocks")
     def __set_stocks(self, tickers):
         """
         Atualiza os dicts com as ações do pregão (atributos 'stocks' e 'active_stocks'). (formato é {ticker: Stock})
@@ -268,27 +480,50 @@ class Session():
         """
         #utils.block_print() #bloqueia prints (para não printar indesejadamente mensagens do package yfinance)
 
-        #se tickers for um dicionário ao invés de lista
-        if isinstance(tickers, dict):
-            tickers_data = tickers
-            tickers = list(tickers.keys())
+        metrics = self.__metrics
 
-        for ticker in tickers:
-            if ticker not in self.__stocks:
-                #tenta acessar os dados da ação no um dicionário com as infos
-                try:
-                    self.__stocks.update({ticker:Stock(ticker, self.__date, tickers_data[ticker]["Nome"], tickers_data[ticker]["Setor"], tickers_data[ticker]["Sub Setor"], tickers_data[ticker]["Segmento"], tickers_data[ticker]["CNPJ"])})
-                except:
-                    self.__stocks.update({ticker:Stock(ticker, self.__date)})
-
-        #para cada ticker e objeto stock no dicionario de ações, baixar seu histórico e descobrir se a ação estava ativa no pregão
-        pool = ThreadPool(processes=N_THREADS) #alocando 12 processos para setar os históricos das ações
-        invalid_tickers = pool.map(self.__set_stocks_aux, self.select_stocks(tickers)) #parallel for para cada ação da sessão
-        pool.close()
-        pool.join()
-
-        invalid_tickers = list(filter(None, invalid_tickers)) #filtra os Nones correspondentes aos tickers que não falharam
-        self.remove_stocks(invalid_tickers) #remove da sessão as ações que falaharam no sucesso da operação
+        #as infos fixas dos tickers vêm do catálogo (o da B3, ou um criado a partir do dicionário passado)
+        with metrics.timer("stocks.catalog"):
+            if isinstance(tickers, dict):
+                catalog = get_catalog() if tickers is CONFIGS.TICKERS_DICT else TickerCatalog(tickers)
+                tickers = list(tickers.keys())
+            else:
+                catalog = get_catalog()
+
+            for ticker in tickers:
+                if ticker not in self.__stocks:
+                    info = catalog.get(ticker)
+                    if info is not None:
+                        self.__stocks[ticker] = Stock(ticker, self.__date, info["company"], info["sector"], info["sub_sector"], info["segment"], info["cnpj"])
+                    else:
+                        self.__stocks[ticker] = Stock(ticker, self.__date) #ticker fora do catálogo, sem infos fixas
+
+        pool = ThreadPool(processes=self.__threads) #alocando as threads para setar os dados das ações
+
+        #fase 1: para cada ação, baixar seu histórico e descobrir se a ação estava ativa no pregão
+        with metrics.timer("stocks.histories"):
+            invalid_tickers = pool.map(partial(self.__set_history_aux, submitted=time.perf_counter()), self.select_stocks(tickers)) #parallel for para cada ação da sessão
+            invalid_tickers = list(filter(None, invalid_tickers)) #filtra os Nones correspondentes aos tickers que não falharam
+            self.remove_stocks(invalid_tickers) #remove da sessão as ações que falaharam no sucesso da operação
+
+        #triagem vetorizada de liquidez, atividade e tempo de listagem sobre todo o universo (só com os históricos)
+        with metrics.timer("stocks.screening"):
+            screened_tickers = screen_stocks(self.select_stocks(tickers), self.__date, self.__screening)
+            self.remove_stocks(screened_tickers)
+            self.__screened_tickers += screened_tickers
+        for ticker in screened_tickers:
+            metrics.increment("tickers.screened", ticker=ticker)
+
+        #fase 2: dados fundamentalistas só para as ações que passaram pela triagem
+        with metrics.timer("stocks.fundamentals"):
+            pool.map(partial(self.__set_stocks_aux, submitted=time.perf_counter()), self.select_stocks(tickers))
+            pool.close()
+            pool.join()
+
+        added_stocks = self.select_stocks(tickers)
+        with metrics.timer("stocks.index"):
+            self.__index.add(added_stocks) #indexa as ações adicionadas
+        metrics.increment("tickers.added", len(added_stocks))
         #utils.enable_print()
 
 
@@ -319,7 +554,7 @@ class Session():
 
 
 
-    def select_stocks(self, tickers="all"):
+    def select_stocks(self, tickers="all", **criteria):
         """
         Cria uma lista com os objetos Stock da sessão, cujo os tickers forem passados por parâmetro.
         Se apenas um ticker for passado como parâmetro na forma de string, retorna o objeto Stock equivalente.
@@ -327,10 +562,15 @@ class Session():
         Se tickers for 'all' retorna todas as ações da sessão.
         Se tickers for 'active' retorna as ações ativas da sessão.
 
+        Se critérios forem passados, só retorna as ações que também atendam a todos eles. (ver 'select_tickers')
+        Ex: select_stocks("active", sector="Financeiro", market_cap=(1e10, None))
+
         Parameters
         ----------
         tickers : list ou str
             A lista de tickers cujo os objeto stocks devem ser selecionados. (default é todos os tickers do pregão)
+        **criteria
+            Critérios de seleção por campos categóricos e numéricos das ações. (ver 'select_tickers')
 
         Raises
         ------
@@ -346,24 +586,104 @@ class Session():
         if not isinstance(tickers, (str, list)):
             raise TypeError("Argument 'tickers' must be a list or a string.")
 
+        selected = self.select_tickers(**criteria) if len(criteria) > 0 else None #tickers que atendem aos critérios (None se não houver critérios)
+
         if tickers == "all":
-            return list(self.__stocks.values()) #se tickers for 'all', retorna todas as ações da sessão
+            stocks = self.__stocks #se tickers for 'all', retorna todas as ações da sessão
         elif tickers == "active":
-            return list(self.__active_stocks.values()) #se tickers for 'active', retorna todas as ações ativas da sessão
+            stocks = self.__active_stocks #se tickers for 'active', retorna todas as ações ativas da sessão
         else:
             #se tickers for uma string
             if isinstance(tickers, str):
-                if tickers in self.__stocks:
+                if tickers in self.__stocks and (selected is None or tickers in selected):
                     return self.__stocks[tickers] #retorna apenas o objeto stock do ticker
                 else:
                     return []
             else:
                 selected_stocks = []
                 for ticker in tickers:
-                    if ticker in self.__stocks:
+                    if ticker in self.__stocks and (selected is None or ticker in selected):
                         selected_stocks.append(self.__stocks[ticker]) #adiciona a lista de ações selecionadas o objeto Stock correspondente ao ticker
                 return selected_stocks
 
+        if selected is None:
+            return list(stocks.values())
+        return [stock for ticker, stock in stocks.items() if ticker in selected]
+
+
+
+    def select_tickers(self, **criteria):
+        """
+        Seleciona os tickers das ações da sessão que atendem a todos os critérios passados, usando os índices de seleção do pregão
+        (conjuntos por valor para os campos categóricos e comparações vetorizadas para os numéricos). Os índices são atualizados ao adicionar/remover ações e a cada lote de novos preços.
+
+        Critérios:
+            - sector, sub_sector, segment, type: um valor ou uma lista de valores aceitos
+            - is_active: bool
+            - price, volume, avg_volume, shares_outstanding, market_cap, eps, bvps, roe, price_to_earnings, price_to_book: tupla (mínimo, máximo), inclusiva, com None para um lado aberto
+
+        OBS: avg_volume é a média de volume dos últimos 21 pregões. (ver 'AVG_VOLUME_WINDOW' nas configurações)
+
+        Ex: select_tickers(type=["ON", "PN"], avg_volume=(1e6, None), price_to_earnings=(0, 15))
+
+        Raises
+        ------
+        ValueError
+            Se algum critério não for válido.
+
+        Returns
+        -------
+        set
+            Os tickers selecionados. (todos os tickers da sessão, se nenhum critério for passado)
+        """
+        if not self.__index_subscribed:
+            #sem inscritos nos preços ao vivo, os eventos são descartados: os preços dos índices são lidos das ações na hora da seleção
+            self.__index.update_prices([{"ticker": ticker, "price": stock.current_price, "volume": stock.current_volume} for ticker, stock in self.__stocks.items()])
+        return self.__index.select(**criteria)
+
+
+
+    def select_closing_prices(self, tickers=None, **criteria):
+        """
+        Seleciona as colunas da tabela de preços de fechamento para os tickers passados e/ou os que atendem aos critérios. (ver 'select_tickers')
+        Se as colunas selecionadas forem um trecho contínuo da tabela, o resultado é uma view (sem cópia); se não, as colunas são copiadas.
+
+        Parameters
+        ----------
+        tickers : list
+            Os tickers das colunas. (default é None, todos os tickers da tabela)
+        **criteria
+            Critérios de seleção por campos categóricos e numéricos das ações. (ver 'select_tickers')
+
+        Returns
+        -------
+        DataFrame
+            As colunas selecionadas, na ordem da tabela de preços de fechamento.
+        """
+        closing_prices_table = self.closing_prices_table
+        selected = set(closing_prices_table.columns) if tickers is None else set(tickers)
+        if len(criteria) > 0:
+            selected &= self.select_tickers(**criteria)
+        positions = [i for i, ticker in enumerate(closing_prices_table.columns) if ticker in selected]
+
+        if len(positions) > 0 and positions[-1] - positions[0] + 1 == len(positions):
+            return closing_prices_table.iloc[:, positions[0]:positions[-1] + 1] #trecho contínuo: view
+        return closing_prices_table.iloc[:, positions]
+
+
+
+    def update_selection_index(self, tickers="all"):
+        """
+        Reindexa as ações passadas nos índices de seleção (ex: depois de alterar os dados fundamentalistas de uma ação).
+
+        Parameters
+        ----------
+        tickers : list ou str
+            Os tickers das ações. (default é todos os tickers do pregão)
+        """
+        stocks = self.select_stocks(tickers)
+        self.__index.add(stocks if isinstance(stocks, list) else [stocks])
+
 
 
     def add_stocks(self, tickers):
@@ -400,6 +720,7 @@ class Session():
         #se tickers for uma string
         if isinstance(tickers, str):
             tickers = [tickers]
+        self.__covariances_precomputed = False #a covariância pré-calculada não tem as ações novas
         self.__set_stocks(tickers) #adiciona a ação às ações da sessão
 
 
@@ -431,20 +752,74 @@ class Session():
             if ticker in self.__stocks:
                 if ticker in self.__active_stocks:
                     self.__active_stocks.pop(ticker)
-                self.__stocks.pop(ticker)
+                self.__stocks.pop(ticker).detach_event_hub(self.__events)
+        self.__index.remove(tickers)
 
 
 
+    @profiled("session.closing_prices_table")
     def __set_closing_prices_table(self):
         """
         Cria um dataframe com os preços de fechamento das ações do pregão, durante o período de análise. Index = data e Coluna = Ticker.
+        Se os históricos vierem de um HistoryStore, a tabela sai direto do arquivo (view sem cópia, se as ações forem um trecho contínuo do arquivo).
         """
-        closing_prices_series = []
-        for ticker, stock in self.__stocks.items():
-            closing_prices_series.append(stock.history["Close"].rename(ticker)) #colocando o pd.Series da ação na lista, renomeando a série de 'Close' para o ticker
-        self.__closing_prices_table = reduce(lambda x, y: pd.merge(x, y, left_index=True, right_index=True, how='outer'), closing_prices_series) #concatenando todas as pd.Series (colunas) em um único dataframe
-        self.__closing_prices_table = self.__closing_prices_table[~self.__closing_prices_table.index.duplicated(keep="first")] #retira todas as ocorrências repetidas no index, deixando apenas a primeira
-        self.__closing_prices_table = self.__closing_prices_table.fillna(method='ffill') #substui os NaNs do dataframe com o último preço válido (se não existir, continua NaN)
+        with self.__metrics.timer("closing_prices_table"):
+            if isinstance(self.__histories, HistoryStore) and self.__stocks_from_store():
+                self.__closing_prices_table = self.__histories.get_closing_prices(self.__date, self.__period, self.tickers)
+                return
+
+            closing_prices_series = []
+            for ticker, stock in self.__stocks.items():
+                closing_prices_series.append(stock.history["Close"].rename(ticker)) #colocando o pd.Series da ação na lista, renomeando a série de 'Close' para o ticker
+            self.__closing_prices_table = reduce(lambda x, y: pd.merge(x, y, left_index=True, right_index=True, how='outer'), closing_prices_series) #concatenando todas as pd.Series (colunas) em um único dataframe
+            self.__closing_prices_table = self.__closing_prices_table[~self.__closing_prices_table.index.duplicated(keep="first")] #retira todas as ocorrências repetidas no index, deixando apenas a primeira
+            self.__closing_prices_table = self.__closing_prices_table.fillna(method='ffill') #substui os NaNs do dataframe com o último preço válido (se não existir, continua NaN)
+
+
+
+    def __set_precomputed(self, precomputed):
+        """
+        Usa os artefatos pré-calculados na tabela de preços de fechamento, na covariância e no preço de risco do mercado do pregão.
+        A covariância só é usada se tiver todas as ações do pregão (se não, é recalculada no próximo update do modelo de alocação).
+
+        Parameters
+        ----------
+        precomputed : dict
+            Os artefatos pré-calculados. (ver 'delfos.market.precompute')
+        """
+        tickers = self.tickers
+        closing_prices_table = precomputed["closing_prices_table"]
+        if set(tickers).issubset(closing_prices_table.columns):
+            self.__closing_prices_table = closing_prices_table[tickers]
+        covariances_table = precomputed["covariances_table"]
+        if set(tickers).issubset(covariances_table.columns):
+            self.__covariances_table = covariances_table.loc[tickers, tickers]
+            self.__covariances_precomputed = True
+        self.__precomputed_risk_aversion = precomputed["risk_aversion"]
+
+
+
+    def __stocks_from_store(self):
+        """
+        Checa se os históricos de todas as ações do pregão ainda são as views do HistoryStore (nenhum foi alterado pelo caminho ao vivo ou enxugado).
+        """
+        return all(stock.history_is_view for stock in self.__stocks.values())
+
+
+
+    def get_histories(self):
+        """
+        Cria um dicionário com os históricos das ações e do índice de mercado do pregão. Pode ser gravado em um HistoryStore (ver 'delfos.market.store.write_history_store').
+
+        Returns
+        -------
+        dict
+            Dicionário no formato {ticker: DataFrame}.
+        """
+        histories = {ticker: stock.history for ticker, stock in self.__stocks.items()}
+        if self.__market_index is not None:
+            histories[self.__market_index.ticker] = self.__market_index.history
+        return histories
 
 
 
@@ -466,15 +841,23 @@ class Session():
 
 
 
+    @profiled("session.covariances_table")
     def __set_covariances_table(self):
         """
         Cria, a partir dos preços de fechamento, um dataframe com a matriz de covariância Ledoit-Wolf reduzida, referente as ações do pregão.
 
         OBS: A covariância é anualizada (referente aos retornos anualizados).
         """
+        if self.__covariances_precomputed:
+            return #a covariância dos artefatos pré-calculados já é a dos preços de fechamento do pregão
+
+        from pypfopt import risk_models #package com os modelos estatísticos de otimização de portfolios (import pesado, feito só no primeiro uso)
+
         #utilizao o módulo risk_models da lib PyPortfolioOpt para calcular a matriz de covariância
-        covariance_calculator = risk_models.CovarianceShrinkage(prices=self.closing_prices_table, frequency=SESSION_FREQ_PER_YEAR)
-        self.__covariances_table = covariance_calculator.ledoit_wolf()
+        closing_prices_table = self.closing_prices_table
+        with self.__metrics.timer("covariances_table"):
+            covariance_calculator = risk_models.CovarianceShrinkage(prices=closing_prices_table, frequency=SESSION_FREQ_PER_YEAR)
+            self.__covariances_table = covariance_calculator.ledoit_wolf()
 
 
 
@@ -498,14 +881,15 @@ class Session():
 
 
 
-    def update_allocation_model(self, tickers="all"):
+    @profiled("session.update_allocation_model")
+    def update_allocation_model(self, tickers="all", views=None, confidences=None):
         """
         Cria um dicionário ordenado onde cada ticker de entrada é uma key e o valor é o seu peso de compra no mercado. Armazena no atributo 'buy_weights'.
         Cria uma série (pd.Series) onde cada ticker de entrada é uma linha e o valor é o retorno esperado pelo modelo. Armazena no atributo 'market_implied_rets'.
 
         O peso e o retorno esperado são calculados de acordo com o Modelo Black Litterman, que utiliza uma abordagem bayesiana para alocar os ativos.
         O retorno esperado para cada ação (sem inputs de previsões) é o risco com o qual a ação contribui para o mercado multiplicado pelo premium do risco (delta).
-        É possível utilizar previsões futuras de cada ação para compor a alocação.
+        É possível utilizar previsões futuras de cada ação para compor a alocação (views), passadas diretamente ou geradas pelos sinais do oracle (ver 'delfos.oracle').
 
         OBS: O modelo não prevê resultados individuais das ações, apenas combina dados gerais do mercado e previsões já realizadas das ações para alocar ativos.
         OBS: Todos os retornos esperados, de input e output, são anualizados
@@ -514,17 +898,32 @@ class Session():
         ----------
         tickers : list ou str
             A lista com todos os tickers que devem ser considerados pelo modelo de alocação de ativos. (default são todos os tickers do pregão)
+        views : dict ou str
+            Views absolutas do modelo, no formato {ticker: retorno esperado anualizado}, ou 'oracle' para gerar as views e as confianças pelos sinais
+            do oracle (momentum, reversão à média e momentum escalado pela volatilidade) sobre a tabela de preços de fechamento. Views de tickers fora do modelo são ignoradas.
+            (default é None, sem views: o modelo reproduz os pesos do mercado)
+        confidences : dict
+            Confianças das views, no formato {ticker: confiança entre 0 e 1}, usadas pelo método de Idzorek. Deve ter todos os tickers das views.
+            Ignorado com views='oracle'. (default é None, a incerteza das views é proporcional à variância de cada ação)
 
         Raises
         ------
         TypeError
-            Caso 'tickers' não seja uma lista.
+            Caso 'tickers' não seja uma lista ou os parâmetros das views não sejam dicionários.
         ValueError
-            Caso 'tickers' seja uma string e não seja igual a 'all' ou 'active'.
+            Caso 'tickers' seja uma string e não seja igual a 'all' ou 'active', 'views' seja uma string diferente de 'oracle', ou falte a confiança de alguma view.
         """
-        #valida o tipo do parâmetro
+        #valida o tipo dos parâmetros
         if not isinstance(tickers, (list, str)):
             raise TypeError("Argument 'tickers' must be a list or a string.")
+        if views is not None and not isinstance(views, (dict, str)):
+            raise TypeError("Argument 'views' must be a dictionary or a string.")
+        if isinstance(views, str) and views != "oracle":
+            raise ValueError("Argument 'views' can only be a string if it's equal to 'oracle'.")
+        if confidences is not None and not isinstance(confidences, dict):
+            raise TypeError("Argument 'confidences' must be a dictionary.")
+
+        from pypfopt import black_litterman #package com os modelos estatísticos de otimização de portfolios (import pesado, feito só no primeiro uso)
 
         self.__set_covariances_table() #atualiza a tabela de covariância das ações
 
@@ -540,12 +939,14 @@ class Session():
         covariances_table = self.__covariances_table.filter(items=tickers, axis=1) #filtra as colunas da tabela de covariancias para os tickers passados
         covariances_table = covariances_table.filter(items=tickers, axis=0) #filtra as linhas da tabela de covariancias para os tickers passados
 
-        mcaps = {ticker:self.__stocks[ticker].market_cap for ticker in tickers} #dicionario com os market caps das ações do pregão
         #kurtosis = {ticker:self.__stocks[ticker].history["Close"].pct_change().dropna(how="all").kurtosis() for ticker in tickers}
         #views = expected_returns.mean_historical_return(self.__closing_prices_table.filter(items=tickers, axis=1), frequency=SESSION_FREQ_PER_YEAR) #teste
 
         #calcula o preço de risco do mercado, com base nos preços de fechamento do índice de mercado (iBovespa) e na taxa livre de risco (selic)
-        delta = black_litterman.market_implied_risk_aversion(self.__market_index.history["Close"], frequency=SESSION_FREQ_PER_YEAR) #o preço de risco do mercado é utilizado para estimar os retornos de cada ação, com base em seus históricos
+        if self.__precomputed_risk_aversion is not None:
+            delta = self.__precomputed_risk_aversion #preço de risco dos artefatos pré-calculados (mesmo histórico do índice)
+        else:
+            delta = black_litterman.market_implied_risk_aversion(self.__market_index.history["Close"], frequency=SESSION_FREQ_PER_YEAR) #o preço de risco do mercado é utilizado para estimar os retornos de cada ação, com base em seus históricos
 
         """
         #------TESTES------
@@ -557,13 +958,133 @@ class Session():
         #------------------
         """
 
+        #guarda a covariância e o preço de risco, que são reaproveitados nos refresh intradiários do modelo (ver 'refresh_allocation_prior')
+        self.__allocation_tickers = list(covariances_table.columns)
+        self.__allocation_covariances = covariances_table
+        self.__allocation_risk_aversion = delta
+
+        #views do modelo: geradas pelos sinais do oracle (sobre o prior implicado pelo mercado) ou passadas diretamente
+        if views == "oracle":
+            with self.__metrics.timer("allocation_signals"):
+                mcaps = {ticker:self.__stocks[ticker].market_cap for ticker in self.__allocation_tickers}
+                prior = black_litterman.market_implied_prior_returns(mcaps, delta, covariances_table, self.__risk_free_rate)
+                views, confidences = get_views(self.get_closing_prices_table().filter(items=self.__allocation_tickers, axis=1), prior)
+        elif views is not None:
+            views = {ticker: float(view) for ticker, view in views.items() if ticker in covariances_table.columns}
+            if confidences is not None:
+                missing = [ticker for ticker in views if ticker not in confidences]
+                if len(missing) > 0:
+                    raise ValueError("Argument 'confidences' is missing the views of: {}.".format(", ".join(missing)))
+        self.__allocation_views = views if views is not None else {}
+        self.__allocation_confidences = confidences if views is not None else None
+
+        self.__fit_allocation_model()
+        self.__metrics.flush()
+
+
+
+    def __fit_allocation_model(self):
+        """
+        Ajusta o modelo Black Litterman com a covariância e o preço de risco guardados no último update do modelo de alocação,
+        usando os market caps atuais das ações (prior do mercado). Atualiza os atributos 'buy_weights' e 'market_implied_rets'.
+
+        Guarda também os preços e market caps usados no ajuste, que servem de referência para medir o drift intradiário (ver 'get_allocation_drift').
+
+        Returns
+        -------
+        BlackLittermanModel
+            O modelo ajustado.
+        """
+        from pypfopt.black_litterman import BlackLittermanModel
+
+        tickers = self.__allocation_tickers
+        prices = pd.Series({ticker:self.__stocks[ticker].current_price for ticker in tickers}, dtype=float) #preços atuais das ações do modelo
+        mcaps = {ticker:self.__stocks[ticker].market_cap for ticker in tickers} #dicionario com os market caps das ações do pregão
+
         #utiliza a classe BlackLittermanModel da lib PyPortfolioOpt para criar o modelo
-        bl_model = BlackLittermanModel(covariances_table, risk_aversion=delta, absolute_views={}, pi="market", market_caps=mcaps, risk_free_rate=self.__risk_free_rate) #é possível passar um dicionário com a previsão futura das ações pelo parâmetro 'absolute_views'
+        with self.__metrics.timer("allocation_model"):
+            views = self.__allocation_views #previsões futuras das ações (ver 'update_allocation_model')
+            if len(views) > 0 and self.__allocation_confidences is not None:
+                view_confidences = [self.__allocation_confidences[ticker] for ticker in views] #mesma ordem das views
+                bl_model = BlackLittermanModel(self.__allocation_covariances, risk_aversion=self.__allocation_risk_aversion, absolute_views=views, omega="idzorek", view_confidences=view_confidences, pi="market", market_caps=mcaps, risk_free_rate=self.__risk_free_rate)
+            else:
+                bl_model = BlackLittermanModel(self.__allocation_covariances, risk_aversion=self.__allocation_risk_aversion, absolute_views=views, pi="market", market_caps=mcaps, risk_free_rate=self.__risk_free_rate)
+            bl_model.bl_weights() #calcula os pesos de cada ação com base no modelo Black Litterman
+            self.__buy_weights = bl_model.clean_weights(cutoff=8e-3) #limpa os pesos arredondando os valores e cortando os valores perto de zero
+            self.__market_implied_rets = bl_model.posterior_rets #retorno esperado com base no mercado para cada ação alocada
 
-        bl_model.bl_weights() #calcula os pesos de cada ação com base no modelo Black Litterman
-        self.__buy_weights = bl_model.clean_weights(cutoff=8e-3) #limpa os pesos arredondando os valores e cortando os valores perto de zero
-        self.__market_implied_rets = bl_model.posterior_rets #retorno esperado com base no mercado para cada ação alocada
-        bl_model.portfolio_performance(verbose=True) #teste
+        self.__allocation_prices = prices
+        self.__allocation_mcaps = pd.Series(mcaps, dtype=float)
+        self.__allocation_time = datetime.now()
+
+        if self.__events.has_subscribers("allocation"):
+            self.__events.publish("allocation", [{"buy_weights": self.__buy_weights, "market_implied_rets": self.__market_implied_rets, "time": self.__allocation_time}])
+        return bl_model
+
+
+
+    def refresh_allocation_prior(self):
+        """
+        Atualiza o modelo de alocação apenas com os market caps atuais (prior do mercado) e recalcula o posterior.
+        Reaproveita a matriz de covariância e o preço de risco do último update do modelo, então não recalcula o Ledoit-Wolf.
+        Caso o modelo ainda não tenha sido criado, faz o update completo com os parâmetros de default.
+
+        OBS: Pensado para ser chamado durante o pregão, quando os preços mudam e, com eles, os market caps. (ver 'AllocationScheduler')
+        """
+        try:
+            self.__allocation_covariances
+        except AttributeError:
+            self.update_allocation_model()
+            return
+        self.__fit_allocation_model()
+
+
+
+    def get_allocation_drift(self):
+        """
+        Mede o quanto o mercado se moveu desde o último ajuste do modelo de alocação.
+
+        O movimento agregado dos preços é a média, ponderada pelos market caps do último ajuste, da variação absoluta dos preços de cada ação.
+        O drift dos pesos é a metade da soma das diferenças absolutas entre os pesos por market cap atuais e os do último ajuste (0 <= drift <= 1).
+
+        Returns
+        -------
+        tuple
+            O movimento agregado dos preços e o drift dos pesos por market cap. (ambos 0, caso o modelo ainda não tenha sido criado)
+        """
+        try:
+            old_prices = self.__allocation_prices
+            old_mcaps = self.__allocation_mcaps
+        except AttributeError:
+            return 0.0, 0.0
+
+        tickers = self.__allocation_tickers
+        prices = pd.Series({ticker:self.__stocks[ticker].current_price for ticker in tickers}, dtype=float)
+        mcaps = pd.Series({ticker:self.__stocks[ticker].market_cap for ticker in tickers}, dtype=float)
+
+        old_weights = old_mcaps / old_mcaps.sum() if old_mcaps.sum() > 0 else old_mcaps * 0
+        weights = mcaps / mcaps.sum() if mcaps.sum() > 0 else mcaps * 0
+
+        price_moves = (prices / old_prices - 1).abs().replace([float("inf"), -float("inf")], 0).fillna(0) #variação absoluta dos preços (ações sem preço no ajuste são ignoradas)
+        price_move = float((price_moves * old_weights).sum())
+        weights_drift = float((weights - old_weights).abs().sum() / 2)
+        return price_move, weights_drift
+
+
+
+    def get_allocation_time(self):
+        """
+        Getter do horário do último ajuste do modelo de alocação.
+
+        Returns
+        -------
+        datetime ou None
+            O horário do último ajuste do modelo de alocação. (None, caso o modelo ainda não tenha sido criado)
+        """
+        try:
+            return self.__allocation_time
+        except AttributeError:
+            return None
 
 
 
@@ -602,3 +1123,106 @@ class Session():
         except:
             self.update_allocation_model()
             return self.__market_implied_rets
+
+
+
+    def get_memory_usage(self):
+        """
+        Estima a memória usada pelo pregão, separada por componente. Útil para saber quantas sessões com o universo inteiro da B3 cabem em um processo.
+
+        Returns
+        -------
+        dict
+            Dicionário com o número de bytes de cada componente: 'stocks' (ações e seus históricos), 'market_index', 'closing_prices_table', 'covariances_table' e 'total'.
+        """
+        memory_usage = {
+            "stocks": sum(stock.get_memory_usage() for stock in self.__stocks.values()),
+            "market_index": self.__market_index.get_memory_usage() if self.__market_index is not None else 0,
+            "closing_prices_table": 0,
+            "covariances_table": 0
+        }
+        #as tabelas só contam se já tiverem sido criadas (o getter criaria)
+        tables = {}
+        try:
+            tables["closing_prices_table"] = self.__closing_prices_table
+        except AttributeError:
+            pass
+        try:
+            tables["covariances_table"] = self.__covariances_table
+        except AttributeError:
+            pass
+        for name, table in tables.items():
+            memory_usage[name] = int(table.memory_usage(index=True, deep=True).sum())
+        memory_usage["total"] = sum(memory_usage.values())
+        return memory_usage
+
+
+
+    def subscribe(self, event, callback, weak=False):
+        """
+        Inscreve um callback em um evento do pregão. O callback é chamado com a lista de payloads (dicts) de cada lote do evento.
+        Os eventos ao vivo de todas as ações do pregão chegam agrupados no mesmo lote.
+        Enquanto houver inscritos no evento 'price', os índices de seleção também são atualizados pelos lotes; sem inscritos, os eventos ao vivo são descartados.
+
+        Eventos:
+            - price: o preço ou o volume atual de ações do pregão mudou (ticker, price, volume, high, low, time)
+            - bar: novas barras diárias foram criadas no histórico de ações do pregão (ticker, date, open, high, low, close, volume)
+            - allocation: o modelo de alocação foi atualizado (buy_weights, market_implied_rets, time)
+
+        Parameters
+        ----------
+        event : str
+            O nome do evento ('price', 'bar' ou 'allocation').
+        callback : function
+            A função chamada a cada lote do evento, no formato callback(batch).
+        weak : bool
+            Se verdadeiro, guarda apenas uma referência fraca para o callback (que deve ser um método). (default é False)
+
+        Returns
+        -------
+        function
+            O callback inscrito, que deve ser usado para cancelar a inscrição.
+        """
+        callback = self.__events.subscribe(event, callback, weak)
+        self.__update_index_subscription()
+        return callback
+
+
+
+    def unsubscribe(self, event, callback):
+        """
+        Cancela a inscrição de um callback em um evento do pregão.
+        """
+        self.__events.unsubscribe(event, callback)
+        self.__update_index_subscription()
+
+
+
+    async def stream(self, event):
+        """
+        Stream assíncrono (asyncio) dos lotes de um evento do pregão. Deve ser usado com 'async for'. (ver 'subscribe')
+        """
+        stream = self.__events.stream(event)
+        self.__streams_num += event == "price" #o stream só se inscreve no hub na primeira leitura: os índices são inscritos antes
+        self.__update_index_subscription()
+        try:
+            async for batch in stream:
+                yield batch
+        finally:
+            await stream.aclose()
+            self.__streams_num -= event == "price"
+            self.__update_index_subscription()
+
+
+
+    def __update_index_subscription(self):
+        """
+        Inscreve os índices de seleção nos preços ao vivo enquanto houver outros inscritos no evento 'price' e cancela a inscrição quando não houver mais nenhum.
+        """
+        subscribers_num = self.__events.get_subscribers_num("price") + self.__streams_num - (1 if self.__index_subscribed else 0)
+        if subscribers_num > 0 and not self.__index_subscribed:
+            self.__events.subscribe("price", self.__index.update_prices)
+            self.__index_subscribed = True
+        elif subscribers_num <= 0 and self.__index_subscribed:
+            self.__events.unsubscribe("price", self.__index.update_prices)
+            self.__index_subscribed = False
@@ -0,0 +1,426 @@
+from array import array
+import numpy as np
+import threading
+import time
+import csv
+
+
+
+class SimulatedQuote():
+    """
+    Classe que representa uma Quote (infos de preço ao vivo) simulada. Tem os mesmos atributos usados da yflive.Quote (identifier, price, dayVolume, time).
+    Também guarda o instante (time.perf_counter) em que a quote deveria ter sido emitida, para medir a latência de ponta a ponta.
+    """
+
+    __slots__ = ("identifier", "price", "dayVolume", "time", "sent_at")
+
+    def __init__(self, identifier, price, day_volume, sent_at):
+        self.identifier = identifier
+        self.price = price
+        self.dayVolume = day_volume
+        self.time = int(time.time() * 1000) #mesmo formato do yahoo finance (milissegundos)
+        self.sent_at = sent_at
+
+
+
+def load_ticks(path):
+    """
+    Lê ticks gravados de um arquivo csv, com as colunas 'identifier', 'price' e 'dayVolume' (identifier no formato do yahoo, ex: PETR4.SA).
+
+    Parameters
+    ----------
+    path : str ou Path
+        O caminho para o arquivo csv com os ticks.
+
+    Returns
+    -------
+    list
+        Lista de tuplas (identifier, price, dayVolume), na ordem do arquivo.
+    """
+    with open(path, "r", encoding="utf8") as ticks_file:
+        return [(row["identifier"], float(row["price"]), int(float(row["dayVolume"]))) for row in csv.DictReader(ticks_file)]
+
+
+
+class QuoteFeed():
+    """
+    Classe que representa uma fonte local de quotes, compartilhada por todos os streamers simulados.
+    Reproduz ticks gravados (em loop) ou gera ticks sintéticos (passeio aleatório) para os identifiers inscritos, a uma taxa configurável.
+    Cada quote é entregue de forma síncrona aos callbacks dos streamers inscritos, e a latência de ponta a ponta (emissão -> fim do callback) é guardada.
+    """
+
+    def __init__(self, rate=None, ticks=None, base_prices=None, volatility=0.001, seed=None):
+        """
+        Parameters
+        ----------
+        rate : int ou float
+            A taxa agregada de emissão em quotes por segundo. (default é None, emite o mais rápido possível)
+        ticks : list
+            Lista de tuplas (identifier, price, dayVolume) gravadas, que são reproduzidas em loop. (default é None, gera ticks sintéticos)
+        base_prices : dict
+            Os preços iniciais dos ticks sintéticos, no formato {identifier: preço}. (default é None, todos começam em 10)
+        volatility : float
+            O desvio padrão dos log retornos de cada tick sintético. (default é 0,1%)
+        seed : int
+            A semente do gerador de números aleatórios. (default é None)
+
+        Raises
+        ------
+        TypeError
+            Se os parâmetros não baterem com seus respectivos tipos.
+        ValueError
+            Se a taxa de emissão não for maior que 0.
+        """
+        if rate is not None and not isinstance(rate, (int, float)):
+            raise TypeError("Argument 'rate' must be an integer or a float.")
+        if ticks is not None and not isinstance(ticks, list):
+            raise TypeError("Argument 'ticks' must be a list of tuples.")
+        if base_prices is not None and not isinstance(base_prices, dict):
+            raise TypeError("Argument 'base_prices' must be a dictionary.")
+        if rate is not None and rate <= 0:
+            raise ValueError("Argument 'rate' must be greater than 0.")
+
+        self.__rate = rate
+        self.__ticks = ticks
+        self.__base_prices = base_prices if base_prices is not None else {}
+        self.__volatility = volatility
+        self.__random = np.random.default_rng(seed)
+        self.__streamers = {} #dicionário {identifier: [streamers inscritos]}
+        self.__prices = {} #último preço sintético de cada identifier
+        self.__volumes = {} #último volume sintético de cada identifier
+        self.__lock = threading.Lock()
+        self.__stop_event = threading.Event()
+        self.__thread = None
+        self.reset_stats()
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def rate(self):
+        return self.__rate #taxa agregada de emissão (quotes por segundo)
+
+    @property
+    def identifiers(self):
+        return list(self.__streamers.keys()) #identifiers com pelo menos um streamer inscrito
+
+    @property
+    def delivered_num(self):
+        return self.__delivered_num #número de quotes entregues aos streamers
+
+    @property
+    def elapsed(self):
+        return self.__elapsed #tempo em segundos gasto emitindo quotes
+
+    @property
+    def latencies(self):
+        return np.frombuffer(self.__latencies, dtype=float) #latências de ponta a ponta (segundos) de cada quote entregue
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def reset_stats(self):
+        """
+        Zera as estatísticas de entrega (número de quotes, tempo e latências).
+        """
+        self.__delivered_num = 0
+        self.__elapsed = 0.0
+        self.__latencies = array("d")
+
+
+
+    def register(self, streamer):
+        """
+        Inscreve um streamer simulado na fonte, para todos os identifiers em que ele estiver inscrito.
+
+        Parameters
+        ----------
+        streamer : SimulatedQuoteStreamer
+            O streamer que deve receber as quotes.
+        """
+        with self.__lock:
+            for identifier in streamer.subscribed:
+                self.__streamers.setdefault(identifier, [])
+                if streamer not in self.__streamers[identifier]:
+                    self.__streamers[identifier].append(streamer)
+
+
+
+    def unregister(self, streamer):
+        """
+        Remove um streamer simulado da fonte.
+
+        Parameters
+        ----------
+        streamer : SimulatedQuoteStreamer
+            O streamer que não deve mais receber as quotes.
+        """
+        with self.__lock:
+            for identifier in list(self.__streamers):
+                if streamer in self.__streamers[identifier]:
+                    self.__streamers[identifier].remove(streamer)
+                if len(self.__streamers[identifier]) == 0:
+                    self.__streamers.pop(identifier)
+
+
+
+    def __synthetic_ticks(self, size):
+        """
+        Gera um lote de ticks sintéticos (passeio aleatório geométrico) para identifiers sorteados entre os inscritos.
+
+        Parameters
+        ----------
+        size : int
+            O número de ticks do lote.
+
+        Returns
+        -------
+        list
+            Lista de tuplas (identifier, price, dayVolume).
+        """
+        identifiers = self.identifiers
+        if len(identifiers) == 0:
+            return []
+
+        chosen = self.__random.integers(0, len(identifiers), size)
+        moves = np.exp(self.__random.normal(0, self.__volatility, size))
+        trades = self.__random.integers(100, 10000, size)
+
+        ticks = []
+        for i in range(size):
+            identifier = identifiers[chosen[i]]
+            price = self.__prices.get(identifier, self.__base_prices.get(identifier, 10.0)) * moves[i]
+            volume = self.__volumes.get(identifier, 0) + int(trades[i])
+            self.__prices[identifier] = price
+            self.__volumes[identifier] = volume
+            ticks.append((identifier, round(float(price), 2), volume))
+        return ticks
+
+
+
+    def __deliver(self, identifier, price, day_volume, sent_at):
+        """
+        Entrega uma quote a todos os streamers inscritos no identifier e guarda a latência de ponta a ponta.
+
+        Returns
+        -------
+        int
+            O número de streamers que receberam a quote.
+        """
+        streamers = self.__streamers.get(identifier)
+        if not streamers:
+            return 0
+        quote = SimulatedQuote(identifier, price, day_volume, sent_at)
+        for streamer in list(streamers):
+            streamer.deliver(quote)
+        self.__latencies.append(time.perf_counter() - sent_at)
+        return 1
+
+
+
+    def run(self, count=None, duration=None):
+        """
+        Emite quotes de forma síncrona (na thread que chamou o método), até que 'count' quotes sejam entregues, 'duration' segundos se passem ou a fonte seja parada.
+        Se 'rate' tiver sido definido, as quotes são emitidas no ritmo da taxa; atrasos de entrega contam como latência.
+
+        Parameters
+        ----------
+        count : int
+            O número de quotes a serem entregues. (default é None, sem limite)
+        duration : int ou float
+            O tempo máximo em segundos emitindo quotes. (default é None, sem limite)
+
+        Returns
+        -------
+        int
+            O número de quotes entregues nesta chamada.
+        """
+        delivered = 0
+        position = 0 #posição nos ticks gravados
+        start = time.perf_counter()
+        while not self.__stop_event.is_set():
+            if self.__ticks is not None:
+                batch = self.__ticks[position:position + 1024]
+                position = position + 1024 if position + 1024 < len(self.__ticks) else 0 #no fim da gravação, o replay recomeça do primeiro tick (loop fiel)
+            else:
+                batch = self.__synthetic_ticks(1024)
+            if len(batch) == 0:
+                time.sleep(0.01) #nenhum streamer inscrito ainda
+                if duration is not None and time.perf_counter() - start >= duration:
+                    break
+                continue
+
+            for identifier, price, day_volume in batch:
+                if self.__rate is not None:
+                    sent_at = start + delivered / self.__rate #instante em que a quote deveria ser emitida
+                    wait = sent_at - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                else:
+                    sent_at = time.perf_counter()
+                delivered += self.__deliver(identifier, price, day_volume, sent_at)
+
+                if (count is not None and delivered >= count) or (duration is not None and time.perf_counter() - start >= duration):
+                    self.__stop_event.set()
+                    break
+
+        self.__stop_event.clear()
+        self.__elapsed += time.perf_counter() - start
+        self.__delivered_num += delivered
+        return delivered
+
+
+
+    def start(self, count=None, duration=None):
+        """
+        Começa a emissão de quotes em uma thread separada. (ver 'run')
+        Se a fonte já estiver emitindo, não faz nada.
+        """
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__thread = threading.Thread(target=self.run, args=(count, duration), daemon=True)
+        self.__thread.start()
+
+
+
+    def stop(self):
+        """
+        Para a emissão de quotes e espera a thread terminar.
+        """
+        self.__stop_event.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        self.__stop_event.clear()
+
+
+
+DEFAULT_FEED = QuoteFeed() #fonte usada pelos streamers simulados criados sem fonte (ex: pela classe Stock)
+
+
+
+def set_default_feed(feed):
+    """
+    Troca a fonte de quotes usada pelos streamers simulados criados sem fonte.
+
+    Parameters
+    ----------
+    feed : QuoteFeed
+        A nova fonte de quotes.
+
+    Raises
+    ------
+    TypeError
+        Se o parâmetro 'feed' não for um objeto QuoteFeed.
+    """
+    global DEFAULT_FEED
+    if not isinstance(feed, QuoteFeed):
+        raise TypeError("Argument 'feed' must be a QuoteFeed object.")
+    DEFAULT_FEED = feed
+
+
+
+class SimulatedQuoteStreamer():
+    """
+    Substituto local do QuoteStreamer do yflive, com a mesma interface (subscribe, unsubscribe, start, stop, on_quote, on_error...).
+    Recebe as quotes de uma QuoteFeed local ao invés do websocket do Yahoo Finance. (ver 'delfos.market.stock.set_quote_streamer_class')
+    """
+
+    def __init__(self, subscribe=None, on_connect=None, on_quote=None, on_error=None, on_close=None, feed=None):
+        """
+        Parameters
+        ----------
+        subscribe : list
+            Os identifiers que devem ser inscritos. (default é None)
+        on_connect, on_quote, on_error, on_close : function
+            Os callbacks do streamer, com os mesmos argumentos do yflive. (default é None)
+        feed : QuoteFeed
+            A fonte de quotes. (default é None, usa a fonte padrão do módulo no momento do 'start')
+        """
+        self.on_connect = on_connect
+        self.on_quote = on_quote
+        self.on_error = on_error
+        self.on_close = on_close
+        self.__subscribed = set(subscribe) if subscribe is not None else set()
+        self.__feed = feed
+        self.__is_streaming = False
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def subscribed(self):
+        return list(self.__subscribed) #identifiers inscritos
+
+    @property
+    def is_streaming(self):
+        return self.__is_streaming #se o streamer está recebendo quotes
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def __callback(self, callback, *args):
+        """
+        Chama um callback do streamer. Assim como no yflive, erros nos callbacks não interrompem o stream.
+        """
+        if callback is not None and callable(callback):
+            try:
+                callback(self, *args)
+            except Exception as e:
+                print("error from callback {}: {}".format(callback, e))
+
+
+
+    def subscribe(self, identifiers):
+        """
+        Inscreve o streamer nos identifiers passados.
+        """
+        self.__subscribed |= set(identifiers)
+        if self.__is_streaming:
+            self.__feed.register(self)
+
+
+
+    def unsubscribe(self, identifiers):
+        """
+        Remove a inscrição do streamer nos identifiers passados.
+        """
+        self.__subscribed -= set(identifiers)
+        if self.__is_streaming:
+            self.__feed.unregister(self)
+            self.__feed.register(self)
+
+
+
+    def start(self, should_thread=False):
+        """
+        Conecta o streamer à fonte de quotes. A emissão é feita pela thread da fonte, então o método nunca trava o programa.
+        """
+        if self.__feed is None:
+            self.__feed = DEFAULT_FEED
+        self.__feed.register(self)
+        self.__is_streaming = True
+        self.__callback(self.on_connect)
+
+
+
+    def stop(self):
+        """
+        Desconecta o streamer da fonte de quotes.
+        """
+        if self.__is_streaming:
+            self.__feed.unregister(self)
+            self.__is_streaming = False
+            self.__callback(self.on_close)
+
+
+
+    def deliver(self, quote):
+        """
+        Entrega uma quote ao callback 'on_quote'. Chamado pela fonte de quotes.
+        """
+        self.__callback(self.on_quote, quote)
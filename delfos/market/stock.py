@@ -1,13 +1,16 @@
 from delfos.common.configs import Configs
+from delfos.common.events import EventHub, BATCHER
+from delfos.common.metrics import get_metrics
+from delfos.common.telemetry import TELEMETRY
+from delfos.common.profiling import profiled
+from delfos.market.catalog import get_b3_type
 import delfos.common.utils as utils
-from yflive import QuoteStreamer #live stream dos preços
-import yfinance as yf #package para se conectar a api do yahoo finance
-import requests #package para fazer requests HTTP ao site Fundamentus
 import pandas as pd
 from datetime import datetime
 import datetime as dt
 import random #fix_split_dates
 import time #testes
+import sys
 
 CONFIGS = Configs()
 
@@ -19,12 +22,71 @@ REQUESTS_HEADER = CONFIGS.REQUESTS_HEADER #header para requisições HTTP, usado
 
 NOW = datetime.now()
 
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"] #colunas de preço do histórico
+EVENT_COLUMNS = ["Dividends", "Stock Splits"] #colunas de eventos do histórico (quase sempre 0)
+
+QUOTE_STREAMER_CLASS = None #classe do streamer de preços ao vivo (None é o QuoteStreamer do yflive, importado só no primeiro uso; pode ser trocada por um simulador, ver 'set_quote_streamer_class')
+
+
+
+def set_quote_streamer_class(streamer_class):
+    """
+    Troca a classe usada para o stream ao vivo dos preços de todas as ações.
+    A classe deve ter a mesma interface do QuoteStreamer do yflive (subscribe, start, on_quote e on_error).
+    Usado para rodar o caminho ao vivo contra um simulador local. (ver 'delfos.market.simulator')
+
+    Parameters
+    ----------
+    streamer_class : type ou None
+        A classe do streamer de preços. Se None, volta a usar o QuoteStreamer do yflive.
+    """
+    global QUOTE_STREAMER_CLASS
+    QUOTE_STREAMER_CLASS = streamer_class
+
+
+
+def compact_history(history):
+    """
+    Cria uma cópia enxuta de um histórico: preços em float32, volume inteiro e as colunas de dividendos e desdobramentos esparsas (só os valores diferentes de 0 são guardados).
+    Usa menos da metade da memória do histórico original, com precisão de ~7 dígitos nos preços.
+
+    Parameters
+    ----------
+    history : DataFrame
+        Dataframe com o histórico da ação, nas colunas: Open, High, Low, Close, Volume, Dividends e Stock Splits.
+
+    Returns
+    -------
+    DataFrame
+        O histórico enxuto.
+    """
+    dtypes = {}
+    for col in history.columns:
+        if col in PRICE_COLUMNS:
+            dtypes[col] = "float32"
+        elif col == "Volume":
+            dtypes[col] = "int64"
+        elif col in EVENT_COLUMNS:
+            dtypes[col] = pd.SparseDtype("float64", 0.0)
+    history = history.fillna({col: 0 for col in ["Volume"] + EVENT_COLUMNS if col in history.columns}) #volume e eventos ausentes são 0 (preços ausentes continuam NaN)
+    return history.astype(dtypes)
+
+
 
 class Stock():
     """
     Classe que representa uma ação. Possui uma empresa, infomaçõs sobre esta e uma data de análise. O conjunto ticker + data de análise é o id da ação analisada.
     """
 
+    #atributos fixos (sem __dict__ por objeto), o que reduz a memória de sessões com o universo inteiro da B3
+    __slots__ = (
+        "__ticker", "__yahoo_ticker", "__analysis_date", "__is_active", "__type",
+        "__company", "__sector", "__sub_sector", "__segment", "__cnpj",
+        "__history", "__history_is_view", "__current_price", "__current_volume", "__current_open_price", "__current_high_price", "__current_low_price",
+        "__shares_outstanding", "__equity", "__earnings", "__eps", "__bvps", "__roe",
+        "__events", "__event_hubs", "__price_streamer", "__weakref__"
+    )
+
     def __init__(self, ticker, analysis_date=NOW, company="undefined", sector="undefined", sub_sector="undefined", segment="undefined", cnpj="undefined"):
         """
         Parameters
@@ -77,6 +139,10 @@ class Stock():
 
         self.__set_type()
 
+        self.__history_is_view = False #se o histórico é uma view somente leitura de outro dataframe (ex: de um HistoryStore)
+        self.__events = EventHub(("price", "bar")) #hub dos eventos ao vivo da ação
+        self.__event_hubs = [self.__events] #hubs em que os eventos ao vivo são publicados (o da ação e os das sessões em que ela está)
+
         #ajeitando o ticker da ação para a API do yahoo finance (OBS: LIMITA O USO DO CÓDIGO PARA AÇÕES BRASILEIRAS)
         if self.__ticker[0] != "^": #se o ticker for um índice, não adicionar o SA (SÃO PAULO)
             self.__yahoo_ticker = self.__ticker + ".SA"
@@ -127,6 +193,10 @@ class Stock():
     def history(self):
         return self.get_history() #histórico de dados técnicos da ação até a data de análise
 
+    @property
+    def history_is_view(self):
+        return self.__history_is_view #se o histórico é uma view somente leitura de outro dataframe (ex: de um HistoryStore)
+
     @property
     def current_price(self):
         return self.get_current_price() #preço atual da ação para a data de análise
@@ -188,40 +258,11 @@ class Stock():
 
     def __set_type(self):
         """
-        Determina o tipo da ação de acordo com os números no final do ticker e a codificação estabelecida pela B3.
+        Determina o tipo da ação de acordo com os números no final do ticker e a codificação estabelecida pela B3 (ver 'delfos.market.catalog.get_b3_type').
 
         OBS: LIMITA O USO DO CÓDIGO PARA AÇÕES BRASILEIRAS.
-
-        Raises
-        -------
-        ValueError
-            Se o atributo 'ticker' não tiver numeração válida para os códigos estabelecidos pela B3.
-        """
-
-        if self.__ticker[0] == "^":
-            self.__type = "INDEX"
-        elif self.__ticker[-1] == "3":
-            self.__type = "ON" #ação ordinária
-        elif self.__ticker[-1] == "4":
-            self.__type = "PN" #ação preferencial
-        elif self.__ticker[-1] == "5":
-            self.__type = "PNA" #ação preferencial classe A
-        elif self.__ticker[-1] == "6":
-            self.__type = "PNB" #ação preferencial classe B
-        else:
-            self.__type = "undefined" #ações preferenciais de outras classes
-
-        if self.__ticker[-2:] == "34" or self.__ticker[-2:] == "33":
-            self.__type = "BDR" #ações de fora do brasil negociadas na B3
-
-        elif self.__ticker[-2:] == "11":
-            if self.__sub_sector == "Fundos":
-                if self.__segment == "Fundos Imobiliários":
-                    self.__type = "FII"
-                else:
-                    self.__type = "ETF"
-            else:
-                self.__type = "UNT"
+        """
+        self.__type = get_b3_type(self.__ticker, self.__sub_sector, self.__segment)
 
 
 
@@ -241,22 +282,33 @@ class Stock():
 
 
 
-    def __set_price_streamer(self):
+    def __set_price_streamer(self, force=False):
         """
         Se a data de análise for a data atual, for um dia de semana e estiver em horário de pregão, abre a conexão com o socket do yflive.
         O socket estabelece um stream ao vivo de informações de preço (High, Low, Close, Volume).
         O recebimento ao vivo das infos é feito em uma thread separada, e portanto não trava o programa.
+
+        Parameters
+        ----------
+        force : bool
+            Se verdadeiro, abre o stream independente da data de análise e do horário. (default é False)
         """
-        if self.__analysis_date.date() == NOW.date():
-            weekday = NOW.date().weekday()
-            if weekday != 5 and weekday != 6 and utils.is_market_hours():
+        weekday = NOW.date().weekday()
+        if force or (self.__analysis_date.date() == NOW.date() and weekday != 5 and weekday != 6 and utils.is_market_hours()):
+            self.stop_price_stream() #um stream anterior (ex: reconexão depois de um erro) é fechado antes de abrir o novo
+
+            streamer_class = QUOTE_STREAMER_CLASS
+            if streamer_class is None:
+                from yflive import QuoteStreamer #live stream dos preços (import pesado, feito só no primeiro uso)
+                streamer_class = QuoteStreamer
 
-                price_streamer = QuoteStreamer()
-                price_streamer.subscribe([self.__yahoo_ticker]) #se inscreve no streamer para receber infos da ação específica
+            price_streamer = streamer_class()
+            price_streamer.subscribe([self.__yahoo_ticker]) #se inscreve no streamer para receber infos da ação específica
 
-                price_streamer.on_quote = lambda price_streamer, quote: self.__update_current_price(quote) #a cada Quote (infos) recebida, ajusta os preços atuais e o histórico da ação
-                price_streamer.on_error = lambda price_streamer, error: self.__correct_stream_error(error) #se um erro ocorrer, é tratado pela função passada
-                price_streamer.start(should_thread=True) #começa a live stream de infos em uma thread separada
+            price_streamer.on_quote = lambda price_streamer, quote: self.__update_current_price(quote) #a cada Quote (infos) recebida, ajusta os preços atuais e o histórico da ação
+            price_streamer.on_error = lambda price_streamer, error: self.__correct_stream_error(error) #se um erro ocorrer, é tratado pela função passada
+            price_streamer.start(should_thread=True) #começa a live stream de infos em uma thread separada
+            self.__price_streamer = price_streamer #guardado para que o stream possa ser fechado (ver 'stop_price_stream')
 
 
 
@@ -299,7 +351,8 @@ class Stock():
 
 
 
-    def download_history(self, period=6):
+    @profiled("stock.download_history")
+    def download_history(self, period=6, metrics=None):
         """
         Cria um dataframe com o histórico da ação considerando um período de tempo e a data de análise,
         inclui: volume, preços de abertura, fechamento, máximo e mínimo, assim como dividendos e desdobramentos.
@@ -315,6 +368,8 @@ class Stock():
         ----------
         period : int
             O período de tempo do histórico em anos. (default é 6 anos)
+        metrics : Metrics
+            Métricas em que são registrados os tempos da api do yfinance, do scraper e da correção dos splits, e o contador de fallbacks para o scraper. (default é None, sem métricas)
 
         Raises
         ------
@@ -329,6 +384,7 @@ class Stock():
         #validando os tipos dos parâmetros
         if not isinstance(period, int):
             raise TypeError("Argument 'period' must be an integer.")
+        metrics = get_metrics(metrics)
 
         success = True #assume inicialmente que o download do histórico foi um sucesso
 
@@ -337,9 +393,13 @@ class Stock():
         start_year = self.__analysis_date.year - period
         start_date = datetime(start_year, 1, 1)
 
+        import yfinance as yf #package para se conectar a api do yahoo finance (import pesado, feito só no primeiro uso)
+
+        self.__history_is_view = False #o histórico baixado é sempre um dataframe próprio da ação
         try:
             #faz o download dos dados pela API do yahoo finance
-            self.__history = yf.Ticker(self.__yahoo_ticker).history(period="{}y".format(period))
+            with metrics.timer("history.yfinance_api", self.__ticker), TELEMETRY.track("yfinance_api"):
+                self.__history = yf.Ticker(self.__yahoo_ticker).history(period="{}y".format(period))
             #print(self.__history.index[-1].date())
             self.__history = self.__history[~self.__history.index.duplicated(keep="last")] #exclui datas duplicadas do histórico
 
@@ -405,9 +465,10 @@ class Stock():
 
                         #se faz sentido atualizar os dados através do scraper do Yahoo Finance
                         if is_valid_day:
-                            response = requests.get(YFINANCE_HISTORY_URL.format(self.__yahoo_ticker, self.__yahoo_ticker), headers=REQUESTS_HEADER)
-
-                            current_data = pd.read_html(response.text)[0]
+                            metrics.increment("history.scrape_fallbacks", ticker=self.__ticker)
+                            with metrics.timer("history.yahoo_scrape", self.__ticker):
+                                response = TELEMETRY.get("yahoo_html", YFINANCE_HISTORY_URL.format(self.__yahoo_ticker, self.__yahoo_ticker))
+                                current_data = pd.read_html(response.text)[0]
 
                             current_data = current_data.drop(columns=["Close*"]) #excluindo coluna com preços não ajustados
                             current_data = current_data.rename(columns={"Adj Close**": "Close"}) #renomeando coluna com preços ajustados
@@ -511,21 +572,37 @@ class Stock():
             #se o download dos dados falhar ou todos os dados baixados forem NaNs
             self.__history = pd.DataFrame() #o atributo 'history' se torna um dataframe vazio
 
-        self.__fix_splits_dates(period) #mantém apenas os splits reais no histórico (alguns estão duplicados)
+        with metrics.timer("history.fix_splits", self.__ticker):
+            self.__fix_splits_dates(period) #mantém apenas os splits reais no histórico (alguns estão duplicados)
         self.__history = self.__history[self.__history.index <= end_date] #mantém o histórico da data de início do período de análise até a data de análise
 
         if self.__history.empty:
             #print("Não conseguiu baixar o historico: " + self.__ticker) #teste
             self.__is_active = False
+            self.__set_current_prices()
+            success = False
+            metrics.increment("history.failures", ticker=self.__ticker)
+
+        else:
+            self.__set_price_streamer()
+            self.__set_current_prices()
+
+        return success
+
+
+
+    def __set_current_prices(self):
+        """
+        Seta os preços/volume atuais da ação de acordo com o histórico.
+        Se o histórico estiver vazio, todos são 0.
+        """
+        if self.__history.empty:
             self.__current_price = 0
             self.__current_volume = 0
             self.__current_open_price = 0
             self.__current_high_price = 0
             self.__current_low_price = 0
-            success = False
-
         else:
-            self.__set_price_streamer()
             #preço atual é igual ao preço do ultimo pregão em que a ação estava ativa
             self.__current_price = float(self.__history["Close"][self.__history["Close"].last_valid_index()])
             self.__current_volume = float(self.__history["Volume"][self.__history["Volume"].last_valid_index()])
@@ -533,7 +610,117 @@ class Stock():
             self.__current_high_price = float(self.__history["High"][self.__history["High"].last_valid_index()])
             self.__current_low_price = float(self.__history["Low"][self.__history["Low"].last_valid_index()])
 
-        return success
+
+
+    def set_history(self, history, period=None, copy=True, active_date=None):
+        """
+        Seta manualmente o histórico da ação, sem fazer nenhum download (ex: históricos gravados em disco ou sintéticos).
+        O histórico é cortado na data de análise e a ação é ativa se a última data do histórico for a data de análise.
+
+        OBS: Não abre o stream ao vivo dos preços. (ver 'stream_prices')
+
+        Parameters
+        ----------
+        history : DataFrame
+            Dataframe com o histórico da ação (datetime index), nas colunas: Open, High, Low, Close, Volume, Dividends e Stock Splits.
+        period : int
+            O período de tempo do histórico em anos, contado a partir da data de análise. (default é None, mantém todo o histórico até a data de análise)
+        copy : bool
+            Se falso, o histórico da ação é uma view do histórico passado (ex: de um HistoryStore mapeado em memória), copiada só quando o caminho ao vivo precisar alterá-la. (default é True)
+        active_date : datetime
+            A data em que a ação deve ter negociado para ser ativa (ex: o último pregão fechado, para um pregão montado antes da abertura). (default é None, a data de análise)
+
+        Raises
+        ------
+        TypeError
+            Se os parâmetros não baterem com seus respectivos tipos.
+
+        Returns
+        -------
+        bool
+            Verdadeiro se o histórico não estiver vazio.
+        """
+        if not isinstance(history, pd.DataFrame):
+            raise TypeError("Argument 'history' must be a DataFrame.")
+        if period is not None and not isinstance(period, int):
+            raise TypeError("Argument 'period' must be an integer.")
+
+        if not history.index.is_monotonic_increasing:
+            history = history.sort_index()
+        #corta o histórico por fatias do index ordenado (fatias são views, máscaras seriam cópias)
+        end = history.index.searchsorted(self.__analysis_date, side="right") #mantém o histórico até a data de análise
+        start = 0
+        if period is not None:
+            start = history.index.searchsorted(self.__analysis_date - pd.DateOffset(years=period), side="left") #mantém o histórico a partir do início do período de análise
+        self.__history = history.iloc[start:end]
+        if copy:
+            self.__history = self.__history.copy()
+        self.__history_is_view = not copy
+        self.__set_current_prices()
+
+        if self.__history.empty:
+            self.__is_active = False
+            return False
+        active_date = active_date if active_date is not None else self.__analysis_date
+        self.__is_active = self.__history.index[-1].date() == active_date.date()
+        return True
+
+
+
+    def compact_history(self):
+        """
+        Troca o histórico da ação pela sua versão enxuta: preços em float32, volume inteiro e dividendos/desdobramentos esparsos. (ver 'compact_history')
+        Usado pela classe Session para segurar várias sessões com o universo inteiro da B3 no mesmo processo.
+        """
+        try:
+            history = self.__history
+        except AttributeError:
+            return
+        if not history.empty:
+            self.__history = compact_history(history)
+            self.__history_is_view = False
+
+
+
+    def get_memory_usage(self):
+        """
+        Estima a memória usada pela ação: o histórico (com as strings do index) mais o próprio objeto e os seus atributos fixos.
+
+        Returns
+        -------
+        int
+            O número de bytes usados pela ação.
+        """
+        memory_usage = sys.getsizeof(self)
+        for value in (self.__ticker, self.__yahoo_ticker, self.__company, self.__sector, self.__sub_sector, self.__segment, self.__cnpj):
+            memory_usage += sys.getsizeof(value)
+        try:
+            memory_usage += int(self.__history.memory_usage(index=True, deep=True).sum())
+        except AttributeError:
+            pass
+        return memory_usage
+
+
+
+    def stream_prices(self):
+        """
+        Abre o stream ao vivo dos preços da ação, independente da data de análise e do horário.
+        Usado junto com um streamer simulado para exercitar o caminho ao vivo fora do horário de pregão. (ver 'set_quote_streamer_class')
+        """
+        self.__set_price_streamer(force=True)
+
+
+
+    def stop_price_stream(self):
+        """
+        Fecha o stream ao vivo dos preços da ação, se estiver aberto.
+        """
+        try:
+            price_streamer = self.__price_streamer
+        except AttributeError:
+            return #o stream não foi aberto
+        del self.__price_streamer
+        price_streamer.stop()
 
 
 
@@ -555,30 +742,152 @@ class Stock():
 
 
 
+    def __set_last_bar_value(self, column, value):
+        """
+        Altera um valor da última barra do histórico convertendo o valor para o tipo da coluna, para que o pandas não promova a coluna (ex: float32 para float64).
+        """
+        position = self.__history.columns.get_loc(column)
+        self.__history.iat[-1, position] = self.__history.dtypes.iloc[position].type(value)
+
+
+
     def __update_current_price(self, quote):
         """
         Atualiza os preços/volume atuais e o histórico, de acordo com a Quote (infos) vinda do streamer de preços do yflive.
+        Se a data de análise for a atual e o histórico ainda não tiver a barra do dia, a barra é criada a partir da quote.
+
+        Se o preço ou o volume mudarem, o evento 'price' é empurrado para o próximo lote de eventos ao vivo (e 'bar', se a barra do dia foi criada).
 
         Parameters
         ----------
         quote : yflive.Quote
             Objeto com as informações da ação sendo streamadas ao vivo.
         """
-        if hasattr(quote, "price"):
-            self.__current_price = quote.price
-            self.__history.loc[self.__history.index.date == NOW.date(), "Close"] = self.__current_price
-
-            if self.current_price > self.current_high_price:
+        price = getattr(quote, "price", None) #o yflive retorna None para infos que não vieram na quote
+        volume = getattr(quote, "dayVolume", None)
+        if (price is None and volume is None) or self.__history.empty:
+            return
+        if self.__history_is_view:
+            #copy on write: o histórico é uma view somente leitura, então é copiado antes da primeira alteração
+            self.__history = self.__history.copy()
+            self.__history_is_view = False
+
+        today = NOW.date()
+        new_bar = False
+        #se a barra do dia ainda não existe no histórico, cria a partir da quote
+        if price is not None and self.__analysis_date.date() == today and self.__history.index[-1].date() < today:
+            bar_date = pd.Timestamp(today)
+            if self.__history.index.tz is not None:
+                bar_date = bar_date.tz_localize(self.__history.index.tz)
+            bar = {"Open": price, "High": price, "Low": price, "Close": price, "Volume": volume if volume is not None else 0}
+            #a barra é montada com os tipos das colunas do histórico (ex: float32 e int64 do histórico enxuto), que o concat preserva
+            row = pd.DataFrame({col: pd.Series([bar.get(col, 0)], index=[bar_date]).astype(dtype) for col, dtype in self.__history.dtypes.items()}) #Dividends e Stock Splits são 0
+            self.__history = pd.concat([self.__history, row])
+            self.__current_open_price = price
+            self.__current_high_price = price
+            self.__current_low_price = price
+            new_bar = True
+
+        #o histórico é ordenado, então a barra do dia (se existir) é a última linha
+        is_today = self.__history.index[-1].date() == today
+        changed = new_bar
+
+        if price is not None:
+            changed = changed or price != self.__current_price
+            self.__current_price = price
+            if is_today:
+                self.__set_last_bar_value("Close", self.__current_price)
+
+            if self.__current_price > self.__current_high_price:
                 self.__current_high_price = self.__current_price
-                self.__history.loc[self.__history.index.date == NOW.date(), "High"] = self.__current_high_price
+                if is_today:
+                    self.__set_last_bar_value("High", self.__current_high_price)
 
-            if self.current_price < self.current_low_price:
+            if self.__current_price < self.__current_low_price:
                 self.__current_low_price = self.__current_price
-                self.__history.loc[self.__history.index.date == NOW.date(), "Low"] = self.__current_low_price
+                if is_today:
+                    self.__set_last_bar_value("Low", self.__current_low_price)
+
+        if volume is not None:
+            changed = changed or volume != self.__current_volume
+            self.__current_volume = volume
+            if is_today:
+                self.__set_last_bar_value("Volume", self.__current_volume)
+
+        #empurra os eventos para os hubs da ação (e da sessão), que são despachados em lotes
+        if changed:
+            payload = {"ticker": self.__ticker, "price": self.__current_price, "volume": self.__current_volume, "high": self.__current_high_price, "low": self.__current_low_price, "time": getattr(quote, "time", None)}
+            for hub in self.__event_hubs:
+                BATCHER.push(hub, "price", self.__ticker, payload)
+                if new_bar:
+                    BATCHER.push(hub, "bar", self.__ticker, {"ticker": self.__ticker, "date": self.__history.index[-1], "open": self.__current_open_price, "high": self.__current_high_price, "low": self.__current_low_price, "close": self.__current_price, "volume": self.__current_volume})
+
+
 
-        if hasattr(quote, "dayVolume"):
-            self.__current_volume = quote.dayVolume
-            self.__history.loc[self.__history.index.date == NOW.date(), "Volume"] = self.__current_volume
+    def attach_event_hub(self, hub):
+        """
+        Faz com que os eventos ao vivo da ação ('price' e 'bar') também sejam publicados no hub passado. Usado pela classe Session para agregar os eventos de todas as suas ações.
+
+        Parameters
+        ----------
+        hub : EventHub
+            O hub que deve receber os eventos da ação.
+        """
+        if hub not in self.__event_hubs:
+            self.__event_hubs = self.__event_hubs + [hub]
+
+
+
+    def detach_event_hub(self, hub):
+        """
+        Para de publicar os eventos ao vivo da ação no hub passado. Se o hub não estiver ligado à ação, não faz nada.
+
+        Parameters
+        ----------
+        hub : EventHub
+            O hub que não deve mais receber os eventos da ação.
+        """
+        self.__event_hubs = [event_hub for event_hub in self.__event_hubs if event_hub is not hub]
+
+
+
+    def subscribe(self, event, callback):
+        """
+        Inscreve um callback em um evento da ação. O callback é chamado com a lista de payloads (dicts) de cada lote do evento.
+
+        Eventos:
+            - price: o preço ou o volume atual mudou (ticker, price, volume, high, low, time)
+            - bar: uma nova barra diária foi criada no histórico (ticker, date, open, high, low, close, volume)
+
+        Parameters
+        ----------
+        event : str
+            O nome do evento ('price' ou 'bar').
+        callback : function
+            A função chamada a cada lote do evento, no formato callback(batch).
+
+        Returns
+        -------
+        function
+            O callback inscrito, que deve ser usado para cancelar a inscrição.
+        """
+        return self.__events.subscribe(event, callback)
+
+
+
+    def unsubscribe(self, event, callback):
+        """
+        Cancela a inscrição de um callback em um evento da ação.
+        """
+        self.__events.unsubscribe(event, callback)
+
+
+
+    def stream(self, event):
+        """
+        Stream assíncrono (asyncio) dos lotes de um evento da ação. Deve ser usado com 'async for'. (ver 'subscribe')
+        """
+        return self.__events.stream(event)
 
 
 
@@ -672,7 +981,8 @@ class Stock():
 
 
 
-    def download_fundamental_data(self, extra_tries=4):
+    @profiled("stock.download_fundamental_data")
+    def download_fundamental_data(self, extra_tries=4, metrics=None):
         """
         Faz o download dos dados fundamentalistas da ação, através do site Fundamentus.
         Caso o download falhe, o método tentará recursivamente outras vezes, até que o limite de tentativas se exceda.
@@ -687,6 +997,8 @@ class Stock():
         ----------
         extra_tries : int
             O número de tentativas restantes, para caso o download falhe. (default é 4 tentativas)
+        metrics : Metrics
+            Métricas em que são registrados o tempo do Fundamentus e os contadores de retentativas e falhas. (default é None, sem métricas)
 
         Raises
         ------
@@ -701,12 +1013,18 @@ class Stock():
         #validando os tipos dos parâmetros
         if not isinstance(extra_tries, int):
             raise TypeError("Argument 'extra_tries' must be an integer.")
+        metrics = get_metrics(metrics)
+
+        import requests #package para fazer requests HTTP ao site Fundamentus (usado aqui para identificar timeouts)
 
         success = True #assume inicialmente que o método conseguiu realizar o download com sucesso
         try:
             if self.__type != "BDR":
-                requested_data = requests.get(FUNDAMENTUS_URL + self.__ticker, headers=REQUESTS_HEADER) #chamada GET ao site da Fundamentus
-                html_tables_list = pd.read_html(requested_data.text) #captura as tabelas do html em uma lista de dataframes
+                with metrics.timer("fundamentals.fundamentus", self.__ticker):
+                    requested_data = TELEMETRY.get("fundamentus", FUNDAMENTUS_URL + self.__ticker) #chamada GET ao site da Fundamentus (com timeout e telemetria)
+                    if requested_data.status_code == 503:
+                        raise ConnectionError("HTTP Error 503: Service Unavailable")
+                    html_tables_list = pd.read_html(requested_data.text) #captura as tabelas do html em uma lista de dataframes
 
                 #se as informações que identificam a companhia não tiverem sido setadas
                 if self.__company == "undefined":
@@ -740,14 +1058,17 @@ class Stock():
                     success = False
 
         except Exception as e:
-            if str(e) == "HTTP Error 503: Service Unavailable" and extra_tries > 0: #se o erro foi de conexão
+            if (str(e) == "HTTP Error 503: Service Unavailable" or isinstance(e, requests.Timeout)) and extra_tries > 0: #se o erro foi de conexão (site indisponível ou timeout)
                 extra_tries -= 1
-                success = self.download_fundamental_data(extra_tries) #tenta recursivamente, caso ainda restem tentativas
+                metrics.increment("fundamentals.retries", ticker=self.__ticker)
+                TELEMETRY.record_retry("fundamentus")
+                return self.download_fundamental_data(extra_tries, metrics) #tenta recursivamente, caso ainda restem tentativas
             else:
                 success = False #se o download falhou e não restam mais tentativas, o método falhou
 
         #se o download falhou
         if success == False:
+            metrics.increment("fundamentals.failures", ticker=self.__ticker)
             #print("Não conseguiu baixar os dados fund.: " + self.__ticker) #teste
             #seta os atributos númericos como 0
             self.__equity = 0
@@ -760,6 +1081,41 @@ class Stock():
 
 
 
+    def set_fundamental_data(self, shares_outstanding=0, equity=0, earnings=0):
+        """
+        Seta manualmente os dados fundamentalistas da ação, sem fazer nenhum download (ex: dados gravados em disco ou sintéticos).
+        LPA (eps), VPA (bvps) e ROE são calculados a partir dos dados passados (0, se não for possível).
+
+        Parameters
+        ----------
+        shares_outstanding : int
+            O número de ações em circulação. (default é 0)
+        equity : int ou float
+            O Patrimônio Líquido da companhia. (default é 0)
+        earnings : int ou float
+            O Lucro Líquido da companhia (últimos 12 meses). (default é 0)
+
+        Raises
+        ------
+        TypeError
+            Se os parâmetros não baterem com seus respectivos tipos.
+        """
+        if not isinstance(shares_outstanding, int):
+            raise TypeError("Argument 'shares_outstanding' must be an integer.")
+        if not isinstance(equity, (int, float)):
+            raise TypeError("Argument 'equity' must be an integer or a float.")
+        if not isinstance(earnings, (int, float)):
+            raise TypeError("Argument 'earnings' must be an integer or a float.")
+
+        self.__shares_outstanding = shares_outstanding
+        self.__equity = equity
+        self.__earnings = earnings
+        self.__eps = earnings / shares_outstanding if shares_outstanding != 0 else 0
+        self.__bvps = equity / shares_outstanding if shares_outstanding != 0 else 0
+        self.__roe = earnings / equity if equity != 0 else 0
+
+
+
     def get_shares_outstanding(self):
         """
         Getter do atributo 'shares_outstanding', que armazena o número atual de ações em circulação.
@@ -0,0 +1,354 @@
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import struct
+import json
+import os
+
+
+MAGIC = b"DELFOSHS" #identificador dos arquivos de históricos
+VERSION = 2 #versão do layout do arquivo
+ALIGNMENT = 64 #alinhamento em bytes dos blocos de dados no arquivo
+FIELDS = ("Open", "High", "Low", "Close", "Volume", "Dividends", "Stock Splits") #colunas dos históricos, na ordem do arquivo
+PRICE_FIELDS = ("Open", "High", "Low", "Close") #colunas que são preenchidas com o último preço válido (as demais com 0)
+
+
+
+def get_aligned_offset(offset):
+    """
+    Arredonda um offset do arquivo para o próximo múltiplo do alinhamento dos blocos de dados.
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+
+def write_history_store(path, histories, metadata=None, dtype="float64"):
+    """
+    Grava históricos em um arquivo com layout fixo (campo x data x ticker), que pode ser mapeado em memória por vários processos. (ver 'HistoryStore')
+
+    Layout do arquivo:
+        - MAGIC (8 bytes), versão (uint32) e tamanho do cabeçalho (uint64)
+        - cabeçalho em json: tickers, campos, dtype, formato, primeira e última linha de cada ticker e os metadados
+        - datas (int64, em ns), dados (dtype, formato campo x data x ticker) e máscara de validade (uint8, formato data x ticker), alinhados em 64 bytes
+
+    As datas são a união das datas de todos os históricos. Depois da listagem de cada ticker, os preços são preenchidos com o último preço válido e
+    o volume, os dividendos e os desdobramentos com 0, para que as tabelas de campos fiquem alinhadas. Antes da listagem, tudo é NaN.
+    A máscara de validade marca as datas que vieram do histórico de cada ticker: as linhas preenchidas não voltam nos históricos lidos. (ver 'HistoryStore.get_history')
+
+    O arquivo é gravado em um arquivo temporário e depois renomeado, então processos que já mapearam o arquivo antigo não são afetados.
+
+    Parameters
+    ----------
+    path : str ou Path
+        O caminho do arquivo.
+    histories : dict
+        Dicionário no formato {ticker: DataFrame}, com as colunas Open, High, Low, Close, Volume, Dividends e Stock Splits.
+    metadata : dict
+        Metadados livres (serializáveis em json) gravados no cabeçalho. (default é None)
+    dtype : str
+        O tipo dos dados: 'float64' ou 'float32' (metade do tamanho, precisão de ~7 dígitos). (default é 'float64')
+
+    Raises
+    ------
+    TypeError
+        Se os parâmetros não baterem com seus respectivos tipos.
+    ValueError
+        Se o dtype não for válido ou se não houver nenhum histórico.
+
+    Returns
+    -------
+    HistoryStore
+        O arquivo gravado, já mapeado em memória.
+    """
+    if not isinstance(histories, dict):
+        raise TypeError("Argument 'histories' must be a dictionary.")
+    if metadata is not None and not isinstance(metadata, dict):
+        raise TypeError("Argument 'metadata' must be a dictionary.")
+    if dtype not in ("float64", "float32"):
+        raise ValueError("Argument 'dtype' must be 'float64' or 'float32'.")
+
+    histories = {ticker: history for ticker, history in histories.items() if not history.empty}
+    if len(histories) == 0:
+        raise ValueError("Argument 'histories' must have at least one non empty history.")
+
+    def naive_index(history):
+        index = pd.DatetimeIndex(history.index)
+        return index.tz_localize(None) if index.tz is not None else index
+
+    tickers = list(histories.keys())
+    dates = naive_index(next(iter(histories.values())))
+    for history in histories.values():
+        dates = dates.union(naive_index(history))
+    dates = dates[~dates.duplicated()]
+
+    data = np.full((len(FIELDS), len(dates), len(tickers)), np.nan)
+    valid = np.zeros((len(dates), len(tickers)), dtype="uint8") #datas com dados no histórico de cada ticker
+    first_rows = []
+    last_rows = []
+    for i, ticker in enumerate(tickers):
+        history = histories[ticker]
+        history = history[~history.index.duplicated(keep="last")]
+        rows = dates.get_indexer(naive_index(history))
+        valid[rows, i] = 1
+        for f, field in enumerate(FIELDS):
+            if field in history.columns:
+                data[f, rows, i] = np.asarray(history[field], dtype=float)
+        first_rows.append(int(rows.min()))
+        last_rows.append(int(rows.max()))
+
+    #preenche os buracos a partir da listagem de cada ticker
+    listed = np.arange(len(dates))[:, None] >= np.array(first_rows)[None, :]
+    for f, field in enumerate(FIELDS):
+        if field in PRICE_FIELDS:
+            data[f] = pd.DataFrame(data[f]).fillna(method="ffill").values
+        else:
+            data[f] = np.where(listed & np.isnan(data[f]), 0.0, data[f])
+
+    header = {
+        "tickers": tickers,
+        "fields": list(FIELDS),
+        "dtype": dtype,
+        "shape": list(data.shape),
+        "first_rows": first_rows,
+        "last_rows": last_rows,
+        "metadata": metadata if metadata is not None else {}
+    }
+    header_bytes = json.dumps(header).encode("utf8")
+    prefix = MAGIC + struct.pack("<IQ", VERSION, len(header_bytes)) + header_bytes
+    dates_offset = get_aligned_offset(len(prefix))
+    data_offset = get_aligned_offset(dates_offset + len(dates) * 8)
+    data_bytes = np.ascontiguousarray(data, dtype=dtype).tobytes()
+    valid_offset = get_aligned_offset(data_offset + len(data_bytes))
+
+    path = Path(path)
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, "wb") as store_file:
+        store_file.write(prefix)
+        store_file.write(b"\0" * (dates_offset - len(prefix)))
+        store_file.write(dates.values.astype("datetime64[ns]").view("int64").tobytes())
+        store_file.write(b"\0" * (data_offset - dates_offset - len(dates) * 8))
+        store_file.write(data_bytes)
+        store_file.write(b"\0" * (valid_offset - data_offset - len(data_bytes)))
+        store_file.write(valid.tobytes())
+    os.replace(temp_path, path)
+    return HistoryStore(path)
+
+
+
+class HistoryStore():
+    """
+    Classe que representa um arquivo de históricos mapeado em memória, somente leitura (ver 'write_history_store').
+    Vários processos podem mapear o mesmo arquivo e dividir uma única cópia física dos dados (cache de páginas do sistema operacional).
+
+    Os históricos e as tabelas de preços são views sobre o arquivo (sem cópia), cortadas na data de análise pedida.
+    Pode ser passado como 'histories' para a classe Session, no lugar de um dicionário de DataFrames.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str ou Path
+            O caminho do arquivo.
+
+        Raises
+        ------
+        ValueError
+            Se o arquivo não for um arquivo de históricos ou se a versão não for suportada.
+        """
+        self.__path = Path(path)
+        with open(self.__path, "rb") as store_file:
+            magic = store_file.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("File '{}' is not a history store.".format(self.__path))
+            version, header_size = struct.unpack("<IQ", store_file.read(12))
+            if version != VERSION:
+                raise ValueError("History store version {} is not supported (expected {}).".format(version, VERSION))
+            header = json.loads(store_file.read(header_size).decode("utf8"))
+
+        prefix_size = len(MAGIC) + 12 + header_size
+        shape = tuple(header["shape"])
+        dates_offset = get_aligned_offset(prefix_size)
+        data_offset = get_aligned_offset(dates_offset + shape[1] * 8)
+        valid_offset = get_aligned_offset(data_offset + int(np.prod(shape)) * np.dtype(header["dtype"]).itemsize)
+
+        self.__tickers = header["tickers"]
+        self.__positions = {ticker: i for i, ticker in enumerate(self.__tickers)}
+        self.__fields = header["fields"]
+        self.__first_rows = header["first_rows"]
+        self.__last_rows = header["last_rows"]
+        self.__metadata = header["metadata"]
+        self.__dates = pd.DatetimeIndex(np.fromfile(self.__path, dtype="int64", count=shape[1], offset=dates_offset).view("datetime64[ns]"))
+        self.__data = np.memmap(self.__path, dtype=header["dtype"], mode="r", offset=data_offset, shape=shape)
+        self.__valid = np.memmap(self.__path, dtype="uint8", mode="r", offset=valid_offset, shape=shape[1:]) #máscara das datas vindas do histórico de cada ticker
+
+
+
+    def __getstate__(self):
+        #só o caminho é serializado, o processo que receber o objeto mapeia o mesmo arquivo
+        return {"path": str(self.__path)}
+
+
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def path(self):
+        return self.__path #caminho do arquivo
+
+    @property
+    def tickers(self):
+        return list(self.__tickers) #tickers do arquivo
+
+    @property
+    def dates(self):
+        return self.__dates #datas do arquivo (união das datas de todos os históricos)
+
+    @property
+    def fields(self):
+        return list(self.__fields) #colunas dos históricos
+
+    @property
+    def metadata(self):
+        return self.__metadata #metadados gravados no cabeçalho
+
+    @property
+    def shape(self):
+        return self.__data.shape #formato dos dados (campos, datas, tickers)
+
+    @property
+    def nbytes(self):
+        return self.__data.nbytes #tamanho dos dados em bytes
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def __len__(self):
+        return len(self.__tickers)
+
+
+
+    def __contains__(self, ticker):
+        return ticker in self.__positions
+
+
+
+    def __iter__(self):
+        return iter(self.__tickers)
+
+
+
+    def __getitem__(self, ticker):
+        return self.get_history(ticker)
+
+
+
+    def keys(self):
+        return list(self.__tickers)
+
+
+
+    def __get_rows(self, as_of=None, period=None):
+        """
+        Retorna o intervalo de linhas [start, end) das datas até 'as_of' (inclusive) e a partir de 'as_of' menos 'period' anos.
+        """
+        end = len(self.__dates)
+        start = 0
+        if as_of is not None:
+            as_of = pd.Timestamp(as_of)
+            end = int(self.__dates.searchsorted(as_of, side="right"))
+            if period is not None:
+                start = int(self.__dates.searchsorted(as_of - pd.DateOffset(years=period), side="left"))
+        return start, end
+
+
+
+    def get_history(self, ticker, as_of=None, period=None):
+        """
+        Cria uma view (sem cópia) do histórico de um ticker, da sua listagem até a sua última data com dados ou até 'as_of'.
+        Só voltam as datas do histórico original do ticker: se o intervalo tiver datas preenchidas na gravação (ex: dias sem negociação do ticker), elas são descartadas e o histórico é uma cópia.
+
+        Parameters
+        ----------
+        ticker : str
+            O ticker.
+        as_of : datetime
+            A data de análise: o histórico é cortado nela. (default é None, todo o histórico)
+        period : int
+            O período em anos, contado a partir de 'as_of'. (default é None, desde a listagem)
+
+        Raises
+        ------
+        KeyError
+            Se o ticker não estiver no arquivo.
+
+        Returns
+        -------
+        DataFrame
+            O histórico do ticker (somente leitura), nas colunas Open, High, Low, Close, Volume, Dividends e Stock Splits.
+        """
+        i = self.__positions[ticker]
+        start, end = self.__get_rows(as_of, period)
+        start = max(start, self.__first_rows[i])
+        end = max(min(end, self.__last_rows[i] + 1), start)
+        valid = self.__valid[start:end, i].astype(bool)
+        if valid.all():
+            columns = {field: self.__data[f, start:end, i] for f, field in enumerate(self.__fields)} #todas as datas são do histórico: view
+            return pd.DataFrame(columns, index=self.__dates[start:end], copy=False)
+        rows = start + np.flatnonzero(valid)
+        columns = {field: self.__data[f, rows, i] for f, field in enumerate(self.__fields)}
+        return pd.DataFrame(columns, index=self.__dates[rows])
+
+
+
+    def get_field_table(self, field, as_of=None, period=None, tickers=None):
+        """
+        Cria uma tabela (Index = data e Coluna = ticker) de um campo dos históricos.
+        Se os tickers forem todos os do arquivo ou um trecho contínuo dele, a tabela é uma view (sem cópia); se não, as colunas são copiadas.
+
+        Parameters
+        ----------
+        field : str
+            O campo (ex: 'Close').
+        as_of : datetime
+            A data de análise: a tabela é cortada nela. (default é None, todas as datas)
+        period : int
+            O período em anos, contado a partir de 'as_of'. (default é None, todas as datas)
+        tickers : list
+            Os tickers das colunas. (default é None, todos os tickers do arquivo)
+
+        Raises
+        ------
+        KeyError
+            Se algum ticker não estiver no arquivo.
+
+        Returns
+        -------
+        DataFrame
+            A tabela do campo (somente leitura, se for uma view).
+        """
+        f = self.__fields.index(field)
+        start, end = self.__get_rows(as_of, period)
+        if tickers is None:
+            tickers = self.__tickers
+        positions = [self.__positions[ticker] for ticker in tickers]
+
+        if len(positions) > 0 and positions == list(range(positions[0], positions[0] + len(positions))):
+            values = self.__data[f, start:end, positions[0]:positions[0] + len(positions)] #trecho contínuo: view
+        else:
+            values = self.__data[f, start:end][:, positions]
+        return pd.DataFrame(values, index=self.__dates[start:end], columns=list(tickers), copy=False)
+
+
+
+    def get_closing_prices(self, as_of=None, period=None, tickers=None):
+        """
+        Cria a tabela de preços de fechamento (Index = data e Coluna = ticker), no mesmo formato do atributo 'closing_prices_table' da classe Session. (ver 'get_field_table')
+        """
+        return self.get_field_table("Close", as_of, period, tickers)
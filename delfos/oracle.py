@@ -0,0 +1,209 @@
+"""
+Motor de sinais: gera views (retornos esperados) e confianças por ticker para o modelo de alocação Black Litterman, a partir da tabela de preços de fechamento do pregão.
+
+Fatores, calculados para o universo inteiro de uma vez (numpy, sem laços por ação):
+    - momentum: retorno log anualizado da janela do momentum, ignorando os pregões mais recentes
+    - mean_reversion: z-score negativo do preço log em relação à sua média na janela de reversão (preços esticados para cima esperam queda)
+    - volatility_scaled_momentum: momentum dividido pela volatilidade anualizada
+
+Cada fator vira um z-score entre as ações (winsorizado) e os z-scores são combinados pelos pesos das configurações em um sinal composto.
+A view de cada ação é o retorno do prior mais o alpha, no formato de Grinold: alpha = coeficiente de informação x volatilidade x sinal composto.
+A confiança da view (método de Idzorek) cresce com a força do sinal composto e com a cobertura de preços da ação na janela.
+"""
+from delfos.common.configs import Configs
+import pandas as pd
+import numpy as np
+import warnings
+
+
+CONFIGS = Configs()
+
+SESSION_FREQ_PER_YEAR = CONFIGS.DEFAULTS["SESSION_FREQ_PER_YEAR"] #número de dias no ano em que o mercado funciona
+SIGNALS = CONFIGS.DEFAULTS["SIGNALS"] #parâmetros de default dos sinais
+FACTORS = ("momentum", "mean_reversion", "volatility_scaled_momentum") #fatores do sinal composto
+
+
+
+def get_signal_params(signals=None):
+    """
+    Monta os parâmetros dos sinais, completando os passados com os de default das configurações.
+
+    Parameters
+    ----------
+    signals : dict
+        Parâmetros que substituem os de default. (default é None, os parâmetros de default)
+
+    Raises
+    ------
+    TypeError
+        Se o parâmetro 'signals' não for um dicionário.
+    ValueError
+        Se algum parâmetro ou fator não existir, ou se as janelas forem inválidas.
+
+    Returns
+    -------
+    dict
+        Os parâmetros dos sinais.
+    """
+    if signals is None:
+        signals = {}
+    if not isinstance(signals, dict):
+        raise TypeError("Argument 'signals' must be a dictionary.")
+    for key in signals:
+        if key not in SIGNALS:
+            raise ValueError("Invalid signal parameter '{}'. Valid parameters: {}.".format(key, ", ".join(SIGNALS)))
+    params = {**SIGNALS, **signals}
+    for factor in params["weights"]:
+        if factor not in FACTORS:
+            raise ValueError("Invalid factor '{}'. Valid factors: {}.".format(factor, ", ".join(FACTORS)))
+    if params["momentum_skip"] >= params["momentum_lookback"]:
+        raise ValueError("Signal parameter 'momentum_skip' must be lesser than 'momentum_lookback'.")
+    if params["reversion_lookback"] < 2 or params["volatility_lookback"] < 2:
+        raise ValueError("Signal lookbacks must be greater than 1.")
+    return params
+
+
+
+def get_factors(prices, signals=None):
+    """
+    Calcula os fatores de todas as ações em uma única passada vetorizada sobre a tabela de preços.
+
+    Parameters
+    ----------
+    prices : DataFrame
+        Tabela de preços de fechamento (datas nas linhas, tickers nas colunas), em ordem cronológica. (ver 'Session.closing_prices_table')
+    signals : dict
+        Parâmetros dos sinais. (default é None, os parâmetros de default, ver 'get_signal_params')
+
+    Raises
+    ------
+    TypeError
+        Se o parâmetro 'prices' não for um DataFrame.
+
+    Returns
+    -------
+    DataFrame
+        Os fatores (colunas 'momentum', 'mean_reversion', 'volatility_scaled_momentum', 'volatility' e 'coverage') de cada ticker (linhas).
+        Fatores sem dados suficientes na janela são NaN.
+    """
+    if not isinstance(prices, pd.DataFrame):
+        raise TypeError("Argument 'prices' must be a DataFrame.")
+    params = get_signal_params(signals)
+
+    values = prices.to_numpy(dtype=float)
+    log_prices = np.log(np.where(values > 0, values, np.nan)) #preços não positivos são tratados como ausentes
+    n_dates, n_tickers = log_prices.shape
+    lookback, skip = params["momentum_lookback"], params["momentum_skip"]
+
+    #último preço válido em ou antes de cada data (forward fill por coluna): um preço ausente exatamente na data lida não anula o fator
+    last_valid_rows = np.maximum.accumulate(np.where(~np.isnan(log_prices), np.arange(n_dates)[:, None], 0), axis=0)
+    filled_log_prices = log_prices[last_valid_rows, np.arange(n_tickers)]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning) #colunas inteiras de NaN (ações sem preços na janela) geram NaN sem aviso
+
+        #momentum: retorno log entre o início da janela e o pregão 'skip' dias antes do último (últimos preços válidos em ou antes de cada um), anualizado
+        if n_dates > lookback:
+            momentum = (filled_log_prices[-1 - skip] - filled_log_prices[-1 - lookback]) * SESSION_FREQ_PER_YEAR / (lookback - skip)
+            coverage = np.mean(~np.isnan(log_prices[-1 - lookback:]), axis=0) #fração da janela com preços
+        else:
+            momentum = np.full(n_tickers, np.nan)
+            coverage = np.mean(~np.isnan(log_prices), axis=0) * n_dates / (lookback + 1) if n_dates > 0 else np.zeros(n_tickers)
+
+        #volatilidade anualizada dos retornos log diários
+        returns = np.diff(log_prices[-params["volatility_lookback"] - 1:], axis=0)
+        counts = np.sum(~np.isnan(returns), axis=0)
+        volatility = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(SESSION_FREQ_PER_YEAR)
+        volatility[(counts < 2) | ~(volatility > 0)] = np.nan
+
+        #reversão à média: z-score negativo do último preço log na janela de reversão
+        window = log_prices[-params["reversion_lookback"]:]
+        deviation = np.nanstd(window, axis=0)
+        mean_reversion = -(filled_log_prices[-1] - np.nanmean(window, axis=0)) / np.where(deviation > 0, deviation, np.nan)
+
+        volatility_scaled_momentum = momentum / volatility
+
+    return pd.DataFrame(
+        {"momentum": momentum, "mean_reversion": mean_reversion, "volatility_scaled_momentum": volatility_scaled_momentum, "volatility": volatility, "coverage": coverage},
+        index=prices.columns
+    )
+
+
+
+def get_zscores(values, max_zscore=3.0):
+    """
+    Calcula os z-scores entre as ações (colunas de uma matriz), ignorando NaNs e winsorizando em +-max_zscore. Colunas sem dispersão ficam zeradas.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        deviation = np.nanstd(values, axis=0)
+        zscores = (values - mean) / np.where(deviation > 0, deviation, np.inf)
+    return np.clip(zscores, -max_zscore, max_zscore)
+
+
+
+def get_composite_signal(factors, signals=None):
+    """
+    Combina os z-scores dos fatores em um sinal composto (também em z-score), pelos pesos dos parâmetros dos sinais.
+    Fatores ausentes de uma ação não entram na sua média; ações sem nenhum fator ficam com NaN.
+
+    Parameters
+    ----------
+    factors : DataFrame
+        Os fatores das ações. (ver 'get_factors')
+    signals : dict
+        Parâmetros dos sinais. (default é None, os parâmetros de default)
+
+    Returns
+    -------
+    Series
+        O sinal composto de cada ticker.
+    """
+    params = get_signal_params(signals)
+    names = [factor for factor, weight in params["weights"].items() if weight != 0]
+    if len(names) == 0:
+        return pd.Series(np.nan, index=factors.index)
+    weights = np.array([params["weights"][factor] for factor in names], dtype=float)
+
+    zscores = get_zscores(factors[names].to_numpy(dtype=float), params["max_zscore"])
+    valid = ~np.isnan(zscores)
+    total_weights = valid @ np.abs(weights)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        composite = np.where(valid, zscores, 0) @ weights / total_weights
+    composite[total_weights == 0] = np.nan
+    return pd.Series(get_zscores(composite, params["max_zscore"]), index=factors.index)
+
+
+
+def get_views(prices, prior=None, signals=None):
+    """
+    Gera as views absolutas e as confianças do modelo Black Litterman para as ações da tabela de preços.
+
+    Parameters
+    ----------
+    prices : DataFrame
+        Tabela de preços de fechamento (datas nas linhas, tickers nas colunas), em ordem cronológica.
+    prior : Series ou dict
+        Retornos do prior (ex: implicados pelo mercado) de cada ticker, anualizados. As views são o prior mais os alphas dos sinais.
+        (default é None, as views são só os alphas: excesso sobre o consenso)
+    signals : dict
+        Parâmetros dos sinais. (default é None, os parâmetros de default, ver 'get_signal_params')
+
+    Returns
+    -------
+    tuple
+        Dois dicionários {ticker: valor}: as views (retornos esperados anualizados) e as suas confianças (entre 0 e 1, para o método de Idzorek).
+        Ações sem sinal, sem volatilidade ou fora do prior não têm view.
+    """
+    params = get_signal_params(signals)
+    factors = get_factors(prices, params)
+    composite = get_composite_signal(factors, params)
+
+    alphas = params["information_coefficient"] * factors["volatility"] * composite
+    confidences = params["max_confidence"] * (1 - np.exp(-composite.abs())) * factors["coverage"].clip(0, 1)
+    if prior is not None:
+        prior = pd.Series(prior, dtype=float).reindex(alphas.index)
+        alphas = alphas + prior
+    valid = alphas.notna() & confidences.notna()
+    return alphas[valid].astype(float).to_dict(), confidences[valid].astype(float).to_dict()
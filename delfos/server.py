@@ -0,0 +1,537 @@
+"""
+Daemon do advisor: mantém um pregão e os seus portfolios quentes em memória e responde consultas por HTTP local (TCP ou Unix socket).
+
+Rotas:
+    - GET /health: estado do daemon (data do pregão, versão do estado, última atualização)
+    - GET /weights: pesos de compra do modelo de alocação
+    - GET /returns: retornos esperados implicados pelo mercado
+    - GET /portfolios: métricas de todos os portfolios
+    - GET /portfolios/<nome>: métricas e posições de um portfolio
+    - POST /portfolios/<nome>/what-if: simula movimentações sobre o portfolio, com corpo {"movements": [{"ticker", "type", "quantity", "price_per_share"}], "cash": float}
+      ('price_per_share' é opcional: default é o preço atual; 'cash' é um aporte ou retirada opcional)
+
+As respostas são montadas a partir de um estado imutável (json já serializado), trocado atomicamente a cada atualização. As leituras nunca esperam pelas
+atualizações (virada do pregão, refresh do modelo ou dos preços), que rodam em outra thread e só publicam o estado novo quando ele está pronto.
+
+O pregão é recriado (roll forward) na abertura e no fechamento do mercado, nos dias de semana. Entre as viradas, o estado é atualizado a cada 'check_interval' segundos
+com os preços atuais e o último ajuste do modelo de alocação (com live=True, um AllocationScheduler atualiza o prior do modelo durante o pregão).
+Com 'precompute_path', o daemon pré-calcula os artefatos do próximo pregão depois da virada do fechamento e monta o pregão da abertura a partir deles
+(ver 'delfos.market.precompute'), então a virada da abertura não baixa dados nem recalcula a covariância.
+"""
+from delfos.market.scheduler import AllocationScheduler
+from delfos.market.precompute import ARTIFACTS_FILE, load_precomputed, load_precomputed_session, precompute_next_session
+from delfos.broker.portfolio import Portfolio
+from delfos.common.configs import Configs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from datetime import datetime
+from urllib.parse import unquote
+from pathlib import Path
+import threading
+import json
+import os
+
+
+CONFIGS = Configs()
+
+MARKET_OPEN_HOUR = CONFIGS.CONSTANTS["MARKET_OPEN_HOUR"] #hora que o mercado abre
+MARKET_CLOSE_HOUR = CONFIGS.CONSTANTS["MARKET_CLOSE_HOUR"] #hora que o mercado fecha
+CHECK_INTERVAL = CONFIGS.DEFAULTS["ALLOCATION_CHECK_INTERVAL"] #intervalo (segundos) entre as atualizações do estado do daemon
+MAX_BODY_SIZE = 1 << 20 #tamanho máximo em bytes do corpo das requisições
+
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    Servidor HTTP sobre um Unix socket, com uma thread por requisição.
+    """
+    daemon_threads = True
+
+
+
+class AdvisorHandler(BaseHTTPRequestHandler):
+    """
+    Handler HTTP do daemon: repassa as requisições para 'AdvisorServer.query'.
+    """
+    protocol_version = "HTTP/1.1" #conexões keep-alive (sem o custo de um handshake por consulta)
+
+    def setup(self):
+        self.disable_nagle_algorithm = isinstance(self.client_address, tuple) #TCP_NODELAY: sem o atraso do algoritmo de Nagle entre o header e o corpo (só em TCP)
+        super().setup()
+
+    def do_GET(self):
+        self.__respond(*self.server.advisor.query("GET", self.path))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY_SIZE:
+            self.__respond(413, b'{"error": "request body too large"}')
+            return
+        self.__respond(*self.server.advisor.query("POST", self.path, self.rfile.read(length)))
+
+    def __respond(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return str(self.client_address[0]) if isinstance(self.client_address, tuple) else "unix" #clientes do Unix socket não têm endereço
+
+    def log_message(self, format, *args):
+        pass #sem log por requisição (latência)
+
+
+
+def encode(data):
+    """
+    Serializa uma resposta em json (bytes).
+    """
+    return json.dumps(data).encode("utf8")
+
+
+
+class AdvisorServer():
+    """
+    Classe que representa o daemon do advisor. Possui uma fábrica de pregões, os portfolios servidos e o endereço do servidor HTTP.
+    As consultas são servidas de um estado imutável, trocado atomicamente, então leituras concorrentes são seguras enquanto as atualizações rodam.
+    """
+
+    def __init__(self, session_factory, portfolios=None, address=("127.0.0.1", 8765), allocation_tickers="all", views=None, live=False, check_interval=CHECK_INTERVAL, precompute_path=None):
+        """
+        Parameters
+        ----------
+        session_factory : function
+            Função que recebe uma data (datetime) e cria o pregão (Session) dessa data. Chamada na criação do estado e a cada virada.
+        portfolios : dict
+            Os portfolios servidos, no formato {nome: {'movements': lista de movimentações ou função que as retorna, 'cash': float ou None}}.
+            Funções são chamadas a cada virada (ex: relê os arquivos de movimentação da B3). (default é None, nenhum portfolio)
+        address : tuple ou str
+            O endereço do servidor: (host, porta) para TCP ou o caminho de um Unix socket. (default é ('127.0.0.1', 8765))
+        allocation_tickers : list ou str
+            Os tickers do modelo de alocação. (ver 'Session.update_allocation_model') (default são todos)
+        views : dict ou str
+            As views do modelo de alocação. (ver 'Session.update_allocation_model') (default é None, sem views)
+        live : bool
+            Se verdadeiro, roda um AllocationScheduler que atualiza o prior do modelo de alocação durante o pregão. (default é False)
+        check_interval : int ou float
+            O intervalo em segundos entre as atualizações do estado e as checagens das viradas do pregão. (default é o das configurações)
+        precompute_path : str ou Path
+            A pasta dos artefatos pré-calculados. Se passada, o pregão do dia é montado dos artefatos quando eles forem da data do pregão,
+            e os artefatos do próximo pregão são gravados depois da virada do fechamento. (default é None, sem pré-cálculo)
+
+        Raises
+        ------
+        TypeError
+            Se os parâmetros não baterem com seus respectivos tipos.
+        ValueError
+            Se o intervalo de checagem não for maior que 0.
+        """
+        #checando se os tipos dos parâmetros estão corretos
+        if not callable(session_factory):
+            raise TypeError("Argument 'session_factory' must be a function.")
+        if portfolios is not None and not isinstance(portfolios, dict):
+            raise TypeError("Argument 'portfolios' must be a dictionary.")
+        if not isinstance(address, (tuple, str)):
+            raise TypeError("Argument 'address' must be a (host, port) tuple or a string.")
+        if not isinstance(live, bool):
+            raise TypeError("Argument 'live' must be a boolean.")
+        if not isinstance(check_interval, (int, float)):
+            raise TypeError("Argument 'check_interval' must be an integer or a float.")
+        if check_interval <= 0:
+            raise ValueError("Argument 'check_interval' must be greater than 0.")
+
+        self.__session_factory = session_factory
+        self.__portfolios_config = portfolios if portfolios is not None else {}
+        self.__address = address
+        self.__allocation_tickers = allocation_tickers
+        self.__views = views
+        self.__live = live
+        self.__check_interval = check_interval
+        self.__precompute_path = Path(precompute_path) if precompute_path is not None else None
+
+        self.__session = None
+        self.__portfolios = {} #dicionário {nome: Portfolio} do pregão atual
+        self.__scheduler = None
+        self.__state = None #estado imutável servido nas consultas (trocado atomicamente)
+        self.__state_version = 0
+        self.__last_roll = None #instante da última virada do pregão
+        self.__rolls_num = 0
+        self.__update_lock = threading.Lock() #serializa as atualizações (as leituras não usam o lock)
+        self.__stop_event = threading.Event()
+        self.__http_server = None
+        self.__threads = []
+
+
+
+#--------------------------------------- GETTERS ---------------------------------------------------------#
+
+    @property
+    def session(self):
+        return self.__session #pregão atual
+
+    @property
+    def portfolios(self):
+        return dict(self.__portfolios) #portfolios do pregão atual
+
+    @property
+    def address(self):
+        return self.__address #endereço do servidor HTTP
+
+    @property
+    def state_version(self):
+        return self.__state_version #número de estados publicados
+
+    @property
+    def rolls_num(self):
+        return self.__rolls_num #número de viradas do pregão
+
+    @property
+    def is_running(self):
+        return self.__http_server is not None #se o servidor HTTP está rodando
+
+#---------------------------------------------------------------------------------------------------------#
+
+
+
+    def roll(self, date=None):
+        """
+        Vira o pregão: cria o pregão da data, os portfolios e o modelo de alocação e publica o estado novo.
+        As consultas continuam sendo servidas pelo estado anterior até o novo ficar pronto.
+
+        Parameters
+        ----------
+        date : datetime
+            A data do novo pregão. (default é None, agora)
+        """
+        date = date if date is not None else datetime.now()
+        session = self.__create_session(date)
+        session.update_allocation_model(self.__allocation_tickers, self.__views)
+
+        portfolios = {}
+        for name, config in self.__portfolios_config.items():
+            movements = config.get("movements", [])
+            movements = movements() if callable(movements) else movements
+            portfolios[name] = Portfolio(session, config.get("cash"), list(movements))
+
+        with self.__update_lock:
+            if self.__scheduler is not None:
+                self.__scheduler.stop()
+                self.__scheduler = None
+            self.__session = session
+            self.__portfolios = portfolios
+            if self.__live:
+                self.__scheduler = AllocationScheduler(session)
+                if self.__http_server is not None:
+                    self.__scheduler.start()
+            self.__last_roll = datetime.now()
+            self.__rolls_num += 1
+            self.__publish_state()
+
+
+
+    def __create_session(self, date):
+        """
+        Cria o pregão da data: montado dos artefatos pré-calculados, se eles forem da data, ou pela fábrica de pregões.
+        """
+        if self.__precompute_path is not None and (self.__precompute_path / ARTIFACTS_FILE).exists():
+            if load_precomputed(self.__precompute_path)["next_date"] == date.date():
+                return load_precomputed_session(self.__precompute_path, date)
+        return self.__session_factory(date)
+
+
+
+    def precompute(self):
+        """
+        Grava os artefatos do próximo pregão a partir do pregão atual (ver 'precompute_next_session'). Não faz nada se o daemon não tiver a pasta dos artefatos.
+        """
+        if self.__precompute_path is not None and self.__session is not None:
+            precompute_next_session(self.__session, self.__precompute_path)
+
+
+
+    def refresh(self):
+        """
+        Publica um estado novo a partir do pregão atual (preços atuais e último ajuste do modelo de alocação), sem recriar o pregão.
+        """
+        with self.__update_lock:
+            if self.__session is not None:
+                self.__publish_state()
+
+
+
+    def __publish_state(self):
+        """
+        Monta o estado imutável (respostas já serializadas) e o troca atomicamente pelo atual. Deve ser chamado com o lock de atualização.
+        """
+        session = self.__session
+        buy_weights = {ticker: float(weight) for ticker, weight in session.buy_weights.items()}
+        portfolios = {name: self.__get_portfolio_metrics(portfolio, buy_weights) for name, portfolio in self.__portfolios.items()}
+        prices = {}
+        for portfolio in self.__portfolios.values():
+            for ticker, position in portfolio.positions.items():
+                prices[ticker] = float(position.stock.current_price)
+        for ticker in buy_weights:
+            prices[ticker] = float(session.stocks[ticker].current_price)
+
+        self.__state_version += 1
+        updated = datetime.now().isoformat()
+        health = {"status": "ok", "date": session.date.strftime("%Y-%m-%d"), "state_version": self.__state_version, "updated": updated, "rolls": self.__rolls_num}
+        self.__state = {
+            "health": encode(health),
+            "weights": encode(buy_weights),
+            "returns": encode({ticker: float(ret) for ticker, ret in session.market_implied_rets.items()}),
+            "portfolios": encode(portfolios),
+            "portfolio": {name: encode(metrics) for name, metrics in portfolios.items()},
+            "metrics": portfolios,
+            "buy_weights": buy_weights,
+            "prices": prices
+        }
+
+
+
+    def __get_portfolio_metrics(self, portfolio, buy_weights):
+        """
+        Monta as métricas de um portfolio: valores, retornos, posições com os seus pesos e a distância para os pesos de compra do modelo.
+        """
+        positions = {}
+        for ticker, position in portfolio.positions.items():
+            if position.quantity > 0:
+                positions[ticker] = {"quantity": position.quantity, "price": float(position.stock.current_price), "price_per_share": float(position.price_per_share), "value": float(position.held_shares_value)}
+        return get_holdings_metrics({ticker: position["quantity"] for ticker, position in positions.items()}, {ticker: position["price"] for ticker, position in positions.items()}, float(portfolio.cash), buy_weights, {
+            "total_value": float(portfolio.total_value),
+            "total_cost": float(portfolio.total_cost),
+            "total_return": float(portfolio.total_return),
+            "total_dividends": float(portfolio.total_dividends),
+            "held_shares_return": float(portfolio.held_shares_return),
+            "positions": positions
+        })
+
+
+
+    def what_if(self, name, movements, cash=0):
+        """
+        Simula movimentações sobre as posições atuais de um portfolio, com os preços do estado atual. O portfolio não é alterado.
+
+        Parameters
+        ----------
+        name : str
+            O nome do portfolio.
+        movements : list
+            As movimentações simuladas, no formato [{'ticker', 'type' ('buy' ou 'sell'), 'quantity', 'price_per_share' (opcional, default é o preço atual)}].
+        cash : int ou float
+            Aporte (positivo) ou retirada (negativo) de dinheiro simulada. (default é 0)
+
+        Raises
+        ------
+        KeyError
+            Se o portfolio não existir.
+        ValueError
+            Se alguma movimentação for inválida (tipo, quantidade, preço desconhecido ou venda maior que a posição) ou se o dinheiro ficar negativo.
+
+        Returns
+        -------
+        dict
+            As métricas das posições depois das movimentações: cash, held_shares_value, net_value, weights e allocation_gap (ver 'get_holdings_metrics').
+        """
+        state = self.__state
+        if state is None or name not in state["metrics"]:
+            raise KeyError(name)
+        metrics = state["metrics"][name]
+        quantities = {ticker: position["quantity"] for ticker, position in metrics["positions"].items()}
+        prices = dict(state["prices"])
+        cash = metrics["cash"] + cash
+
+        for movement in movements:
+            ticker, typ, quantity = movement.get("ticker"), movement.get("type", "buy"), movement.get("quantity")
+            if typ not in ("buy", "sell"):
+                raise ValueError("Movement type must be 'buy' or 'sell'.")
+            if not isinstance(quantity, (int, float)) or quantity <= 0:
+                raise ValueError("Movement quantity must be a number greater than 0.")
+            price = movement.get("price_per_share", prices.get(ticker))
+            if price is None:
+                raise ValueError("Unknown price for ticker '{}'.".format(ticker))
+            prices.setdefault(ticker, float(price))
+            if typ == "buy":
+                quantities[ticker] = quantities.get(ticker, 0) + quantity
+                cash -= quantity * price
+            else:
+                if quantities.get(ticker, 0) < quantity:
+                    raise ValueError("Can't sell more shares of '{}' than the portfolio holds.".format(ticker))
+                quantities[ticker] -= quantity
+                cash += quantity * price
+        if cash < 0:
+            raise ValueError("The portfolio's cash can't be lesser than 0.")
+        return get_holdings_metrics({ticker: quantity for ticker, quantity in quantities.items() if quantity > 0}, prices, cash, state["buy_weights"])
+
+
+
+    def query(self, method, path, body=None):
+        """
+        Responde uma consulta do daemon. (ver as rotas na documentação do módulo)
+
+        Parameters
+        ----------
+        method : str
+            O método HTTP ('GET' ou 'POST').
+        path : str
+            A rota.
+        body : bytes
+            O corpo da requisição (json). (default é None)
+
+        Returns
+        -------
+        tuple
+            O status HTTP e a resposta (json em bytes).
+        """
+        state = self.__state #uma única leitura do estado: a consulta inteira é servida pela mesma versão
+        if state is None:
+            return 503, encode({"error": "advisor is starting"})
+        parts = [unquote(part) for part in path.split("?")[0].strip("/").split("/")]
+
+        if method == "GET":
+            if parts[0] in ("health", "weights", "returns", "portfolios") and len(parts) == 1:
+                return 200, state[parts[0]]
+            if parts[0] == "portfolios" and len(parts) == 2:
+                if parts[1] not in state["portfolio"]:
+                    return 404, encode({"error": "unknown portfolio '{}'".format(parts[1])})
+                return 200, state["portfolio"][parts[1]]
+        elif method == "POST" and len(parts) == 3 and parts[0] == "portfolios" and parts[2] == "what-if":
+            try:
+                request = json.loads(body) if body else {}
+                return 200, encode(self.what_if(parts[1], request.get("movements", []), request.get("cash", 0)))
+            except KeyError:
+                return 404, encode({"error": "unknown portfolio '{}'".format(parts[1])})
+            except (ValueError, TypeError, AttributeError) as e:
+                return 400, encode({"error": str(e)})
+        return 404, encode({"error": "unknown route"})
+
+
+
+    def __roll_due(self, now):
+        """
+        Checa se a abertura ou o fechamento do mercado de hoje (dias de semana) já passou desde a última virada do pregão.
+        """
+        if now.weekday() in (5, 6):
+            return False
+        for hour in (MARKET_CLOSE_HOUR, MARKET_OPEN_HOUR):
+            scheduled = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+            if scheduled <= now:
+                return self.__last_roll is None or self.__last_roll < scheduled
+        return False
+
+
+
+    def __run(self):
+        """
+        Loop da thread de atualização: vira o pregão na abertura e no fechamento e atualiza o estado nos intervalos, até que o daemon seja parado.
+        """
+        while not self.__stop_event.wait(self.__check_interval):
+            try:
+                now = datetime.now()
+                if self.__roll_due(now):
+                    self.roll()
+                    if now.hour >= MARKET_CLOSE_HOUR:
+                        self.precompute() #virada do fechamento: o pregão fechado vira os artefatos da próxima abertura
+                else:
+                    self.refresh()
+            except Exception as e:
+                print(e) #um erro em uma atualização não deve derrubar o daemon (o estado anterior continua sendo servido)
+
+
+
+    def start(self):
+        """
+        Cria o primeiro estado (se ainda não existir) e começa o servidor HTTP e a thread de atualização (não trava o programa).
+        Se o daemon já estiver rodando, não faz nada.
+        """
+        if self.is_running:
+            return
+        if self.__state is None:
+            self.roll()
+
+        if isinstance(self.__address, str):
+            if os.path.exists(self.__address):
+                os.remove(self.__address) #socket de uma execução anterior
+            self.__http_server = ThreadingUnixHTTPServer(self.__address, AdvisorHandler)
+        else:
+            self.__http_server = ThreadingHTTPServer(self.__address, AdvisorHandler)
+        self.__http_server.advisor = self
+        self.__address = self.__http_server.server_address if not isinstance(self.__address, str) else self.__address #porta real, se a porta 0 foi passada
+
+        self.__stop_event.clear()
+        self.__threads = [threading.Thread(target=self.__http_server.serve_forever, daemon=True), threading.Thread(target=self.__run, daemon=True)]
+        for thread in self.__threads:
+            thread.start()
+        if self.__scheduler is not None:
+            self.__scheduler.start()
+
+
+
+    def serve_forever(self):
+        """
+        Começa o daemon e trava o programa até ele ser parado (ex: Ctrl+C).
+        """
+        self.start()
+        try:
+            while not self.__stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+
+    def stop(self):
+        """
+        Para o servidor HTTP, a thread de atualização e o scheduler do modelo de alocação e espera as threads terminarem.
+        """
+        self.__stop_event.set()
+        if self.__http_server is not None:
+            self.__http_server.shutdown()
+            self.__http_server.server_close()
+            if isinstance(self.__address, str) and os.path.exists(self.__address):
+                os.remove(self.__address)
+            self.__http_server = None
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+        if self.__scheduler is not None:
+            self.__scheduler.stop()
+
+
+
+def get_holdings_metrics(quantities, prices, cash, buy_weights, extra=None):
+    """
+    Calcula as métricas de um conjunto de posições: valor das ações, valor total, pesos e distância para os pesos de compra do modelo de alocação.
+
+    Parameters
+    ----------
+    quantities : dict
+        As quantidades de ações, no formato {ticker: quantidade}.
+    prices : dict
+        Os preços atuais, no formato {ticker: preço}.
+    cash : float
+        O dinheiro disponível.
+    buy_weights : dict
+        Os pesos de compra do modelo de alocação, no formato {ticker: peso}.
+    extra : dict
+        Métricas adicionais incluídas no resultado. (default é None)
+
+    Returns
+    -------
+    dict
+        Dicionário com: cash, held_shares_value, net_value (ações + dinheiro), weights ({ticker: peso no valor das ações}) e allocation_gap
+        (metade da soma das diferenças absolutas entre os pesos e os pesos de compra: 0 é a alocação do modelo, 1 é nenhuma ação em comum), mais as métricas adicionais.
+    """
+    values = {ticker: quantity * prices[ticker] for ticker, quantity in quantities.items()}
+    held_shares_value = sum(values.values())
+    weights = {ticker: value / held_shares_value for ticker, value in values.items()} if held_shares_value > 0 else {}
+    tickers = set(weights) | set(buy_weights)
+    allocation_gap = sum(abs(weights.get(ticker, 0) - buy_weights.get(ticker, 0)) for ticker in tickers) / 2
+    metrics = {"cash": cash, "held_shares_value": held_shares_value, "net_value": held_shares_value + cash, "weights": weights, "allocation_gap": allocation_gap}
+    if extra is not None:
+        metrics = {**extra, **metrics}
+    return metrics